@@ -0,0 +1,31 @@
+"""
+LDAP authentication for production.
+
+The searches and options below need python-ldap objects, so they're set
+here rather than in settings, where they'd import python-ldap in every
+process on start. Django loads authentication backends on first use, so
+Celery workers and anonymous requests never import it. AUTH_LDAP_* settings
+still take precedence over these defaults.
+"""
+
+import ldap
+from django_auth_ldap.backend import LDAPBackend as BaseLDAPBackend
+from django_auth_ldap.config import GroupOfNamesType, LDAPSearch
+
+
+class LDAPBackend(BaseLDAPBackend):
+    default_settings = {
+        'USER_SEARCH': LDAPSearch(
+            "dc=tiger-computing,dc=co,dc=uk", ldap.SCOPE_SUBTREE,
+            "(uid=%(user)s)"
+        ),
+        'GLOBAL_OPTIONS': {
+            ldap.OPT_X_TLS_REQUIRE_CERT: ldap.OPT_X_TLS_NEVER,
+        },
+        'GROUP_TYPE': GroupOfNamesType(),
+        'GROUP_SEARCH': LDAPSearch(
+            "ou=groups,dc=tiger-computing,dc=co,dc=uk",
+            ldap.SCOPE_SUBTREE,
+            "(objectClass=groupOfNames)"
+        ),
+    }
@@ -0,0 +1,158 @@
+"""
+Two tier cache backend, a bounded in-process LRU in front of a shared cache
+(e.g. Redis) which is used by every worker process.
+
+Entries are only held locally for LOCAL_TIMEOUT seconds, bounding how stale
+a process can be after another process changes or deletes a key.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'DjangoLibrary.cache.TieredCache',
+            'LOCATION': 'default',
+            'OPTIONS': {
+                'SHARED': 'shared',  # Alias of the shared cache
+                'MAX_LOCAL_ENTRIES': 5000,
+                'LOCAL_TIMEOUT': 5,
+            },
+        },
+        'shared': {...},
+    }
+"""
+
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Local tiers and their counters, shared by every thread in the process
+_local_caches = {}
+_stats = {}
+_locks = {}
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+
+    def __init__(self, location, params):
+        super(TieredCache, self).__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._max_local_entries = options.get('MAX_LOCAL_ENTRIES', 5000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 5)
+        self._local = _local_caches.setdefault(location, OrderedDict())
+        self._stats = _stats.setdefault(location, Counter())
+        self._lock = _locks.setdefault(location, threading.Lock())
+
+    @property
+    def _shared(self):
+        return caches[self._shared_alias]
+
+    def get_stats(self):
+        """Returns hit, miss and eviction counts for this process"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['local_entries'] = len(self._local)
+        stats['max_local_entries'] = self._max_local_entries
+        return stats
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is not None:
+                expires, pickled = entry
+                if expires > time.time():
+                    self._local.move_to_end(key)
+                    self._stats['local_hits'] += 1
+                    return pickle.loads(pickled)
+                del self._local[key]
+        return _MISSING
+
+    def _set_local(self, key, value, timeout=DEFAULT_TIMEOUT):
+        expires = time.time() + self._local_timeout
+        backend_expires = self.get_backend_timeout(timeout)
+        if backend_expires is not None:
+            expires = min(expires, backend_expires)
+        # Values are stored pickled so callers can't mutate a shared object
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[key] = (expires, pickled)
+            self._local.move_to_end(key)
+            while len(self._local) > self._max_local_entries:
+                self._local.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def _delete_local(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._shared.add(key, value, timeout, version=version)
+        if added:
+            self._set_local(self.make_key(key, version), value, timeout)
+        return added
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        self.validate_key(local_key)
+        value = self._get_local(local_key)
+        if value is not _MISSING:
+            return value
+        value = self._shared.get(key, _MISSING, version=version)
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('shared_hits')
+        self._set_local(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, remaining = {}, []
+        for key in keys:
+            value = self._get_local(self.make_key(key, version))
+            if value is _MISSING:
+                remaining.append(key)
+            else:
+                found[key] = value
+        if remaining:
+            shared = self._shared.get_many(remaining, version=version)
+            self._count('shared_hits', len(shared))
+            self._count('misses', len(remaining) - len(shared))
+            for key, value in shared.items():
+                self._set_local(self.make_key(key, version), value)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared.set(key, value, timeout, version=version)
+        self._set_local(self.make_key(key, version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared.set_many(data, timeout, version=version)
+        for key, value in data.items():
+            self._set_local(self.make_key(key, version), value, timeout)
+
+    def incr(self, key, delta=1, version=None):
+        self._delete_local(self.make_key(key, version))
+        return self._shared.incr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self._delete_local(self.make_key(key, version))
+        self._shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._delete_local(self.make_key(key, version))
+        self._shared.delete_many(keys, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self._shared.clear()
@@ -1,6 +1,9 @@
 from __future__ import absolute_import, unicode_literals
 import os
+from time import perf_counter
+
 from celery import Celery
+from celery.signals import before_task_publish, task_postrun, task_prerun
 
 # set the default Django setting module for the Djang 'celery' program
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'DjangoLibrary.settings')
@@ -20,3 +23,43 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print('Request: {0!r}'.format(self.request))
+
+
+# Start times and trace spans of the tasks running in this process, by id
+_task_started = {}
+_task_spans = {}
+
+
+@before_task_publish.connect
+def add_trace_header(sender=None, headers=None, **kwargs):
+    from DjangoLibrary import tracing
+    with tracing.span('celery.publish ' + sender, 'PRODUCER'):
+        traceparent = tracing.get_traceparent()
+    if traceparent is not None and headers is not None:
+        headers['traceparent'] = traceparent
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, task=None, **kwargs):
+    from DjangoLibrary import tracing
+    _task_started[task_id] = perf_counter()
+    traceparent = getattr(task.request, 'traceparent', None) or (
+        task.request.headers or {}).get('traceparent')
+    span = tracing.start_trace('celery.task ' + task.name, traceparent,
+                               'CONSUMER', task_id=task_id)
+    if span is not None:
+        _task_spans[task_id] = span
+
+
+@task_postrun.connect
+def record_task_duration(task_id=None, task=None, state=None, **kwargs):
+    from DjangoLibrary import metrics, tracing
+    span = _task_spans.pop(task_id, None)
+    if span is not None:
+        span.tags['state'] = state
+        tracing.finish_span(span)
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        metrics.TASK_DURATION.observe(
+            perf_counter() - started, task=task.name, state=state)
+        metrics.flush()
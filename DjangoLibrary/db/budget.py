@@ -0,0 +1,152 @@
+"""
+Per-request query instrumentation with per-view budgets.
+
+QueryBudgetMiddleware records the queries each request makes, on every
+database, and logs a structured warning when a view goes over its budget.
+Budgets are configured by URL name in the QUERY_BUDGETS setting, with the
+'default' entry applying to views without their own:
+
+    QUERY_BUDGETS = {
+        'default': {'queries': 20, 'db_time': 0.2},
+        'books:book-detail': {'queries': 8},
+    }
+
+Queries are recorded through Django's debug cursor, the same way
+assertNumQueries captures them, so no DEBUG is needed.
+"""
+
+import logging
+import re
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Literals are stripped from SQL so repeats of a query share a fingerprint
+FINGERPRINT_PATTERNS = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {
+    'requests': 0,
+    'queries': 0,
+    'db_time': 0.0,  # Seconds
+    'over_budget': 0,  # Requests which went over the view's budget
+})
+
+
+def get_query_stats():
+    """Returns a copy of this process's query stats keyed by view name"""
+    with _lock:
+        return {view: dict(stats) for view, stats in _stats.items()}
+
+
+def fingerprint(sql):
+    for pattern, replacement in FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def get_budget(view_name):
+    """Returns the budget of a view, falling back to the default budget"""
+    budgets = settings.QUERY_BUDGETS
+    return dict(budgets.get('default', {}), **budgets.get(view_name, {}))
+
+
+class QueryReport(object):
+    """Summary of the queries made whilst handling a request"""
+
+    def __init__(self, view_name, queries):
+        self.view_name = view_name
+        self.queries = queries
+        self.count = len(queries)
+        self.db_time = sum(float(query['time']) for query in queries)
+        slowest = max(queries, key=lambda query: float(query['time']),
+                      default=None)
+        self.slowest = slowest and (slowest['sql'], float(slowest['time']))
+        self.duplicates = {
+            sql: count for sql, count in Counter(
+                fingerprint(query['sql']) for query in queries
+            ).items() if count > 1
+        }
+
+    def over_budget(self):
+        """Returns a dict of the exceeded limits, mapped to their values"""
+        budget = get_budget(self.view_name)
+        measured = {'queries': self.count, 'db_time': self.db_time}
+        return {
+            limit: measured[limit] for limit in ('queries', 'db_time')
+            if limit in budget and measured[limit] > budget[limit]
+        }
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.count,
+            'db_time': round(self.db_time, 4),
+            'slowest_sql': self.slowest and self.slowest[0],
+            'slowest_time': self.slowest and self.slowest[1],
+            'duplicates': self.duplicates,
+        }
+
+
+class capture_queries(object):
+    """Context manager recording the queries made on every database"""
+
+    def __enter__(self):
+        self.states = []
+        for connection in connections.all():
+            self.states.append((
+                connection,
+                connection.force_debug_cursor,
+                len(connection.queries_log),
+            ))
+            connection.force_debug_cursor = True
+        return self
+
+    def __exit__(self, *exc_info):
+        self.queries = []
+        for connection, force_debug_cursor, start in self.states:
+            connection.force_debug_cursor = force_debug_cursor
+            self.queries.extend(list(connection.queries_log)[start:])
+            if not force_debug_cursor and not settings.DEBUG:
+                # Nothing else reads the log, don't let it grow unbounded
+                connection.queries_log.clear()
+
+
+class QueryBudgetMiddleware(object):
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with capture_queries() as captured:
+            response = self.get_response(request)
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        report = QueryReport(view_name, captured.queries)
+        request.query_report = report
+
+        over_budget = report.over_budget()
+        with _lock:
+            stats = _stats[view_name]
+            stats['requests'] += 1
+            stats['queries'] += report.count
+            stats['db_time'] += report.db_time
+            stats['over_budget'] += bool(over_budget)
+        if over_budget:
+            logger.warning(
+                'Query budget exceeded by %s: %s', view_name,
+                ', '.join('{}={}'.format(*item)
+                          for item in sorted(over_budget.items())),
+                extra=dict(report.as_dict(), path=request.path,
+                           over_budget=over_budget)
+            )
+        return response
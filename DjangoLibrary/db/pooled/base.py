@@ -0,0 +1,105 @@
+"""
+PostgreSQL backend keeping a persistent connection per worker thread, which
+is health checked the first time each new request reuses it.
+
+Configured through the database's POOL settings:
+
+    HEALTH_CHECK_INTERVAL: Seconds a connection may sit idle before it's
+                           checked with `SELECT 1` on reuse.
+    TRANSACTION_POOLING:   Set when connecting through PgBouncer in
+                           transaction pooling mode, so no session state is
+                           set on the connection.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+
+from DjangoLibrary import tracing
+
+_lock = threading.Lock()
+_stats = defaultdict(lambda: {
+    'hits': 0,  # Requests which reused a healthy connection
+    'misses': 0,  # New connections opened
+    'failed_checks': 0,  # Reused connections which failed the health check
+    'wait_time': 0.0,  # Seconds spent opening new connections
+})
+
+
+def get_pool_stats():
+    """Returns a copy of this process's connection stats keyed by alias"""
+    with _lock:
+        return {alias: dict(stats) for alias, stats in _stats.items()}
+
+
+def _record(alias, **increments):
+    with _lock:
+        stats = _stats[alias]
+        for key, value in increments.items():
+            stats[key] += value
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super(DatabaseWrapper, self).__init__(*args, **kwargs)
+        pool = self.settings_dict.get('POOL', {})
+        self.health_check_interval = pool.get('HEALTH_CHECK_INTERVAL', 0)
+        self.transaction_pooling = pool.get('TRANSACTION_POOLING', False)
+        # Set between requests, whilst the connection is sat idle
+        self.reused = False
+        self.last_used = None
+
+    def ensure_connection(self):
+        if self.connection is not None and self.reused:
+            self.reused = False
+            self.check_reused_connection()
+        if self.connection is None:
+            started = time.time()
+            super(DatabaseWrapper, self).ensure_connection()
+            _record(self.alias, misses=1, wait_time=time.time() - started)
+
+    def cursor(self):
+        cursor = super(DatabaseWrapper, self).cursor()
+        if tracing.current_trace() is not None:
+            return tracing.TracedCursor(cursor, self.alias)
+        return cursor
+
+    def check_reused_connection(self):
+        """Closes the connection if it's been idle and no longer works"""
+        idle = time.time() - self.last_used
+        if idle >= self.health_check_interval and not self.is_usable():
+            _record(self.alias, failed_checks=1)
+            self.close()
+        else:
+            _record(self.alias, hits=1)
+
+    def close_if_unusable_or_obsolete(self):
+        # Called when each request starts and finishes
+        super(DatabaseWrapper, self).close_if_unusable_or_obsolete()
+        if self.connection is not None and not self.reused:
+            self.reused = True
+            self.last_used = time.time()
+
+    def get_connection_params(self):
+        conn_params = super(DatabaseWrapper, self).get_connection_params()
+        if self.transaction_pooling:
+            # Sent as a startup parameter, which PgBouncer tracks per client
+            conn_params['client_encoding'] = 'UTF8'
+        return conn_params
+
+    def init_connection_state(self):
+        if not self.transaction_pooling:
+            return super(DatabaseWrapper, self).init_connection_state()
+        # A SET TIME ZONE would only apply to whichever server connection
+        # PgBouncer handed out, so the role's default has to match instead
+        conn_timezone_name = self.connection.get_parameter_status('TimeZone')
+        if self.timezone_name and conn_timezone_name != self.timezone_name:
+            raise ImproperlyConfigured(
+                "Transaction pooling requires the database role's timezone "
+                "to be {0}, e.g. ALTER ROLE {1} SET timezone TO '{0}'".format(
+                    self.timezone_name, self.settings_dict['USER'])
+            )
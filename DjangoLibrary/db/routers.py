@@ -0,0 +1,87 @@
+"""
+Routes reads made by replica safe views to a read replica, every other read
+and all writes go to the primary (default) database
+"""
+
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Cookie set after a write so the client's following reads see its changes
+PIN_COOKIE_NAME = 'primary_pin'
+
+SAFE_METHODS = ('GET', 'HEAD')
+
+_state = threading.local()
+
+
+def replica_safe(view):
+    """Marks a view function or class as safe to be served from a replica"""
+    view.replica_safe = True
+    return view
+
+
+def is_replica_safe(view_func):
+    view_class = getattr(view_func, 'view_class', None)
+    return (getattr(view_func, 'replica_safe', False) or
+            getattr(view_class, 'replica_safe', False))
+
+
+def get_replica():
+    """Returns the replica alias selected for the current request, if any"""
+    return getattr(_state, 'replica', None)
+
+
+def set_replica(alias):
+    _state.replica = alias
+
+
+class ReplicaRouter(object):
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica()
+        # Reads inside a transaction on the primary must see its writes
+        if replica and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary so relations between them are fine
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware(object):
+    """
+    Sends GET requests for replica safe views to a randomly chosen replica,
+    unless the client has recently made a write and is pinned to the primary
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            set_replica(None)
+        if request.method not in SAFE_METHODS:
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1',
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.REPLICA_DATABASES and
+                request.method in SAFE_METHODS and
+                PIN_COOKIE_NAME not in request.COOKIES and
+                is_replica_safe(view_func)):
+            set_replica(random.choice(settings.REPLICA_DATABASES))
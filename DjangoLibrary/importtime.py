@@ -0,0 +1,95 @@
+"""
+Startup time of each kind of process, measured with `python -X importtime`.
+
+Each target runs in a new interpreter, so modules already imported by the
+process measuring don't hide their cost, and with the same settings and
+environment. The wall time includes starting the interpreter, the import
+times are what each module took itself, excluding the modules it imported.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+# Code run on startup by each kind of process
+TARGETS = {
+    'setup': 'import django; django.setup()',
+    'wsgi': 'import DjangoLibrary.wsgi',
+    'celery': (
+        'import django; django.setup(); '
+        'from DjangoLibrary.celery import app; '
+        'app.loader.import_default_modules()'
+    ),
+}
+
+Import = namedtuple('Import', 'module own cumulative depth')
+
+
+def parse(output):
+    """Returns an Import for each line of -X importtime output"""
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            own, cumulative = int(fields[0]), int(fields[1])
+        except ValueError:
+            # The header line
+            continue
+        module = fields[2].strip()
+        # Nested imports are indented by two spaces a level
+        depth = (len(fields[2].rstrip()) - len(module) - 1) // 2
+        imports.append(Import(module, own / 1e6, cumulative / 1e6, depth))
+    return imports
+
+
+def measure(target):
+    """Returns the wall seconds and imports of starting a target"""
+    started = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', TARGETS[target]],
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        cwd=os.path.dirname(settings.BASE_DIR), universal_newlines=True)
+    elapsed = time.perf_counter() - started
+    if process.returncode:
+        raise RuntimeError('{} failed to start:\n{}'.format(
+            target, process.stderr[-2000:]))
+    imports = parse(process.stderr)
+    if not imports:
+        # Interpreters before 3.7 ignore the option rather than failing
+        raise RuntimeError(
+            '{} reported no imports, -X importtime needs Python 3.7 or '
+            'later'.format(target))
+    return elapsed, imports
+
+
+def by_package(imports):
+    """Returns the (package, seconds) of imports, slowest first"""
+    totals = Counter()
+    for imported in imports:
+        totals[imported.module.partition('.')[0]] += imported.own
+    return totals.most_common()
+
+
+def report(target, repeat=1, limit=10):
+    """
+    Returns the startup times of a target, from the fastest of repeat runs
+    as the slower ones are mostly noise
+    """
+    elapsed, imports = min(
+        (measure(target) for _ in range(repeat)), key=lambda run: run[0])
+    slowest = sorted(imports, key=lambda imported: -imported.own)[:limit]
+    return {
+        'seconds': round(elapsed, 4),
+        'import_seconds': round(sum(i.own for i in imports), 4),
+        'modules': len(imports),
+        'packages': [(package, round(seconds, 4))
+                     for package, seconds in by_package(imports)[:limit]],
+        'slowest': [(imported.module, round(imported.own, 4))
+                    for imported in slowest],
+    }
@@ -0,0 +1,330 @@
+"""
+In-process metrics exported in the Prometheus text format.
+
+Counters and histograms are kept in memory by each process. When
+METRICS['DIRECTORY'] is set each process also writes its values to its own
+file there, at most every METRICS['FLUSH_INTERVAL'] seconds, and the metrics
+view sums the files of every process. A scrape of any gunicorn worker then
+reports the totals of all workers and Celery processes. Files of exited
+processes are kept, so counters never go backwards, and are named by a
+random id as well as the pid so a process reusing a pid doesn't overwrite
+them.
+
+The directory grows by a file for each recycled worker, so it should be
+emptied whenever every process is restarted, e.g. on deploy, before the new
+processes start. Prometheus treats the drop in totals as a counter reset.
+
+Collectors report counts kept elsewhere, such as the query and cache stats, as
+metrics whenever a process's values are flushed or exported.
+"""
+
+import hmac
+import json
+import os
+import tempfile
+import threading
+import uuid
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter, time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseForbidden
+from django.urls import Resolver404, resolve
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+_lock = threading.Lock()
+_last_flush = {'time': 0.0}
+_file = {'pid': None, 'name': None}
+
+# Every metric by name, and the functions collecting metrics kept elsewhere
+registry = OrderedDict()
+collectors = []
+
+
+class Metric(object):
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        registry[name] = self
+
+    def _key(self, labels):
+        return tuple(str(labels[label]) for label in self.labels)
+
+    def _items(self):
+        with _lock:
+            return [(dict(zip(self.labels, key)), value)
+                    for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for labels, value in self._items():
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Observations above the last bucket are counted in the +Inf bucket
+        index = bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the seconds spent in the block"""
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, **labels)
+
+    def samples(self):
+        bounds = self.buckets + (float('inf'),)
+        for labels, counts in self._items():
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield (self.name + '_bucket',
+                       dict(labels, le=format_value(bound)), cumulative)
+            yield self.name + '_sum', labels, counts[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+def collector(func):
+    """
+    Registers a function returning a list of (name, type, documentation,
+    samples) metric families, samples are (name, labels, value) tuples
+    """
+    collectors.append(func)
+    return func
+
+
+def collect_local():
+    """Returns the metric families of this process"""
+    families = OrderedDict()
+    for metric in list(registry.values()):
+        families[metric.name] = {
+            'type': metric.type,
+            'help': metric.documentation,
+            'samples': list(metric.samples()),
+        }
+    for collect in collectors:
+        for name, metric_type, documentation, samples in collect():
+            families[name] = {
+                'type': metric_type,
+                'help': documentation,
+                'samples': list(samples),
+            }
+    return families
+
+
+def get_file_name():
+    """
+    Returns the name of this process's file, made again after a fork so
+    children of a preloading parent don't share it
+    """
+    pid = os.getpid()
+    if _file['pid'] != pid:
+        _file['pid'] = pid
+        _file['name'] = '{}-{}.json'.format(pid, uuid.uuid4().hex)
+    return _file['name']
+
+
+def flush(force=False):
+    """Writes this process's metrics to its file in METRICS['DIRECTORY']"""
+    options = settings.METRICS
+    directory = options['DIRECTORY']
+    now = time()
+    interval = options['FLUSH_INTERVAL']
+    if not directory or (not force and now - _last_flush['time'] < interval):
+        return
+    _last_flush['time'] = now
+    os.makedirs(directory, exist_ok=True)
+    # Written to a temporary file first so readers never see half a file
+    with tempfile.NamedTemporaryFile(
+            'w', dir=directory, suffix='.tmp', delete=False) as output:
+        json.dump(collect_local(), output)
+    os.replace(output.name, os.path.join(directory, get_file_name()))
+
+
+def merge(families, merged):
+    """Adds the samples of families to merged"""
+    for name, family in families.items():
+        totals = merged.setdefault(name, {
+            'type': family['type'],
+            'help': family['help'],
+            'samples': OrderedDict(),
+        })['samples']
+        for sample_name, labels, value in family['samples']:
+            key = (sample_name, tuple(sorted(labels.items())))
+            totals[key] = totals.get(key, 0) + value
+
+
+def collect():
+    """Returns the metric families summed across every process"""
+    merged = OrderedDict()
+    directory = settings.METRICS['DIRECTORY']
+    if not directory:
+        merge(collect_local(), merged)
+        return merged
+    flush(force=True)
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as families:
+                merge(json.load(families), merged)
+        except (IOError, ValueError):
+            continue
+    return merged
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\').replace('\n', r'\n')
+            .replace('"', r'\"'))
+
+
+def export(families):
+    """Returns metric families in the Prometheus text format"""
+    lines = []
+    for name, family in families.items():
+        lines.append('# HELP {} {}'.format(name, family['help']))
+        lines.append('# TYPE {} {}'.format(name, family['type']))
+        for (sample_name, labels), value in family['samples'].items():
+            if labels:
+                sample_name += '{{{}}}'.format(','.join(
+                    '{}="{}"'.format(label, escape(label_value))
+                    for label, label_value in labels))
+            lines.append('{} {}'.format(sample_name, format_value(value)))
+    return '\n'.join(lines) + '\n'
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Time spent handling requests',
+    ('view', 'method', 'status'))
+
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Time spent running Celery tasks',
+    ('task', 'state'), buckets=DEFAULT_BUCKETS + (30, 60, 300, 900))
+
+
+@collector
+def collect_query_stats():
+    from .db.budget import get_query_stats
+    stats = sorted(get_query_stats().items())
+    return [
+        ('view_queries_total', 'counter', 'Queries made by each view',
+         [('view_queries_total', {'view': view}, totals['queries'])
+          for view, totals in stats]),
+        ('view_db_seconds_total', 'counter', 'Time spent in the database '
+         'by each view',
+         [('view_db_seconds_total', {'view': view}, totals['db_time'])
+          for view, totals in stats]),
+    ]
+
+
+@collector
+def collect_pool_stats():
+    from .db.pooled.base import get_pool_stats
+    stats = sorted(get_pool_stats().items())
+    return [
+        ('db_connections_total', 'counter', 'Requests which reused (hit) or '
+         'opened (miss) a database connection, and failed health checks',
+         [('db_connections_total', {'alias': alias, 'result': result},
+           totals[result])
+          for alias, totals in stats
+          for result in ('hits', 'misses', 'failed_checks')]),
+        ('db_connect_seconds_total', 'counter',
+         'Time spent opening database connections',
+         [('db_connect_seconds_total', {'alias': alias}, totals['wait_time'])
+          for alias, totals in stats]),
+    ]
+
+
+@collector
+def collect_cache_stats():
+    get_stats = getattr(caches['default'], 'get_stats', None)
+    stats = get_stats() if get_stats else {}
+    return [
+        ('cache_events_total', 'counter',
+         'Hits, misses and evictions of the default cache',
+         [('cache_events_total', {'event': event}, count)
+          for event, count in sorted(stats.items())
+          if event not in ('local_entries', 'max_local_entries')]),
+    ]
+
+
+def get_view_name(request):
+    match = request.resolver_match
+    if match is None:
+        # Requests answered by middleware, such as page cache hits
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unresolved'
+    return match.view_name
+
+
+class MetricsMiddleware(object):
+    """Times requests, should come first to include the other middleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = perf_counter()
+        response = self.get_response(request)
+        REQUEST_DURATION.observe(
+            perf_counter() - started, view=get_view_name(request),
+            method=request.method, status=response.status_code)
+        flush()
+        return response
+
+
+def metrics_view(request):
+    """
+    Exports the metrics of every process, to staff or to scrapers sending
+    the METRICS['TOKEN'] as a bearer token
+    """
+    token = settings.METRICS['TOKEN']
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    user = getattr(request, 'user', None)
+    if not ((user is not None and user.is_staff) or (token and
+            hmac.compare_digest(authorization, 'Bearer ' + token))):
+        return HttpResponseForbidden()
+    return HttpResponse(export(collect()), content_type=CONTENT_TYPE)
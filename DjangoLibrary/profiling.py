@@ -0,0 +1,149 @@
+"""
+On-demand statistical profiling of live requests.
+
+ProfilingMiddleware profiles a sampled fraction of requests, set by
+PROFILING['SAMPLE_RATE'], and any request sent by staff, or with the
+PROFILING['TOKEN'], in the PROFILING['HEADER'] header. Whilst a request is
+profiled a background thread samples its stack every PROFILING['INTERVAL']
+seconds; requests which aren't profiled only pay for a random() call.
+
+Profiles are saved by URL name in the collapsed stack format read by flame
+graph tools (one `frame;frame;frame count` line per stack), so aggregating
+them is just summing the counts.
+"""
+
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+
+class StackSampler(object):
+    """Samples the stack of a thread at a regular interval"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        return self.stacks
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+
+
+def collapse(frame):
+    """Returns a frame's stack as `module:function` names, outermost first"""
+    names = []
+    while frame is not None:
+        names.append('{}:{}'.format(
+            frame.f_globals.get('__name__', '?'), frame.f_code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def get_directory(view_name=None):
+    directory = settings.PROFILING['DIRECTORY']
+    if view_name is not None:
+        directory = os.path.join(directory, view_name)
+    return directory
+
+
+def save_profile(view_name, stacks):
+    """Saves a request's stacks, keeping the latest MAX_PROFILES per view"""
+    directory = get_directory(view_name)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(
+        directory, '{:.6f}-{}.folded'.format(time.time(), os.getpid()))
+    with open(path, 'w') as profile:
+        for stack, count in stacks.items():
+            profile.write('{} {}\n'.format(stack, count))
+    for name in sorted(os.listdir(directory))[
+            :-settings.PROFILING['MAX_PROFILES']]:
+        os.remove(os.path.join(directory, name))
+    return path
+
+
+def list_profiles():
+    """Returns the number of saved profiles of each view"""
+    directory = get_directory()
+    if not os.path.isdir(directory):
+        return {}
+    return {
+        view_name: len(os.listdir(os.path.join(directory, view_name)))
+        for view_name in sorted(os.listdir(directory))
+    }
+
+
+def load_profiles(view_name, limit=None):
+    """
+    Returns the stacks of a view's profiles summed together, only the latest
+    limit profiles are included if given
+    """
+    stacks = Counter()
+    directory = get_directory(view_name)
+    names = sorted(os.listdir(directory), reverse=True)
+    for name in names[:limit]:
+        with open(os.path.join(directory, name)) as profile:
+            for line in profile:
+                stack, count = line.rsplit(' ', 1)
+                stacks[stack] += int(count)
+    return stacks
+
+
+def is_requested(request):
+    """Returns True if a request asks to be profiled, and may be"""
+    options = settings.PROFILING
+    value = request.META.get(
+        'HTTP_' + options['HEADER'].upper().replace('-', '_'))
+    if not value:
+        return False
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    return bool(options['TOKEN']) and hmac.compare_digest(
+        value, options['TOKEN'])
+
+
+class ProfilingMiddleware(object):
+    """
+    Profiles sampled and requested requests, should come after the
+    AuthenticationMiddleware so staff can request profiles
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = settings.PROFILING
+        if not (random.random() < options['SAMPLE_RATE'] or
+                is_requested(request)):
+            return self.get_response(request)
+
+        sampler = StackSampler(threading.get_ident(), options['INTERVAL'])
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = sampler.stop()
+        match = request.resolver_match
+        if stacks and match is not None:
+            save_profile(match.view_name, stacks)
+        response['X-Profile-Samples'] = sum(stacks.values())
+        return response
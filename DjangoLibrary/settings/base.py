@@ -5,9 +5,19 @@ from configparser import ConfigParser
 
 import os
 
-# Load settings.ini file configuration
+# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Load settings.ini file configuration, found next to manage.py whatever
+# directory the process was started in unless SETTINGS_INI names another
 config = ConfigParser(allow_no_value=True)
-config.read('settings.ini')
+config.read(os.environ.get(
+    'SETTINGS_INI', os.path.join(os.path.dirname(BASE_DIR), 'settings.ini')))
+
+
+def get_project_path(path):
+    """Returns a path from settings.ini relative to the project root"""
+    return os.path.join(os.path.dirname(BASE_DIR), path) if path else path
 
 
 def get_env_variable(var_name):
@@ -29,6 +39,58 @@ LOAN_DURATION = timedelta(days=default.getint('LOAN_DURATION', 7))
 RENEW_DURATION = timedelta(days=default.getint('RENEW_DURATION', 2))
 RENEW_WINDOW = timedelta(days=default.getint('RENEW_WINDOW', 2))
 
+# How long returned loans stay in the loans table before being archived
+LOAN_ARCHIVE_AFTER = timedelta(days=default.getint('LOAN_ARCHIVE_AFTER', 30))
+
+# How long after a loan's end date escalation reminders are sent
+REMINDER_ESCALATIONS = [timedelta(days=days) for days in (7, 14, 28)]
+
+# Number of rows handled by each subtask of a fanned out job, see books.tasks
+TASK_CHUNK_SIZE = default.getint('TASK_CHUNK_SIZE', 500)
+
+# Limits on the background refresh of book metadata, see books.metadata
+METADATA_REFRESH = {
+    'MAX_AGE': timedelta(days=default.getint('METADATA_MAX_AGE', 90)),
+    'RETRY_AFTER': timedelta(days=7),
+    'BATCH_SIZE': 50,
+    'BUDGET': default.getint('METADATA_REFRESH_BUDGET', 500),
+    'CONCURRENCY': default.getint('METADATA_REFRESH_CONCURRENCY', 2),
+    'RATE': 1,  # Lookups a second
+}
+
+# Statistical profiling of live requests, see DjangoLibrary.profiling. Staff,
+# or anyone with the TOKEN, can profile a request by sending the HEADER
+PROFILING = {
+    'SAMPLE_RATE': default.getfloat('PROFILING_SAMPLE_RATE', 0),
+    'INTERVAL': 0.005,  # Seconds between stack samples
+    'HEADER': 'X-Profile',
+    'TOKEN': os.environ.get('PROFILING_TOKEN', ''),
+    'DIRECTORY': get_project_path(
+        default.get('PROFILING_DIRECTORY', 'profiles')),
+    'MAX_PROFILES': 100,  # Kept per view
+}
+
+# Prometheus metrics, see DjangoLibrary.metrics. Each process writes its
+# metrics to the DIRECTORY so they can be summed across gunicorn workers,
+# leave it empty to only export the metrics of the scraped process
+METRICS = {
+    'DIRECTORY': default.get('METRICS_DIRECTORY', ''),
+    'FLUSH_INTERVAL': 5,  # Seconds
+    'TOKEN': os.environ.get('METRICS_TOKEN', ''),
+}
+
+# Tracing of requests and tasks, see DjangoLibrary.tracing. Traces are
+# written to the DIRECTORY, leave it empty to disable exporting them
+TRACING = {
+    'SAMPLE_RATE': default.getfloat('TRACING_SAMPLE_RATE', 0),
+    'DIRECTORY': get_project_path(
+        default.get('TRACING_DIRECTORY', 'traces')),
+    'SERVICE_NAME': 'djangolibrary',
+    'MAX_SPANS': 1000,  # Per trace, later spans are dropped
+    # Continue sampled traces started by callers' traceparent headers
+    'TRUST_TRACEPARENT': False,
+}
+
 
 #
 # -- Environment variable configuration --
@@ -43,10 +105,20 @@ EMAIL_HOST_USER = email_settings.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = email_settings.get('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_TLS = email_settings.getboolean('EMAIL_USE_TLS', False)
 EMAIL_USE_SSL = email_settings.getboolean('EMAIL_USE_SSL', False)
+# Number of reminder emails rendered and sent at a time
+EMAIL_BATCH_SIZE = email_settings.getint('EMAIL_BATCH_SIZE', 100)
 
 
-# Google Books API key
-GOOGLE_BOOKS_API_KEY = get_env_variable('GOOGLE_BOOKS_API_KEY')
+# Google Books API key, read when the Google Books provider is used
+GOOGLE_BOOKS_API_KEY = os.environ.get('GOOGLE_BOOKS_API_KEY', '')
+
+# ISBN metadata providers, tried in order until one finds the book. Classes
+# such as books.providers.LocalProvider are instantiated with OPTIONS
+ISBN_PROVIDERS = [
+    {'PROVIDER': 'books.isbn._scrape_goob', 'NAME': 'goob'},
+    {'PROVIDER': 'books.isbn._scrape_openlibrary', 'NAME': 'openlibrary'},
+    {'PROVIDER': 'books.isbn._scrape_wcat', 'NAME': 'wcat'},
+]
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = get_env_variable('SECRET_KEY')
@@ -67,10 +139,6 @@ LOGOUT_REDIRECT_URL = 'books:book-list'
 INTERNAL_IPS = ('127.0.0.1',)
 
 
-# Build paths inside the project like this: os.path.join(BASE_DIR, ...)
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = False
 
@@ -93,13 +161,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'DjangoLibrary.tracing.TracingMiddleware',
+    'DjangoLibrary.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'books.pagecache.PageCacheMiddleware',
+    'DjangoLibrary.db.budget.QueryBudgetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'DjangoLibrary.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'DjangoLibrary.db.routers.ReplicaMiddleware',
 ]
 
 ROOT_URLCONF = 'DjangoLibrary.urls'
@@ -115,6 +189,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'books.pagecache.csrf_placeholder',
             ],
         },
     },
@@ -128,15 +203,30 @@ WSGI_APPLICATION = 'DjangoLibrary.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql_psycopg2',
+        'ENGINE': 'DjangoLibrary.db.pooled',
         'NAME': 'djangolibrary',
         'USER': 'librarian',
         'PASSWORD': 'library',
         'HOST': 'localhost',
         'PORT': '',
+        # Keep connections open between requests
+        'CONN_MAX_AGE': 600,
+        'POOL': {
+            'HEALTH_CHECK_INTERVAL': 30,
+            # Enable when connecting through PgBouncer's transaction pooling
+            'TRANSACTION_POOLING': False,
+        },
     }
 }
 
+# Database aliases of read replicas, used by views marked `replica_safe`
+REPLICA_DATABASES = []
+
+# Seconds a client's reads stay on the primary after making a write
+REPLICA_PIN_SECONDS = 10
+
+DATABASE_ROUTERS = ['DjangoLibrary.db.routers.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.10/ref/settings/#auth-password-validators
@@ -160,12 +250,65 @@ AUTH_PASSWORD_VALIDATORS = [
 # Caching
 # https://docs.djangoproject.com/en/1.10/topics/cache/
 CACHES = {
+    # In-process LRU in front of the shared cache, see DjangoLibrary.cache
     'default': {
-        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
-        'LOCATION': 'cache_table',
-    }
+        'BACKEND': 'DjangoLibrary.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_LOCAL_ENTRIES': 5000,
+            'LOCAL_TIMEOUT': 5,
+        },
+    },
+    # Shared by every process, a per process stand-in unless using Redis
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+    },
 }
 
+# Sessions are read from the shared cache and only written, to the cache and
+# the database, when they change on login and logout. Not the default cache,
+# whose in-process tier would keep a session alive for a few seconds after
+# logging out in another process
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'shared'
+
+# Flash messages are kept in a signed cookie, never in the session
+MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Timeouts and versions of each cache namespace, see books.cache. Versions
+# are read from the shared cache, as the default cache's in-process tier
+# would keep serving outdated entries for a few seconds after a bump in
+# another process
+CACHE_NAMESPACES = {
+    'metadata': {'timeout': 60 * 60 * 24 * 30, 'version': 1},
+    'catalog': {'timeout': 60, 'version': 1},
+    'objects': {'timeout': 60 * 5, 'version': 1},
+    'pages': {'timeout': 60 * 60, 'version': 1},
+    'versions': {
+        'timeout': 60 * 60 * 24 * 30, 'version': 1, 'cache': 'shared',
+    },
+}
+
+# Query count and DB time (seconds) allowed per request by URL name, see
+# DjangoLibrary.db.budget
+QUERY_BUDGETS = {
+    'default': {'queries': 30, 'db_time': 0.5},
+    'books:index': {'queries': 10},
+    'books:book-list': {'queries': 15},
+    'books:book-detail': {'queries': 15},
+    'books:author-list': {'queries': 10},
+    'books:genre-list': {'queries': 10},
+    'books:customer-detail': {'queries': 10},
+}
+
+# Anonymous pages are served from the page cache for up to PAGE_CACHE_SECONDS
+# and served stale for as long as PAGE_CACHE_LOCK_SECONDS whilst they're
+# regenerated, see books.pagecache
+PAGE_CACHE_SECONDS = 60 * 5
+PAGE_CACHE_LOCK_SECONDS = 30
+
 
 # Password hashers
 # https://docs.djangoproject.com/en/1.10/topics/auth/passwords/#how-django-stores-passwords
@@ -198,3 +341,15 @@ USE_TZ = True
 STATIC_URL = '/static/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+
+MEDIA_URL = '/media/'
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Width and height of each size of cached book cover, see books.covers
+COVER_SIZES = {
+    'grid': (150, 225),
+    'detail': (300, 450),
+}
+
+COVER_DOWNLOAD_TIMEOUT = 10
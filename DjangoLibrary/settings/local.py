@@ -1,5 +1,7 @@
 from .base import *
 
+import os
+
 # Turn on debugging
 DEBUG = True
 
@@ -14,3 +16,13 @@ MIDDLEWARE += [
 ]
 
 INTERNAL_IPS = ('127.0.0.1',)
+
+# Optionally route catalog reads to a second local Postgres instance, e.g.
+# REPLICA_PORT=5433 python manage.py runserver
+if os.environ.get('REPLICA_PORT'):
+    DATABASES['replica'] = dict(
+        DATABASES['default'],
+        PORT=os.environ['REPLICA_PORT'],
+        TEST={'MIRROR': 'default'},
+    )
+    REPLICA_DATABASES = ['replica']
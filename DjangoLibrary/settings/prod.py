@@ -1,10 +1,22 @@
 from .base import *
 
-from django_auth_ldap.config import LDAPSearch, GroupOfNamesType
-
 import os
-import raven
-import ldap
+
+
+def get_release():
+    """
+    Returns the release from the RELEASE environment variable, or from the
+    REVISION file written when building, e.g. git rev-parse HEAD > REVISION,
+    rather than asking git on every process start
+    """
+    release = os.environ.get('RELEASE')
+    if release:
+        return release
+    try:
+        with open(os.path.join(os.path.dirname(BASE_DIR), 'REVISION')) as f:
+            return f.read().strip() or None
+    except IOError:
+        return None
 
 
 SECRET_KEY = get_env_variable('SECRET_KEY')
@@ -15,15 +27,25 @@ INSTALLED_APPS += [
 
 RAVEN_CONFIG = {
     'dsn': get_env_variable('RAVEN_DSN'),
-    # If you are using git, you can also automatically configure the
-    # release based on the git info.
-    'release': raven.fetch_git_sha(os.path.dirname(os.pardir)),
+    'release': get_release(),
 }
 
 
+# Share cache entries between worker processes through Redis
+CACHES['shared'] = {
+    'BACKEND': 'django_redis.cache.RedisCache',
+    'LOCATION': get_env_variable('REDIS_URL'),
+}
+
+# Fanned out jobs in books.tasks collect their chunks' results with a chord
+CELERY_RESULT_BACKEND = get_env_variable('REDIS_URL')
+
+
 # https://docs.djangoproject.com/en/dev/ref/settings/#authentication-backends
+# The LDAP searches and options are set by DjangoLibrary.auth.LDAPBackend, so
+# python-ldap is only imported once a user authenticates
 AUTHENTICATION_BACKENDS = (
-    'django_auth_ldap.backend.LDAPBackend',
+    'DjangoLibrary.auth.LDAPBackend',
     'django.contrib.auth.backends.ModelBackend',
 )
 
@@ -33,14 +55,8 @@ AUTH_LDAP_BIND_DN = ""
 
 AUTH_LDAP_BIND_PASSWORD = ""
 
-AUTH_LDAP_USER_SEARCH = LDAPSearch(
-    "dc=tiger-computing,dc=co,dc=uk", ldap.SCOPE_SUBTREE, "(uid=%(user)s)"
-)
-
 AUTH_LDAP_START_TLS = True
 
-AUTH_LDAP_GLOBAL_OPTIONS = {ldap.OPT_X_TLS_REQUIRE_CERT: ldap.OPT_X_TLS_NEVER}
-
 AUTH_LDAP_USER_ATTR_MAP = {
     "first_name": "givenName", "last_name": "sn", "email": "mail"
 }
@@ -50,12 +66,4 @@ AUTH_LDAP_USER_FLAGS_BY_GROUP = {
     "is_superuser": "cn=tcl-piesup,ou=groups,dc=tiger-computing,dc=co,dc=uk"
 }
 
-AUTH_LDAP_GROUP_TYPE = GroupOfNamesType()
-
-AUTH_LDAP_GROUP_SEARCH = LDAPSearch(
-    "ou=groups,dc=tiger-computing,dc=co,dc=uk",
-    ldap.SCOPE_SUBTREE,
-    "(objectClass=groupOfNames)"
-)
-
 AUTH_LDAP_MIRROR_GROUPS = True
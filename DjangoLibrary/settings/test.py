@@ -16,6 +16,21 @@ CACHES = {
     }
 }
 
+# Tests override CACHES with just a default cache
+SESSION_CACHE_ALIAS = 'default'
+CACHE_NAMESPACES = dict(CACHE_NAMESPACES, versions=dict(
+    CACHE_NAMESPACES['versions'], cache='default'))
+
+# Serve ISBN metadata from a fixture corpus instead of the network
+ISBN_PROVIDERS = [{
+    'PROVIDER': 'books.providers.LocalProvider',
+    'OPTIONS': {
+        'CORPUS': os.path.join(
+            os.path.dirname(BASE_DIR), 'books', 'tests', 'fixtures',
+            'metadata.jsonl'),
+    },
+}]
+
 # Enable minimal amount of middleware
 MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -0,0 +1,245 @@
+"""
+Lightweight tracing of requests and tasks, exported as Zipkin v2 JSON.
+
+A trace is started for a TRACING['SAMPLE_RATE'] fraction of requests, or for
+tasks enqueued whilst a trace was active, and records a tree of spans:
+
+    with span('cache.get', namespace='objects'):
+        ...
+
+Spans started outside a trace cost one thread local lookup. Trace context is
+passed to Celery tasks in the W3C `traceparent` message header, and accepted
+from incoming requests when TRACING['TRUST_TRACEPARENT'] is set, e.g. behind
+a proxy which starts traces itself.
+
+Each process appends its finished traces to its own file in
+TRACING['DIRECTORY'], a JSON list of spans per line, which can be posted as
+is to a Zipkin or Jaeger collector's /api/v2/spans.
+"""
+
+import binascii
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+TRACEPARENT_PATTERN = re.compile(
+    r'^00-(?P<trace_id>[0-9a-f]{32})-(?P<parent_id>[0-9a-f]{16})-'
+    r'(?P<flags>[0-9a-f]{2})$')
+
+MAX_TAG_LENGTH = 1000
+
+_local = threading.local()
+
+
+def new_id(size):
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+class Span(object):
+
+    def __init__(self, trace_id, name, parent_id=None, kind=None, tags=None):
+        self.trace_id = trace_id
+        self.id = new_id(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.tags = tags or {}
+        self.start = time.time()
+        self.duration = None
+
+    def as_zipkin(self):
+        span = {
+            'traceId': self.trace_id,
+            'id': self.id,
+            'name': self.name,
+            'timestamp': int(self.start * 1e6),
+            'duration': max(int(self.duration * 1e6), 1),
+            'localEndpoint': {
+                'serviceName': settings.TRACING['SERVICE_NAME'],
+            },
+            'tags': {key: str(value)[:MAX_TAG_LENGTH]
+                     for key, value in self.tags.items()},
+        }
+        if self.parent_id:
+            span['parentId'] = self.parent_id
+        if self.kind:
+            span['kind'] = self.kind
+        return span
+
+
+class Trace(object):
+    """The spans of a trace recorded by this thread"""
+
+    def __init__(self, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or new_id(16)
+        # Remote parent of the first span, e.g. the span enqueuing a task
+        self.parent_id = parent_id
+        self.open = []
+        self.finished = []
+        self.dropped = 0
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def parse_traceparent(value):
+    """Returns (trace_id, parent_id, sampled) from a traceparent header"""
+    match = TRACEPARENT_PATTERN.match(value or '')
+    if match is None:
+        return None
+    return (match.group('trace_id'), match.group('parent_id'),
+            bool(int(match.group('flags'), 16) & 1))
+
+
+def get_traceparent():
+    """Returns the traceparent header of the current span, if any"""
+    trace = current_trace()
+    if trace is None or not trace.open:
+        return None
+    return '00-{}-{}-01'.format(trace.trace_id, trace.open[-1].id)
+
+
+def start_span(name, kind=None, **tags):
+    """Starts a child of the current span, if a trace is active"""
+    trace = current_trace()
+    if trace is None:
+        return None
+    parent_id = trace.open[-1].id if trace.open else trace.parent_id
+    span = Span(trace.trace_id, name, parent_id, kind, tags)
+    trace.open.append(span)
+    return span
+
+
+def start_trace(name, traceparent=None, kind=None, **tags):
+    """
+    Starts a trace if it's sampled, or a child span if a trace is already
+    active. Returns the span, or None when not sampled
+    """
+    if current_trace() is not None:
+        return start_span(name, kind, **tags)
+    context = parse_traceparent(traceparent)
+    if context is not None:
+        if not context[2]:
+            return None
+        _local.trace = Trace(context[0], context[1])
+    elif random.random() < settings.TRACING['SAMPLE_RATE']:
+        _local.trace = Trace()
+    else:
+        return None
+    return start_span(name, kind, **tags)
+
+
+def finish_span(span):
+    """Finishes a span, exporting the trace when it's the first span"""
+    span.duration = time.time() - span.start
+    trace = current_trace()
+    if trace is None or span not in trace.open:
+        return
+    trace.open.remove(span)
+    # The first span is always kept, it's the root of the tree
+    if (len(trace.finished) < settings.TRACING['MAX_SPANS'] or
+            not trace.open):
+        trace.finished.append(span)
+    else:
+        trace.dropped += 1
+    if not trace.open:
+        del _local.trace
+        export(trace)
+
+
+@contextmanager
+def span(name, kind=None, **tags):
+    """Records the block as a child of the current span"""
+    current = start_span(name, kind, **tags)
+    if current is None:
+        yield None
+        return
+    try:
+        yield current
+    except Exception as e:
+        current.tags['error'] = type(e).__name__
+        raise
+    finally:
+        finish_span(current)
+
+
+def export(trace):
+    """Appends a finished trace to this process's file"""
+    directory = settings.TRACING['DIRECTORY']
+    if not directory:
+        return
+    spans = [span.as_zipkin() for span in trace.finished]
+    if trace.dropped:
+        spans[-1]['tags']['dropped_spans'] = str(trace.dropped)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, '{}.jsonl'.format(os.getpid()))
+    with open(path, 'a') as output:
+        output.write(json.dumps(spans) + '\n')
+
+
+class TracedCursor(object):
+    """Cursor wrapper recording a span for each query"""
+
+    def __init__(self, cursor, alias):
+        self.cursor = cursor
+        self.alias = alias
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.cursor.__exit__(*exc_info)
+
+    def execute(self, sql, params=None):
+        with span('db.query', 'CLIENT', db=self.alias, sql=sql):
+            return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        with span('db.query', 'CLIENT', db=self.alias, sql=sql):
+            return self.cursor.executemany(sql, param_list)
+
+
+class TracingMiddleware(object):
+    """
+    Traces sampled requests, should come first so the other middleware is
+    included in the trace
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        traceparent = None
+        if settings.TRACING['TRUST_TRACEPARENT']:
+            traceparent = request.META.get('HTTP_TRACEPARENT')
+        root = start_trace(
+            request.method, traceparent, 'SERVER',
+            **{'http.method': request.method, 'http.path': request.path})
+        if root is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except Exception as e:
+            root.tags['error'] = type(e).__name__
+            raise
+        else:
+            root.tags['http.status_code'] = response.status_code
+            return response
+        finally:
+            match = request.resolver_match
+            if match is not None:
+                root.name = '{} {}'.format(request.method, match.view_name)
+            finish_span(root)
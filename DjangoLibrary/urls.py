@@ -2,9 +2,12 @@ from django.conf import settings
 from django.conf.urls import include, url
 from django.contrib import admin
 
+from .metrics import metrics_view
+
 urlpatterns = [
     url('^', include('books.urls')),
     url(r'^admin/', admin.site.urls),
+    url(r'^metrics$', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
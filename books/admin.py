@@ -1,6 +1,14 @@
 from django.contrib import admin
 
-from .models import Author, Book, BookCopy, Customer, Genre, Loan
+from .models import (
+    ArchivedLoan, Author, Book, BookCopy, Customer, Genre, Loan, ReminderLog
+)
+
+
+@admin.register(ArchivedLoan)
+class ArchivedLoanAdmin(admin.ModelAdmin):
+    list_display = ('start_date', 'end_date', 'returned_on', 'customer')
+    date_hierarchy = 'end_date'
 
 
 @admin.register(Author)
@@ -39,4 +47,10 @@ class GenreAdmin(admin.ModelAdmin):
 
 @admin.register(Loan)
 class LoanAdmin(admin.ModelAdmin):
-    list_display = ('start_date', 'end_date', 'returned')
+    list_display = ('start_date', 'end_date', 'returned', 'next_reminder_on')
+
+
+@admin.register(ReminderLog)
+class ReminderLogAdmin(admin.ModelAdmin):
+    list_display = ('loan', 'kind', 'scheduled_on', 'sent_on')
+    list_filter = ('kind',)
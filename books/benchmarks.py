@@ -0,0 +1,181 @@
+"""
+View benchmarks run with the test client against the current database,
+usually a dataset made by the generate_dataset command.
+
+Each scenario makes one request per iteration, as a logged-in customer so
+the anonymous page cache is skipped, inside a transaction which is rolled
+back, so writes such as checkouts leave the dataset as it was. Latency is
+measured over every iteration, the queries of the last iteration are
+counted, and allocations are measured in one extra iteration with
+tracemalloc, which is too slow to leave running whilst timing.
+
+Results are compared with a baseline from an earlier run. Query counts
+mustn't grow at all, so a view whose queries grow with the data is caught
+however fast the benchmark machine is.
+"""
+
+import math
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from django.core.urlresolvers import reverse
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from .models import Book, BookCopy, Customer, Loan
+
+PERCENTILES = (50, 90, 99)
+
+
+class Fixtures(object):
+    """Rows picked from the dataset once, before any scenario runs"""
+
+    def __init__(self):
+        # Low numbered books and customers are the popular ones in
+        # generated datasets
+        self.book = Book.objects.order_by('isbn').first()
+        self.power_user = Customer.objects.annotate(
+            num_loans=Count('loans')).order_by('-num_loans', 'pk').first()
+        self.free_copy = BookCopy.objects.exclude(
+            loans__returned=False).select_related('book').first()
+
+    def make_customer(self):
+        """Returns a new customer without any loans"""
+        return Customer.objects.create(
+            username='benchmark', email='benchmark@example.com')
+
+    def make_loan(self, customer):
+        return Loan.objects.create(
+            customer=customer, book_copy=self.free_copy)
+
+
+def book_list(fixtures):
+    return fixtures.power_user, 'get', reverse('books:book-list')
+
+
+def book_detail(fixtures):
+    return fixtures.power_user, 'get', fixtures.book.get_absolute_url()
+
+
+def author_list(fixtures):
+    return fixtures.power_user, 'get', reverse('books:author-list')
+
+
+def genre_list(fixtures):
+    return fixtures.power_user, 'get', reverse('books:genre-list')
+
+
+def customer_detail(fixtures):
+    return fixtures.power_user, 'get', reverse('books:customer-detail')
+
+
+def book_checkout(fixtures):
+    customer = fixtures.make_customer()
+    return customer, 'post', reverse(
+        'books:book-checkout', args=[fixtures.free_copy.book.slug])
+
+
+def book_return(fixtures):
+    customer = fixtures.make_customer()
+    fixtures.make_loan(customer)
+    return customer, 'post', reverse(
+        'books:book-return', args=[fixtures.free_copy.book.slug])
+
+
+def bulk_return(fixtures):
+    customer = fixtures.make_customer()
+    fixtures.make_loan(customer)
+    return customer, 'post', reverse('books:bulk-return')
+
+
+# Functions returning the (customer, method, url) of a request by scenario,
+# any rows they create are rolled back after each request
+SCENARIOS = OrderedDict((scenario.__name__, scenario) for scenario in (
+    book_list, book_detail, author_list, genre_list, customer_detail,
+    book_checkout, book_return, bulk_return,
+))
+
+
+class Rollback(Exception):
+    pass
+
+
+def run_once(scenario, fixtures, client, trace_memory=False):
+    """Returns the seconds, queries and peak allocated bytes of a request"""
+    try:
+        with transaction.atomic():
+            customer, method, url = scenario(fixtures)
+            client.force_login(customer)
+            if trace_memory:
+                tracemalloc.start()
+            try:
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = getattr(client, method)(url)
+                    elapsed = time.perf_counter() - started
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+            if response.status_code >= 400:
+                raise AssertionError('{} returned {}'.format(
+                    url, response.status_code))
+            raise Rollback
+    except Rollback:
+        pass
+    return elapsed, len(queries), peak
+
+
+def percentile(values, percent):
+    """Returns the nearest rank percentile of a list of values"""
+    ordered = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def run(names, iterations, warmup=1):
+    """Returns a dict of results by scenario name"""
+    fixtures = Fixtures()
+    client = Client()
+    results = OrderedDict()
+    for name in names:
+        scenario = SCENARIOS[name]
+        for _ in range(warmup):
+            run_once(scenario, fixtures, client)
+        timings = []
+        for _ in range(iterations):
+            elapsed, queries, _ = run_once(scenario, fixtures, client)
+            timings.append(elapsed)
+        _, _, peak = run_once(scenario, fixtures, client, trace_memory=True)
+        result = OrderedDict(
+            ('p{}'.format(percent), round(percentile(timings, percent), 6))
+            for percent in PERCENTILES)
+        result['mean'] = round(sum(timings) / len(timings), 6)
+        result['queries'] = queries
+        result['memory_peak'] = peak
+        result['iterations'] = iterations
+        results[name] = result
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of regression messages, timings and memory may grow by
+    a tolerance fraction of the baseline, query counts mustn't grow at all
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append('{}: {} queries, baseline {}'.format(
+                name, result['queries'], expected['queries']))
+        for measure in ('p50', 'p90', 'memory_peak'):
+            limit = expected[measure] * (1 + tolerance)
+            if result[measure] > limit:
+                regressions.append('{}: {} {}, baseline {}'.format(
+                    name, measure, result[measure], expected[measure]))
+    return regressions
@@ -0,0 +1,141 @@
+"""
+Namespaced access to the cache.
+
+Each namespace has its own timeout, version and optionally cache alias
+configured in the CACHE_NAMESPACES setting, bumping a namespace's version
+orphans all of its existing entries. Keys are hashed, so raw values such
+as ISBNs are never used as cache keys.
+"""
+
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+
+from DjangoLibrary.tracing import span
+
+_MISSING = object()
+
+# Every NamespacedCache by namespace
+namespaces = {}
+
+
+class NamespacedCache(object):
+
+    def __init__(self, namespace):
+        self.namespace = namespace
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        namespaces[namespace] = self
+
+    @property
+    def options(self):
+        return settings.CACHE_NAMESPACES[self.namespace]
+
+    @property
+    def cache(self):
+        return caches[self.options.get('cache', 'default')]
+
+    def make_key(self, key):
+        digest = hashlib.sha1(force_bytes(key)).hexdigest()
+        return '{}:{}'.format(self.namespace, digest)
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key, default=None):
+        with span('cache.get', namespace=self.namespace):
+            value = self.cache.get(
+                self.make_key(key), _MISSING, version=self.options['version'])
+        if value is _MISSING:
+            self._count('misses')
+            return default
+        self._count('hits')
+        return value
+
+    def get_many(self, keys):
+        hashed = {self.make_key(key): key for key in keys}
+        with span('cache.get_many', namespace=self.namespace):
+            found = self.cache.get_many(
+                list(hashed), version=self.options['version'])
+        with self._lock:
+            self.stats['hits'] += len(found)
+            self.stats['misses'] += len(hashed) - len(found)
+        return {hashed[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=None):
+        with span('cache.set', namespace=self.namespace):
+            self.cache.set(
+                self.make_key(key), value,
+                timeout=timeout or self.options['timeout'],
+                version=self.options['version']
+            )
+
+    def add(self, key, value, timeout=None):
+        with span('cache.add', namespace=self.namespace):
+            return self.cache.add(
+                self.make_key(key), value,
+                timeout=timeout or self.options['timeout'],
+                version=self.options['version']
+            )
+
+    def delete(self, key):
+        with span('cache.delete', namespace=self.namespace):
+            self.cache.delete(
+                self.make_key(key), version=self.options['version'])
+
+    def get_or_set(self, key, default):
+        """Returns the cached value, calling default() to set it if missing"""
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = default()
+            self.set(key, value)
+        return value
+
+    def __contains__(self, key):
+        return self.cache.has_key(
+            self.make_key(key), version=self.options['version'])
+
+
+metadata_cache = NamespacedCache('metadata')
+catalog_cache = NamespacedCache('catalog')
+object_cache = NamespacedCache('objects')
+version_cache = NamespacedCache('versions')
+
+
+def get_version(kind, pk=None):
+    """
+    Returns the version of an object, the time it or anything shown with it
+    (e.g. a book's availability) last changed, for use in cache keys
+    """
+    key = (kind, pk)
+    version = version_cache.get(key)
+    if version is None:
+        # Never reuse an old version after the entry has been evicted
+        version_cache.add(key, time.time())
+        version = version_cache.get(key, time.time())
+    return version
+
+
+def get_versions(keys):
+    """Returns a list of the versions of the given (kind, pk) pairs"""
+    keys = list(keys)
+    versions = version_cache.get_many(keys)
+    return [versions.get(key) or get_version(*key) for key in keys]
+
+
+def bump_versions(keys):
+    """Bumps the versions of the given (kind, pk) pairs"""
+    version = time.time()
+    for key in set(keys):
+        version_cache.set(key, version)
+
+
+def get_stats():
+    """Returns hit and miss counts for each namespace in this process"""
+    return {name: dict(cache.stats) for name, cache in namespaces.items()}
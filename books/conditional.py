@@ -0,0 +1,106 @@
+"""
+Conditional GET support for catalog pages.
+
+Validators are derived from the versions of the objects shown on a page
+(see books.cache.get_version), so matching requests are answered with a 304
+before any of the page's queries run.
+"""
+
+import hashlib
+from datetime import datetime
+
+from django.utils.encoding import force_bytes
+from django.utils.timezone import utc
+from django.views.decorators.http import condition
+
+from .cache import get_versions
+from .models import Author, Book, Genre
+
+
+def has_pending_messages(request):
+    storage = getattr(request, '_messages', None)
+    return storage is not None and len(storage) > 0
+
+
+def get_page_state(request, get_state, *args, **kwargs):
+    """Returns get_state's result for the request, calling it only once"""
+    if not hasattr(request, '_page_state'):
+        request._page_state = get_state(request, *args, **kwargs)
+    return request._page_state
+
+
+def conditional_page(get_state):
+    """
+    Decorator adding ETag and Last-Modified validators to a view
+
+    get_state is called with the view's arguments and returns the (kind, pk)
+    version keys of the objects on the page, along with their latest
+    modified_on (or None). It returns None if there's no page to validate.
+    """
+    def get_validators(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            request._page_validators = None, None
+            # Messages are shown once, so the page can't be reused
+            if not has_pending_messages(request):
+                state = get_page_state(request, get_state, *args, **kwargs)
+                if state is not None:
+                    request._page_validators = make_validators(
+                        request, *state)
+        return request._page_validators
+
+    return condition(
+        etag_func=lambda *args, **kwargs: get_validators(*args, **kwargs)[0],
+        last_modified_func=(
+            lambda *args, **kwargs: get_validators(*args, **kwargs)[1]
+        ),
+    )
+
+
+def make_validators(request, keys, modified_on=None):
+    """Returns an (etag, last_modified) pair for the request's page"""
+    versions = get_versions(keys)
+    timestamps = list(versions)
+    if modified_on is not None:
+        timestamps.append(modified_on.timestamp())
+    user = request.user.pk if request.user.is_authenticated else 'anonymous'
+    parts = [user, request.get_full_path()] + versions + timestamps
+    etag = hashlib.md5(force_bytes(':'.join(map(str, parts)))).hexdigest()
+    return etag, datetime.fromtimestamp(max(timestamps), utc)
+
+
+def book_state(request, slug):
+    book = Book.objects.filter(slug=slug).values_list(
+        'pk', 'modified_on').first()
+    if book is not None:
+        return [('book', book[0])], book[1]
+
+
+def catalog_state(request):
+    return [('catalog', None)], None
+
+
+def author_state(request, slug):
+    author = Author.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if author is not None:
+        books = Book.authors.through.objects.filter(
+            author_id=author).values_list('book_id', flat=True)
+        return [('author', author)] + [('book', pk) for pk in books], None
+
+
+def genre_state(request, slug):
+    genre = Genre.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if genre is not None:
+        books = Book.genres.through.objects.filter(
+            genre_id=genre).values_list('book_id', flat=True)
+        return [('genre', genre)] + [('book', pk) for pk in books], None
+
+
+def author_list_state(request):
+    # Rows list book titles, which are covered by the catalog version
+    return [('catalog', None), ('author', None)], None
+
+
+def genre_list_state(request):
+    return [('catalog', None), ('genre', None)], None
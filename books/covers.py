@@ -0,0 +1,113 @@
+"""
+Locally cached book covers.
+
+Covers are downloaded once from the provider URL in Book.img and resized to
+each of COVER_SIZES as JPEG and WebP. Thumbnails are stored under the hash of
+the original image, so their URLs never change and can be cached for good. A
+tiny blurred copy is kept on the book to show inline whilst the thumbnail
+loads.
+"""
+
+import base64
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+
+from .cache import bump_versions
+from .models import PLACEHOLDER_IMG, Book
+
+logger = logging.getLogger(__name__)
+
+# File extension and Pillow format of each thumbnail type
+FORMATS = {
+    'jpg': 'JPEG',
+    'webp': 'WEBP',
+}
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'webp': 'image/webp',
+}
+
+PLACEHOLDER_SIZE = (8, 12)
+
+
+def cover_path(digest, size, ext):
+    return 'covers/{}/{}.{}'.format(digest, size, ext)
+
+
+def uncached_covers():
+    """Returns the books whose cover has changed since it was cached"""
+    return Book.objects.exclude(cover_source=F('img'))
+
+
+def make_thumbnails(image, digest):
+    """Saves each size and format of a cover to storage"""
+    from PIL import Image, ImageOps
+    for size, dimensions in settings.COVER_SIZES.items():
+        thumbnail = ImageOps.fit(image, dimensions, Image.LANCZOS)
+        for ext, image_format in FORMATS.items():
+            path = cover_path(digest, size, ext)
+            if default_storage.exists(path):
+                continue
+            data = BytesIO()
+            thumbnail.save(data, image_format, quality=80)
+            default_storage.save(path, ContentFile(data.getvalue()))
+
+
+def make_placeholder(image):
+    """Returns a tiny blurred copy of a cover as a data URI"""
+    from PIL import Image, ImageFilter, ImageOps
+    placeholder = ImageOps.fit(image, PLACEHOLDER_SIZE, Image.LANCZOS)
+    placeholder = placeholder.filter(ImageFilter.GaussianBlur(1))
+    data = BytesIO()
+    placeholder.save(data, 'JPEG', quality=40)
+    return 'data:image/jpeg;base64,{}'.format(
+        base64.b64encode(data.getvalue()).decode('ascii'))
+
+
+def cache_cover(book):
+    """
+    Downloads a book's cover and saves its thumbnails, returns a dict of the
+    cover fields to update on the book
+    """
+    # Pillow and requests are imported on first use, as views only need the
+    # paths of covers and most processes never make thumbnails
+    from PIL import Image
+    from requests import get
+    from requests.exceptions import RequestException
+    fields = {'cover_source': book.img, 'cover_hash': '',
+              'cover_placeholder': ''}
+    if book.img == PLACEHOLDER_IMG:
+        return fields
+    try:
+        response = get(book.img, timeout=settings.COVER_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        image = Image.open(BytesIO(response.content)).convert('RGB')
+    except (RequestException, IOError):
+        # Keep showing the provider's URL until Book.img changes
+        logger.warning('Could not cache cover of %s', book.pk, exc_info=True)
+        return fields
+    digest = hashlib.sha1(response.content).hexdigest()
+    make_thumbnails(image, digest)
+    fields.update(cover_hash=digest, cover_placeholder=make_placeholder(image))
+    return fields
+
+
+def cache_covers(books):
+    """Caches the covers of the given books, returns the number cached"""
+    cached = 0
+    for book in books:
+        fields = cache_cover(book)
+        Book.objects.filter(pk=book.pk).update(**fields)
+        cached += bool(fields['cover_hash'])
+    if books:
+        # Updates skip the signals which invalidate cached fragments
+        bump_versions([('book', book.pk) for book in books] +
+                      [('catalog', None)])
+    return cached
@@ -0,0 +1,400 @@
+"""
+Seeded, offline generation of large datasets for benchmarking.
+
+Rows are generated in chunks, each from its own random.Random seeded with the
+(seed, table, chunk), so a seed always produces the same rows however many
+processes load them. Chunks are loaded with COPY, in parallel within each
+stage, and stages are loaded in order so foreign keys always point at rows
+which are already loaded.
+
+Popularity is skewed with a power law, low numbered books and customers are
+picked far more often than the rest. Returned loans older than
+LOAN_ARCHIVE_AFTER are loaded straight into the archive, as if the archive
+job had already run.
+
+Snapshots are template databases, so restoring one is a file copy on the
+database server rather than a reload.
+"""
+
+import math
+import multiprocessing
+import random
+from collections import OrderedDict
+from datetime import datetime, time, timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.utils.text import slugify
+from django.utils.timezone import utc
+
+from .isbn import _calc_isbn_13_check_digit
+from .models import (
+    PLACEHOLDER_IMG, ArchivedLoan, Author, Book, BookCopy, Customer, Genre,
+    Loan, Review
+)
+
+# Volumes of each table generated by default
+VOLUMES = OrderedDict([
+    ('authors', 2000),
+    ('genres', 50),
+    ('books', 10000),
+    ('copies', 50000),
+    ('customers', 2000),
+    ('loans', 500000),
+    ('reviews', 50000),
+])
+
+# Higher values concentrate picks on the most popular rows
+SKEW = 3
+
+# Tables loaded by each stage, every table in a stage can load in parallel
+STAGES = (
+    ('authors', 'genres', 'customers'),
+    ('books',),
+    ('book_authors', 'book_genres', 'copies'),
+    ('loans', 'reviews'),
+)
+
+BookAuthor = Book.authors.through
+BookGenre = Book.genres.through
+
+COLUMNS = {
+    Author: ('id', 'name', 'slug'),
+    Genre: ('id', 'name', 'slug'),
+    Customer: (
+        'id', 'password', 'last_login', 'is_superuser', 'username',
+        'first_name', 'last_name', 'email', 'is_staff', 'is_active',
+        'date_joined', 'join_date', 'book_allowance', 'books_read',
+        'loans_returned',
+    ),
+    Book: (
+        'isbn', 'title', 'subtitle', 'img', 'slug', 'metadata_refreshed_on',
+        'cover_source', 'cover_hash', 'cover_placeholder', 'created_on',
+        'modified_on',
+    ),
+    BookAuthor: ('book', 'author'),
+    BookGenre: ('book', 'genre'),
+    BookCopy: ('id', 'book', 'created_on', 'modified_on'),
+    Loan: (
+        'id', 'start_date', 'end_date', 'returned', 'returned_on',
+        'customer', 'book_copy', 'renew_count', 'next_reminder_on',
+        'created_on', 'modified_on',
+    ),
+    ArchivedLoan: (
+        'id', 'start_date', 'end_date', 'customer', 'book_copy',
+        'renew_count', 'returned_on', 'archived_on',
+    ),
+    Review: ('id', 'rating', 'review', 'book', 'customer'),
+}
+
+WORDS = (
+    'amber', 'silent', 'river', 'winter', 'glass', 'hollow', 'iron', 'lost',
+    'garden', 'empire', 'shadow', 'north', 'paper', 'salt', 'crown', 'ember',
+    'harbour', 'quiet', 'storm', 'orchard', 'signal', 'tide', 'lantern',
+    'engine', 'atlas', 'cipher', 'meadow', 'falcon', 'copper', 'station',
+)
+
+FIRST_NAMES = (
+    'Alex', 'Sam', 'Jo', 'Charlie', 'Robin', 'Ali', 'Kim', 'Morgan', 'Priya',
+    'Tom', 'Aisha', 'Ewan', 'Mei', 'Olu', 'Hannah', 'Luca', 'Zara', 'Finn',
+)
+
+LAST_NAMES = (
+    'Smith', 'Jones', 'Patel', 'Khan', 'Brown', 'Taylor', 'Wilson', 'Evans',
+    'Chen', 'Okafor', 'Murphy', 'Walker', 'Hughes', 'Novak', 'Silva',
+)
+
+RATINGS = (5, 5, 4, 4, 4, 3, 3, 2, 1)
+
+
+def skewed(rng, count):
+    """Returns a 0 based index, with low indexes picked most often"""
+    return int(count * rng.random() ** SKEW)
+
+
+def make_isbn(number):
+    isbn = '978{:09d}'.format(number)
+    return isbn + str(_calc_isbn_13_check_digit(isbn))
+
+
+def make_title(rng, number):
+    # Numbered, as titles are unique
+    return '{} {} {}'.format(
+        rng.choice(WORDS).title(), rng.choice(WORDS).title(), number)
+
+
+def on_day(date):
+    return datetime.combine(date, time(12)).replace(tzinfo=utc)
+
+
+def coprime_stride(count):
+    """Returns a stride visiting every index of range(count) once"""
+    stride = 7919
+    while count and math.gcd(stride, count) != 1:
+        stride += 2
+    return stride
+
+
+class Dataset(object):
+    """
+    Generates the rows of each table in chunks, ids are 1 based and books are
+    numbered from 0 in their ISBNs
+    """
+
+    def __init__(self, seed, volumes, today, overdue_fraction=0.1,
+                 chunk_size=10000):
+        self.seed = seed
+        self.volumes = volumes
+        self.today = today
+        self.overdue_fraction = overdue_fraction
+        self.chunk_size = chunk_size
+        self.created_on = on_day(today)
+        # Hashed once, hashing is deliberately slow
+        self.password = make_password('test')
+        # Loans of books still out, one per copy and at most two a customer
+        self.current_loans = min(
+            volumes['loans'], volumes['copies'] // 4,
+            volumes['customers'] * 2)
+
+    def chunks(self, table):
+        count = self.volumes.get(table, self.volumes['books'])
+        return range(math.ceil(count / self.chunk_size))
+
+    def rows(self, table, chunk):
+        """Returns a dict of the rows of each model in a chunk of a table"""
+        rng = random.Random('{}:{}:{}'.format(self.seed, table, chunk))
+        count = self.volumes.get(table, self.volumes['books'])
+        start = chunk * self.chunk_size
+        numbers = range(start, min(start + self.chunk_size, count))
+        return getattr(self, 'get_' + table)(rng, numbers)
+
+    def get_authors(self, rng, numbers):
+        rows = []
+        for number in numbers:
+            name = '{} {} {}'.format(
+                rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), number)
+            rows.append((number + 1, name, slugify(name)))
+        return {Author: rows}
+
+    def get_genres(self, rng, numbers):
+        rows = []
+        for number in numbers:
+            name = '{} {}'.format(rng.choice(WORDS).title(), number)
+            rows.append((number + 1, name, slugify(name)))
+        return {Genre: rows}
+
+    def get_customers(self, rng, numbers):
+        rows = []
+        for number in numbers:
+            joined = on_day(self.today - timedelta(days=rng.randint(0, 1500)))
+            rows.append((
+                number + 1, self.password, None, False,
+                'customer{}'.format(number), rng.choice(FIRST_NAMES),
+                rng.choice(LAST_NAMES),
+                'customer{}@example.com'.format(number), False, True, joined,
+                joined, 3, 0, 0,
+            ))
+        return {Customer: rows}
+
+    def get_books(self, rng, numbers):
+        rows = []
+        for number in numbers:
+            title = make_title(rng, number)
+            created_on = on_day(
+                self.today - timedelta(days=rng.randint(0, 1500)))
+            rows.append((
+                make_isbn(number), title, '', PLACEHOLDER_IMG,
+                slugify(title), self.created_on, PLACEHOLDER_IMG, '', '',
+                created_on, created_on,
+            ))
+        return {Book: rows}
+
+    def get_book_authors(self, rng, numbers):
+        rows = []
+        for number in numbers:
+            authors = {skewed(rng, self.volumes['authors'])
+                       for _ in range(rng.choice((1, 1, 1, 2, 3)))}
+            rows.extend((make_isbn(number), author + 1) for author in authors)
+        return {BookAuthor: rows}
+
+    def get_book_genres(self, rng, numbers):
+        rows = []
+        for number in numbers:
+            genres = {skewed(rng, self.volumes['genres'])
+                      for _ in range(rng.randint(1, 3))}
+            rows.extend((make_isbn(number), genre + 1) for genre in genres)
+        return {BookGenre: rows}
+
+    def get_copies(self, rng, numbers):
+        books = self.volumes['books']
+        rows = []
+        for number in numbers:
+            # Every book has a copy, popular books get most of the rest
+            book = number if number < books else skewed(rng, books)
+            rows.append((number + 1, make_isbn(book), self.created_on,
+                         self.created_on))
+        return {BookCopy: rows}
+
+    def get_loans(self, rng, numbers):
+        loans, archived = [], []
+        copies = self.volumes['copies']
+        stride = coprime_stride(copies)
+        for number in numbers:
+            if number < self.current_loans:
+                # Each current loan is of a different copy
+                loans.append(self.make_current_loan(
+                    rng, number, number * stride % copies))
+                continue
+            returned = self.today - timedelta(days=rng.randint(1, 1500))
+            start = returned - timedelta(
+                days=rng.randint(1, settings.LOAN_DURATION.days))
+            end = start + settings.LOAN_DURATION
+            customer = skewed(rng, self.volumes['customers']) + 1
+            copy = skewed(rng, copies) + 1
+            if self.today - returned > settings.LOAN_ARCHIVE_AFTER:
+                archived.append((
+                    number + 1, start, end, customer, copy, 1,
+                    on_day(returned), self.created_on,
+                ))
+            else:
+                loans.append((
+                    number + 1, start, end, True, on_day(returned), customer,
+                    copy, 1, None, on_day(start), on_day(returned),
+                ))
+        return {Loan: loans, ArchivedLoan: archived}
+
+    def make_current_loan(self, rng, number, copy):
+        if rng.random() < self.overdue_fraction:
+            end = self.today - timedelta(days=rng.randint(1, 60))
+        else:
+            end = self.today + timedelta(
+                days=rng.randint(0, settings.LOAN_DURATION.days))
+        # No reminders have been sent, so overdue loans are due on the next
+        # reminder run
+        loan = Loan(end_date=end)
+        loan.schedule_reminders(self.today)
+        start = end - settings.LOAN_DURATION
+        return (
+            number + 1, start, end, False, None,
+            number % self.volumes['customers'] + 1, copy + 1, 1,
+            loan.next_reminder_on, on_day(start), on_day(start),
+        )
+
+    def get_reviews(self, rng, numbers):
+        customers = self.volumes['customers']
+        books = self.volumes['books']
+        rows = []
+        for number in numbers:
+            # Each of a customer's reviews is of a different book
+            customer = number % customers
+            book = (customer * 7919 + number // customers) % books
+            rows.append((
+                number + 1, rng.choice(RATINGS),
+                ' '.join(rng.choice(WORDS) for _ in range(12)).capitalize(),
+                make_isbn(book), customer + 1,
+            ))
+        return {Review: rows}
+
+
+def copy_value(value):
+    """Returns a value in COPY's text format"""
+    if value is None:
+        return r'\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, str):
+        return (value.replace('\\', '\\\\').replace('\t', r'\t')
+                .replace('\n', r'\n').replace('\r', r'\r'))
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def copy_rows(cursor, model, rows):
+    if not rows:
+        return
+    quote_name = connection.ops.quote_name
+    columns = ', '.join(quote_name(model._meta.get_field(name).column)
+                        for name in COLUMNS[model])
+    data = StringIO(''.join(
+        '\t'.join(copy_value(value) for value in row) + '\n' for row in rows))
+    cursor.copy_expert('COPY {} ({}) FROM STDIN'.format(
+        quote_name(model._meta.db_table), columns), data)
+
+
+def load_chunk(args):
+    """Generates and loads a chunk of a table, returns (table, rows loaded)"""
+    dataset, table, chunk = args
+    rows = dataset.rows(table, chunk)
+    with connection.cursor() as cursor:
+        for model, model_rows in rows.items():
+            copy_rows(cursor, model, model_rows)
+    return table, sum(len(model_rows) for model_rows in rows.values())
+
+
+def load(dataset, processes=1, progress=None):
+    """
+    Loads a dataset into empty tables, calling progress(table, rows) as each
+    chunk is loaded. Returns the number of rows loaded
+    """
+    loaded = 0
+    for stage in STAGES:
+        tasks = [(dataset, table, chunk)
+                 for table in stage for chunk in dataset.chunks(table)]
+        if processes > 1:
+            # Forked workers must open their own connections
+            connections.close_all()
+            with multiprocessing.Pool(processes) as pool:
+                for table, count in pool.imap_unordered(load_chunk, tasks):
+                    loaded += count
+                    if progress:
+                        progress(table, count)
+        else:
+            for task in tasks:
+                table, count = load_chunk(task)
+                loaded += count
+                if progress:
+                    progress(table, count)
+
+    with connection.cursor() as cursor:
+        # Ids were given explicitly, so the sequences never moved
+        for sql in connection.ops.sequence_reset_sql(no_style(), list(
+                COLUMNS)):
+            cursor.execute(sql)
+        # Archived loans keep their ids, which new loans mustn't reuse
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)",
+            [Loan._meta.db_table, max(dataset.volumes['loans'], 1)])
+        cursor.execute('ANALYZE')
+    return loaded
+
+
+def get_snapshot_name(name):
+    return '{}_snapshot_{}'.format(connection.settings_dict['NAME'], name)
+
+
+def copy_database(source, target):
+    """Replaces the target database with a copy of the source database"""
+    # Neither database can have any connections whilst it's copied
+    connections.close_all()
+    quote_name = connection.ops.quote_name
+    with connection._nodb_connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT pg_terminate_backend(pid) FROM pg_stat_activity '
+            'WHERE datname IN (%s, %s) AND pid <> pg_backend_pid()',
+            [source, target])
+        cursor.execute('DROP DATABASE IF EXISTS {}'.format(
+            quote_name(target)))
+        cursor.execute('CREATE DATABASE {} TEMPLATE {}'.format(
+            quote_name(target), quote_name(source)))
+
+
+def snapshot(name):
+    copy_database(connection.settings_dict['NAME'], get_snapshot_name(name))
+
+
+def restore(name):
+    copy_database(get_snapshot_name(name), connection.settings_dict['NAME'])
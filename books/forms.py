@@ -1,8 +1,8 @@
 from django import forms
-from django.core.cache import cache
 from django.forms import formset_factory
 from django.utils.translation import ugettext as _
 
+from books.cache import metadata_cache
 from books.models import Review, Book
 
 import books.isbn as isbnlib
@@ -21,7 +21,7 @@ class ISBNForm(forms.Form):
         isbn = isbnlib.to_isbn13(self.cleaned_data['isbn'])
 
         # Skip validation if the isbn has been cached
-        if isbn in cache:
+        if isbn in metadata_cache:
             return isbn
 
         if not isbnlib.is_isbn13(isbn):
@@ -35,14 +35,19 @@ class ISBNForm(forms.Form):
         if not metadata:
             raise forms.ValidationError('Book Metadata not found')
 
-        cache.set(isbn, metadata)
+        metadata_cache.set(isbn, metadata)
         return isbn
 
 
 class BookForm(forms.ModelForm):
 
     class Meta:
-        exclude = ('slug',)
+        # Kept up to date by the metadata refresh and cover caching, not
+        # edited by hand
+        exclude = (
+            'slug', 'metadata_refreshed_on', 'cover_source', 'cover_hash',
+            'cover_placeholder',
+        )
         model = Book
 
 
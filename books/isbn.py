@@ -3,14 +3,20 @@ All ISBN Logic sourced from:
 https://en.wikipedia.org/wiki/International_Standard_Book_Number
 """
 
+from functools import lru_cache
 from itertools import islice, cycle
 from re import sub, compile
-from requests import get
-from requests.exceptions import RequestException
+from time import perf_counter
+from urllib.parse import urlsplit
 from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
 
+from DjangoLibrary.tracing import span
+
+from .metrics import record_provider_lookup
 
-GOOGLE_BOOKS_API_KEY = settings.GOOGLE_BOOKS_API_KEY
 
 googb_api_url = 'https://www.googleapis.com/books/v1/volumes?q=isbn:{}&key={}'
 
@@ -104,9 +110,23 @@ def clean(isbn):
     return sub(CLEAN_REGEX_PATTERN, '', isbn)
 
 
+def traced_get(url):
+    """Requests a URL in a span, tagged without the query string's API key"""
+    # requests is slow to import and most processes never look up an ISBN
+    from requests import get
+    parts = urlsplit(url)
+    with span('http.get', 'CLIENT', **{
+            'http.url': '{}://{}{}'.format(*parts[:3])}) as current:
+        response = get(url)
+        if current is not None:
+            current.tags['http.status_code'] = response.status_code
+        return response
+
+
 def request_data(isbn, url, key=None):
+    from requests.exceptions import RequestException
     try:
-        r = get(url.format(isbn, key))
+        r = traced_get(url.format(isbn, key))
     except RequestException:
         pass
     else:
@@ -125,8 +145,9 @@ def get_amazon_image(isbn):
     """Tries to return image url from Amazon"""
     # Amazon only provides book images for isbn10's
     image_url = 'http://images.amazon.com/images/P/{}'.format(to_isbn10(isbn))
+    from requests.exceptions import RequestException
     try:
-        r = get(image_url)
+        r = traced_get(image_url)
     except RequestException:
         return
     else:
@@ -135,19 +156,9 @@ def get_amazon_image(isbn):
 
 
 # Caution here be dragons, enter at your own peril
-scrape_strategies = []
-
-
-def scrape_stategy(scrape_func):
-    """Adds all functions with a scrape_stategy to a list"""
-    scrape_strategies.append(scrape_func)
-    return scrape_func
-
-
-@scrape_stategy
 def _scrape_goob(isbn):
     META_KEYS = ('title', 'subtitle', 'authors', 'categories')
-    res = request_json(isbn, googb_api_url, key=GOOGLE_BOOKS_API_KEY)
+    res = request_json(isbn, googb_api_url, key=settings.GOOGLE_BOOKS_API_KEY)
     if res.get('totalItems', 0) != 0:
         info = next(iter(res['items']))['volumeInfo']
         meta = {k: v for k, v in info.items() if k in META_KEYS}
@@ -159,7 +170,6 @@ def _scrape_goob(isbn):
         return meta
 
 
-@scrape_stategy
 def _scrape_openlibrary(isbn):
     res = request_json(isbn, open_library_api)
     if res:
@@ -177,7 +187,6 @@ def _scrape_openlibrary(isbn):
         return meta
 
 
-@scrape_stategy
 def _scrape_wcat(isbn):
     META_KEYS = ('title', 'author')
     res = request_json(isbn, wcat_api_url)
@@ -194,14 +203,50 @@ def _scrape_wcat(isbn):
         return meta
 
 
+def load_provider(config):
+    """
+    Returns the (name, provider) of an ISBN_PROVIDERS entry, classes are
+    instantiated with the entry's OPTIONS
+    """
+    provider = import_string(config['PROVIDER'])
+    if isinstance(provider, type):
+        provider = provider(**{
+            option.lower(): value
+            for option, value in config.get('OPTIONS', {}).items()
+        })
+    name = config.get('NAME') or getattr(provider, 'name', None) or (
+        provider.__name__.replace('_scrape_', ''))
+    return name, provider
+
+
+@lru_cache(maxsize=None)
+def get_providers():
+    """Returns the configured (name, provider) pairs, in the order tried"""
+    return [load_provider(config) for config in settings.ISBN_PROVIDERS]
+
+
+@receiver(setting_changed)
+def reset_providers(setting, **kwargs):
+    if setting == 'ISBN_PROVIDERS':
+        get_providers.cache_clear()
+
+
 def meta(isbn):
     isbn = clean(isbn)
 
     if not isbn_is_valid(isbn):
         raise InvalidISBNError('Invalid ISBN', isbn)
 
-    # Loops through each scrape_stategy and returns first non empty result
-    for strat in scrape_strategies:
-        data = strat(isbn)
+    # Loops through each provider and returns first non empty result
+    for name, provider in get_providers():
+        started = perf_counter()
+        try:
+            with span('isbn.' + name):
+                data = provider(isbn)
+        except Exception:
+            record_provider_lookup(name, 'error', started)
+            raise
+        record_provider_lookup(
+            name, 'found' if data else 'not_found', started)
         if data:
             return data
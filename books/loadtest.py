@@ -0,0 +1,214 @@
+"""
+Load testing of a running server with scripted patron journeys.
+
+Each virtual user logs in as one of the dataset's customers and repeatedly
+picks a journey by weight from the traffic mix. Books are picked with the
+same power law skew as generate_dataset, so checkouts pile up on the popular
+titles and contend for their few copies.
+
+Journeys never add books, so ISBN providers are never called. Results are
+recorded per endpoint, from the URL name of each request, and a run can
+step through increasing concurrencies to find where throughput stops
+growing. Checkouts refused because every copy is out redirect like
+successful ones, so each checkout is confirmed from the book's page and
+refusals are reported separately from errors.
+"""
+
+import random
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from itertools import accumulate
+
+from requests import Session
+from requests.exceptions import RequestException
+
+from django.core.urlresolvers import reverse
+
+from .benchmarks import percentile
+from .dataset import SKEW, WORDS
+from .models import Book, Customer
+
+# Relative weight of each journey by default
+MIX = OrderedDict([
+    ('browse', 30),
+    ('search', 10),
+    ('detail', 30),
+    ('checkout', 10),
+    ('renew', 5),
+    ('return', 10),
+    ('review', 5),
+])
+
+# User method making the requests of each journey
+JOURNEYS = {name: name for name in MIX}
+JOURNEYS['return'] = 'return_book'
+
+
+class Stats(object):
+    """Latencies, errors and refusals of each endpoint, shared by every user"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.refusals = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, error):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            self.errors[endpoint] += error
+
+    def refuse(self, endpoint):
+        """Counts a request which succeeded but was turned down"""
+        with self._lock:
+            self.refusals[endpoint] += 1
+
+    def report(self, duration):
+        report = OrderedDict()
+        for endpoint in sorted(self.latencies):
+            latencies = self.latencies[endpoint]
+            result = OrderedDict([
+                ('requests', len(latencies)),
+                ('throughput', round(len(latencies) / duration, 2)),
+                ('error_rate', round(
+                    self.errors[endpoint] / len(latencies), 4)),
+                ('refused_rate', round(
+                    self.refusals[endpoint] / len(latencies), 4)),
+            ])
+            for percent in (50, 90, 99):
+                result['p{}'.format(percent)] = round(
+                    percentile(latencies, percent), 6)
+            report[endpoint] = result
+        return report
+
+
+class User(object):
+    """A logged-in customer making requests with their own session"""
+
+    def __init__(self, base_url, username, password, books, stats, seed):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.books = books
+        self.stats = stats
+        self.rng = random.Random(seed)
+        self.session = Session()
+        # Books this user has checked out and reviewed, as far as it knows
+        self.loans = []
+        self.reviewed = set()
+
+    def request(self, endpoint, method, path, data=None):
+        """Returns the response, or None if the request failed"""
+        headers = {'Referer': self.base_url + path}
+        if method == 'post':
+            data = dict(data or {})
+            data['csrfmiddlewaretoken'] = self.session.cookies.get(
+                'csrftoken', '')
+        started = time.perf_counter()
+        try:
+            response = getattr(self.session, method)(
+                self.base_url + path, data=data, headers=headers,
+                allow_redirects=False, timeout=30)
+            error = response.status_code >= 400
+        except RequestException:
+            response, error = None, True
+        self.stats.record(endpoint, time.perf_counter() - started, error)
+        return None if error else response
+
+    def login(self):
+        path = reverse('books:login')
+        self.request('login', 'get', path)
+        self.request('login', 'post', path, {
+            'username': self.username, 'password': self.password})
+
+    def pick_book(self):
+        """Returns the slug of a book, popular books most often"""
+        return self.books[int(len(self.books) * self.rng.random() ** SKEW)]
+
+    def browse(self):
+        self.request('book-list', 'get', '{}?page={}'.format(
+            reverse('books:book-list'), self.rng.randint(1, 5)))
+        self.request('author-list', 'get', reverse('books:author-list'))
+        self.request('genre-list', 'get', reverse('books:genre-list'))
+
+    def search(self):
+        self.request('book-search', 'get', '{}?q={}'.format(
+            reverse('books:book-list'), self.rng.choice(WORDS)))
+
+    def detail(self):
+        self.request('book-detail', 'get', reverse(
+            'books:book-detail', args=[self.pick_book()]))
+
+    def checkout(self):
+        slug = self.pick_book()
+        path = reverse('books:book-detail', args=[slug])
+        self.request('book-detail', 'get', path)
+        if self.request('book-checkout', 'post', reverse(
+                'books:book-checkout', args=[slug])) is None:
+            return
+        # The book's page only offers to return books on loan to the user
+        page = self.request('book-detail', 'get', path)
+        if page is None:
+            return
+        if reverse('books:book-return', args=[slug]) not in page.text:
+            self.stats.refuse('book-checkout')
+        elif slug not in self.loans:
+            self.loans.append(slug)
+
+    def renew(self):
+        if self.loans:
+            self.request('book-loan-renew', 'post', reverse(
+                'books:book-loan-renew', args=[self.rng.choice(self.loans)]))
+
+    def return_book(self):
+        if self.loans:
+            slug = self.loans.pop(self.rng.randrange(len(self.loans)))
+            self.request('book-return', 'post', reverse(
+                'books:book-return', args=[slug]))
+
+    def review(self):
+        slug = self.rng.choice(self.books)
+        if slug not in self.reviewed:
+            self.reviewed.add(slug)
+            self.request('book-leave-review', 'post', reverse(
+                'books:book-leave-review', args=[slug]), {
+                    'rating': self.rng.randint(1, 5),
+                    'review': ' '.join(self.rng.sample(WORDS, 10)),
+                })
+
+    def run(self, mix, deadline):
+        names = list(mix)
+        totals = list(accumulate(mix[name] for name in names))
+        self.login()
+        while time.time() < deadline:
+            pick = self.rng.random() * totals[-1]
+            name = names[bisect_right(totals, pick)]
+            getattr(self, JOURNEYS[name])()
+
+
+def run(base_url, concurrency, duration, mix, password, seed=0):
+    """
+    Runs a load test with concurrency users for duration seconds, returns
+    the report of each endpoint
+    """
+    books = list(Book.objects.order_by('isbn').values_list('slug', flat=True))
+    usernames = list(Customer.objects.order_by('pk').values_list(
+        'username', flat=True)[:concurrency])
+    if not books or len(usernames) < concurrency:
+        raise ValueError('Needs books and a customer for each user')
+
+    stats = Stats()
+    deadline = time.time() + duration
+    users = [User(base_url, username, password, books, stats,
+                  '{}:{}'.format(seed, number))
+             for number, username in enumerate(usernames)]
+    threads = [threading.Thread(target=user.run, args=(mix, deadline))
+               for user in users]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats.report(time.time() - started)
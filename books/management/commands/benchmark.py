@@ -0,0 +1,69 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_test_environment
+
+from books import benchmarks
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks views against the current database and compares the results
+    with a baseline, e.g.
+
+        generate_dataset --restore large
+        benchmark --output results.json --baseline baseline.json
+    """
+    help = 'Measures the latency, queries and memory of the main views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios', nargs='*', metavar='scenario',
+            help='Scenarios to run, one of {} (default all)'.format(
+                ', '.join(benchmarks.SCENARIOS)))
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--restore', metavar='NAME',
+            help='Restore a generate_dataset snapshot before running')
+        parser.add_argument(
+            '--output', help='Write the results as JSON to a file')
+        parser.add_argument(
+            '--baseline', help='Fail if the results regress from this file')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Fraction timings and memory may exceed the baseline by')
+
+    def handle(self, *args, **options):
+        names = options['scenarios'] or list(benchmarks.SCENARIOS)
+        unknown = set(names) - set(benchmarks.SCENARIOS)
+        if unknown:
+            raise CommandError('Unknown scenarios: {}'.format(
+                ', '.join(sorted(unknown))))
+        if options['iterations'] < 1:
+            raise CommandError('Run at least one iteration')
+
+        if options['restore']:
+            call_command('generate_dataset', restore=options['restore'])
+        # Lets the test client through ALLOWED_HOSTS and keeps emails local
+        setup_test_environment()
+        results = benchmarks.run(
+            names, options['iterations'], options['warmup'])
+
+        output = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = benchmarks.compare(
+                results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Regressed from the baseline:\n' +
+                                   '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,84 @@
+import re
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from django.utils.timezone import localtime, now
+
+from books import dataset
+
+
+class Command(BaseCommand):
+    """
+    Generates a large, deterministic dataset offline for benchmarking, e.g.
+
+        generate_dataset --seed 1 --books 1000000 --copies 5000000 \\
+            --customers 200000 --loans 50000000 --reviews 5000000 \\
+            --processes 8 --snapshot large
+        generate_dataset --restore large
+    """
+    help = 'Replaces the database with a generated dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', default='0')
+        for table, volume in dataset.VOLUMES.items():
+            parser.add_argument(
+                '--' + table, type=int, default=volume,
+                help='Number of {} (default {})'.format(table, volume))
+        parser.add_argument(
+            '--overdue-fraction', type=float, default=0.1,
+            help='Fraction of current loans which are overdue')
+        parser.add_argument(
+            '--today', type=parse_date,
+            help='Date loans are generated around, as YYYY-MM-DD')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument(
+            '--snapshot', metavar='NAME',
+            help='Snapshot the database once generated')
+        parser.add_argument(
+            '--restore', metavar='NAME',
+            help='Restore a snapshot instead of generating a dataset')
+
+    def handle(self, *args, **options):
+        for name in (options['snapshot'], options['restore']):
+            if name and not re.match(r'^\w+$', name):
+                raise CommandError('Snapshot names must be alphanumeric')
+
+        started = time.time()
+        if options['restore']:
+            dataset.restore(options['restore'])
+            self.stdout.write(self.style.SUCCESS(
+                'Restored {} in {:.1f}s'.format(
+                    options['restore'], time.time() - started)))
+            return
+
+        volumes = {table: options[table] for table in dataset.VOLUMES}
+        if min(volumes.values()) < 1:
+            raise CommandError('Every volume must be at least 1')
+        if volumes['reviews'] > volumes['customers'] * volumes['books']:
+            raise CommandError('Customers can only review each book once')
+
+        data = dataset.Dataset(
+            options['seed'], volumes,
+            options['today'] or localtime(now()).date(),
+            options['overdue_fraction'], options['chunk_size'])
+
+        # Flush the Database of old data, suppress prompt
+        call_command('flush', '--noinput')
+
+        def progress(table, rows):
+            if options['verbosity'] > 1:
+                self.stdout.write('{}: {} rows'.format(table, rows))
+
+        loaded = dataset.load(data, options['processes'], progress)
+        elapsed = time.time() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Loaded {} rows in {:.1f}s ({:.0f}/s)'.format(
+                loaded, elapsed, loaded / elapsed if elapsed else 0)))
+
+        if options['snapshot']:
+            dataset.snapshot(options['snapshot'])
+            self.stdout.write(self.style.SUCCESS(
+                'Saved snapshot {}'.format(options['snapshot'])))
@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from DjangoLibrary import importtime
+
+
+class Command(BaseCommand):
+    """
+    Reports how long web and Celery processes take to start, and which
+    packages they spend it importing, e.g.
+
+        importtime wsgi celery --repeat 5 --output startup.json
+    """
+    help = 'Measures the startup and import time of each kind of process'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'targets', nargs='*', metavar='target',
+            help='Processes to start, one of {} (default all)'.format(
+                ', '.join(sorted(importtime.TARGETS))))
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Start each target this many times and keep the fastest')
+        parser.add_argument(
+            '--limit', type=int, default=10,
+            help='Number of packages and modules listed')
+        parser.add_argument(
+            '--output', help='Write the report as JSON to a file')
+
+    def handle(self, *args, **options):
+        targets = options['targets'] or sorted(importtime.TARGETS)
+        unknown = set(targets) - set(importtime.TARGETS)
+        if unknown:
+            raise CommandError('Unknown targets: {}'.format(
+                ', '.join(sorted(unknown))))
+        if options['repeat'] < 1:
+            raise CommandError('Start each target at least once')
+
+        reports = {}
+        for target in targets:
+            try:
+                reports[target] = importtime.report(
+                    target, options['repeat'], options['limit'])
+            except RuntimeError as e:
+                raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(json.dumps(reports, indent=2) + '\n')
+            return
+        for target, report in reports.items():
+            self.stdout.write(
+                '{}: {:.3f}s, {:.3f}s importing {} modules'.format(
+                    target, report['seconds'], report['import_seconds'],
+                    report['modules']))
+            for package, seconds in report['packages']:
+                self.stdout.write('  {:<30} {:.4f}s'.format(package, seconds))
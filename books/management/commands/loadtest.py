@@ -0,0 +1,83 @@
+import json
+from collections import OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from books import loadtest
+
+
+def parse_mix(value):
+    """Parses a traffic mix such as browse=30,checkout=10"""
+    mix = OrderedDict()
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in loadtest.MIX or not weight.isdigit():
+            raise ValueError(part)
+        mix[name] = int(weight)
+    return mix
+
+
+class Command(BaseCommand):
+    """
+    Drives patron journeys against a running server, e.g. stepping up the
+    number of users to find where checkout throughput saturates:
+
+        generate_dataset --restore large
+        gunicorn DjangoLibrary.wsgi --workers 4 &
+        loadtest --concurrency 1,2,4,8,16,32 --mix detail=50,checkout=50
+    """
+    help = 'Load tests a running server with scripted patron journeys'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument(
+            '--concurrency', default='8',
+            help='Number of users, or a comma separated list of numbers to '
+                 'run one after another')
+        parser.add_argument(
+            '--duration', type=float, default=60,
+            help='Seconds to run each concurrency for')
+        parser.add_argument(
+            '--mix', type=parse_mix, default=loadtest.MIX,
+            help='Weights of each journey, e.g. {}'.format(','.join(
+                '{}={}'.format(*item) for item in loadtest.MIX.items())))
+        parser.add_argument(
+            '--password', default='test',
+            help='Password of every customer, as set by generate_dataset')
+        parser.add_argument('--seed', default='0')
+        parser.add_argument(
+            '--output', help='Write the results as JSON to a file')
+
+    def handle(self, *args, **options):
+        try:
+            steps = [int(step) for step in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('Concurrency must be numbers')
+        if not sum(options['mix'].values()):
+            raise CommandError('The mix needs a journey with some weight')
+
+        results = []
+        for concurrency in steps:
+            try:
+                report = loadtest.run(
+                    options['url'], concurrency, options['duration'],
+                    options['mix'], options['password'], options['seed'])
+            except ValueError as e:
+                raise CommandError(e)
+            total = sum(result['requests'] for result in report.values())
+            self.stdout.write('{} users: {:.1f} requests/s'.format(
+                concurrency, total / options['duration']))
+            for endpoint, result in report.items():
+                self.stdout.write(
+                    '  {:<20} {throughput:>8.1f}/s  p50 {p50:.3f}s  '
+                    'p99 {p99:.3f}s  errors {error_rate:.1%}  '
+                    'refused {refused_rate:.1%}'.format(
+                        endpoint, **result))
+            results.append(OrderedDict([
+                ('concurrency', concurrency),
+                ('endpoints', report),
+            ]))
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
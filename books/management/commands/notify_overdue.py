@@ -1,25 +1,23 @@
-from django.conf import settings
-from django.core.mail import send_mail
+import time
+
 from django.core.management.base import BaseCommand
-from django.template import Context
-from django.template.loader import get_template
-from django.utils.timezone import now
 
-from books.models import Customer
+from books.reminders import send_reminders
 
 
 class Command(BaseCommand):
 
-    help = "Sends overdue loan reminder emails to customers"
+    help = "Sends the loan reminder emails which are due to customers"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Number of reminders rendered and sent at a time')
 
     def handle(self, *args, **options):
-        customers = Customer.objects.filter(loans__returned=False,
-                                            loans__end_date__lte=now())
-        for customer in customers:
-            self.stdout.write(self.style.SUCCESS(
-                'Sending reminder to {}'.format(customer)))
-            context = {'customer': customer}
-            html = get_template('books/email.html').render(Context(context))
-            message = "Return books reminder"
-            send_mail('DjangoLibrary book return request', message,
-                      settings.EMAIL_SENDER, [customer.email], html)
+        started = time.time()
+        sent = send_reminders(options['batch_size'])
+        elapsed = time.time() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Sent {} reminders in {:.2f}s ({:.1f}/s)'.format(
+                sent, elapsed, sent / elapsed if elapsed else 0)))
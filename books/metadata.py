@@ -0,0 +1,200 @@
+"""
+Background refresh of book metadata.
+
+Titles, covers and categories are fetched once by
+BookManager.create_book_from_metadata. Books whose metadata is missing, has
+aged past METADATA_REFRESH['MAX_AGE'] or still shows the placeholder cover
+are re-resolved here in batches, using at most METADATA_REFRESH['BUDGET']
+lookups a run, METADATA_REFRESH['CONCURRENCY'] at a time and no faster than
+METADATA_REFRESH['RATE'] a second, so refreshes never crowd out interactive
+lookups. Changes are applied as bulk updates.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import capwords
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, IntegerField, Q, Value, When
+from django.utils.timezone import now
+
+from .cache import bump_versions, metadata_cache
+from .isbn import meta
+from .models import PLACEHOLDER_IMG, Author, Book, Genre
+
+logger = logging.getLogger(__name__)
+
+
+def stale_books():
+    """
+    Returns the books due a metadata refresh, those never refreshed first
+    and then the least recently refreshed
+    """
+    options = settings.METADATA_REFRESH
+    return (
+        Book.objects.annotate(never_refreshed=Case(
+            When(metadata_refreshed_on__isnull=True, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField()
+        ))
+        .filter(
+            Q(metadata_refreshed_on__isnull=True) |
+            Q(metadata_refreshed_on__lt=now() - options['MAX_AGE']) |
+            Q(img=PLACEHOLDER_IMG) |
+            Q(title='')
+        )
+        # Don't retry books which couldn't be resolved on the last run
+        .exclude(metadata_refreshed_on__gte=now() - options['RETRY_AFTER'])
+        .order_by('never_refreshed', 'metadata_refreshed_on', 'pk')
+    )
+
+
+class RateLimiter(object):
+    """Spaces calls out so there are at most `rate` a second across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self.next_call = time.time()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.next_call - time.time()
+            self.next_call = max(self.next_call, time.time()) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def resolve(isbn, limiter):
+    """Returns fresh metadata for an ISBN, or None if it can't be resolved"""
+    limiter.wait()
+    try:
+        meta_info = meta(isbn)
+    except Exception:
+        # Provider responses are unreliable, try again on a later run
+        logger.warning('Metadata lookup failed for %s', isbn, exc_info=True)
+        return
+    if meta_info:
+        metadata_cache.set(isbn, meta_info)
+    return meta_info
+
+
+def get_changes(book, meta_info):
+    """Returns a dict of the book's fields changed by its new metadata"""
+    changes = {
+        'title': capwords(meta_info.get('title', '')),
+        'subtitle': capwords(meta_info.get('subtitle', '')),
+        'img': meta_info.get('img') or PLACEHOLDER_IMG,
+    }
+    return {
+        field: value for field, value in changes.items()
+        if value and value != getattr(book, field)
+    }
+
+
+def bulk_update(field, values):
+    """Sets a field to a different value for each book in a single update"""
+    if values:
+        Book.objects.filter(pk__in=values).update(**{field: Case(
+            *[When(pk=pk, then=Value(value)) for pk, value in values.items()],
+            output_field=CharField()
+        )})
+
+
+def add_related(through, related_model, field, found):
+    """
+    Adds missing relations from books to authors or genres by name, given a
+    dict of book pk to names, returns the number of relations added
+    """
+    names = {capwords(name) for names in found.values() for name in names}
+    existing = dict(
+        related_model.objects.filter(name__in=names).values_list('name', 'pk')
+    )
+    for name in names - set(existing):
+        existing[name] = related_model.objects.create(name=name).pk
+    linked = set(through.objects.filter(book__in=list(found)).values_list(
+        'book_id', field + '_id'))
+    relations = {
+        (book, existing[capwords(name)])
+        for book, names in found.items() for name in names
+    } - linked
+    through.objects.bulk_create(
+        through(**{'book_id': book, field + '_id': pk})
+        for book, pk in relations
+    )
+    return len(relations)
+
+
+def apply_metadata(books, resolved):
+    """
+    Applies resolved metadata to a batch of books in bulk, returns the
+    number of books changed
+    """
+    changes = {
+        book.pk: get_changes(book, resolved[book.pk])
+        for book in books if resolved.get(book.pk)
+    }
+    # Titles are unique, keep the current title if the new one is taken
+    titles = {pk: change['title'] for pk, change in changes.items()
+              if 'title' in change}
+    taken = set(Book.objects.filter(title__in=titles.values())
+                .exclude(pk__in=titles).values_list('title', flat=True))
+    for pk, title in titles.items():
+        if title in taken or list(titles.values()).count(title) > 1:
+            del changes[pk]['title']
+
+    with transaction.atomic():
+        # Slugs are left alone, so links to renamed books keep working
+        for field in ('title', 'subtitle', 'img'):
+            bulk_update(field, {
+                pk: change[field] for pk, change in changes.items()
+                if field in change
+            })
+        related = 0
+        for field, model, key in (('author', Author, 'authors'),
+                                  ('genre', Genre, 'categories')):
+            through = getattr(Book, field + 's').through
+            related += add_related(through, model, field, {
+                pk: resolved[pk][key] for pk in changes
+                if resolved[pk].get(key)
+            })
+        Book.objects.filter(pk__in=[book.pk for book in books]).update(
+            metadata_refreshed_on=now())
+
+    changed = [pk for pk, change in changes.items() if change]
+    # Bulk updates skip the signals which invalidate cached pages
+    if changed or related:
+        bump_versions(
+            [('book', pk) for pk in changes] +
+            [('catalog', None), ('author', None), ('genre', None)]
+        )
+    return len(changed)
+
+
+def refresh_stale_metadata(budget=None, concurrency=None):
+    """
+    Refreshes the metadata of up to `budget` stale books, returns a tuple of
+    the number of books looked up and the number changed
+    """
+    options = settings.METADATA_REFRESH
+    budget = budget or options['BUDGET']
+    concurrency = concurrency or options['CONCURRENCY']
+    limiter = RateLimiter(options['RATE'])
+    looked_up = changed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        while looked_up < budget:
+            size = min(options['BATCH_SIZE'], budget - looked_up)
+            books = list(stale_books()[:size])
+            if not books:
+                break
+            isbns = [book.pk for book in books]
+            resolved = dict(zip(
+                isbns,
+                executor.map(lambda isbn: resolve(isbn, limiter), isbns)
+            ))
+            changed += apply_metadata(books, resolved)
+            looked_up += len(books)
+    return looked_up, changed
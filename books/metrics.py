@@ -0,0 +1,64 @@
+"""
+Metrics of circulation, ISBN provider lookups and the namespaced caches,
+exported by DjangoLibrary.metrics
+"""
+
+from functools import wraps
+from time import perf_counter
+
+from DjangoLibrary.metrics import Counter, Histogram, collector
+
+from .cache import get_stats
+
+CIRCULATION_TOTAL = Counter(
+    'library_circulation_total',
+    'Checkouts, returns and renewals by outcome', ('operation', 'outcome'))
+
+CIRCULATION_DURATION = Histogram(
+    'library_circulation_duration_seconds',
+    'Time spent checking out, returning and renewing books', ('operation',))
+
+ISBN_PROVIDER_TOTAL = Counter(
+    'library_isbn_provider_requests_total',
+    'ISBN provider lookups by outcome', ('provider', 'outcome'))
+
+ISBN_PROVIDER_DURATION = Histogram(
+    'library_isbn_provider_duration_seconds',
+    'Time spent waiting on ISBN providers', ('provider',),
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30))
+
+
+def circulation(operation):
+    """
+    Records the duration and outcome of a circulation view, views set
+    request.circulation_outcome when the operation is refused
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with CIRCULATION_DURATION.time(operation=operation):
+                response = view(request, *args, **kwargs)
+            CIRCULATION_TOTAL.inc(
+                operation=operation,
+                outcome=getattr(request, 'circulation_outcome', 'ok'))
+            return response
+        return wrapper
+    return decorator
+
+
+def record_provider_lookup(provider, outcome, started):
+    ISBN_PROVIDER_DURATION.observe(
+        perf_counter() - started, provider=provider)
+    ISBN_PROVIDER_TOTAL.inc(provider=provider, outcome=outcome)
+
+
+@collector
+def collect_namespace_stats():
+    return [
+        ('library_cache_requests_total', 'counter',
+         'Namespaced cache lookups by result',
+         [('library_cache_requests_total',
+           {'namespace': namespace, 'result': result}, stats.get(result, 0))
+          for namespace, stats in sorted(get_stats().items())
+          for result in ('hits', 'misses')]),
+    ]
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0008_auto_20170130_1450'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedLoan',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField(db_index=True)),
+                ('renew_count', models.IntegerField(default=1)),
+                ('returned_on', models.DateTimeField()),
+                ('archived_on', models.DateTimeField(auto_now_add=True)),
+                ('book_copy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to='books.BookCopy')),
+                ('customer', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_loans', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-end_date',),
+            },
+        ),
+    ]
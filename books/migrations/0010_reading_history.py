@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_reading_history(apps, schema_editor):
+    ArchivedLoan = apps.get_model('books', 'ArchivedLoan')
+    Customer = apps.get_model('books', 'Customer')
+    CustomerBook = apps.get_model('books', 'CustomerBook')
+    Loan = apps.get_model('books', 'Loan')
+
+    # Combine returned loans with those already moved into the archive
+    history = {}
+    sources = (
+        (Loan.objects.filter(returned=True), 'modified_on'),
+        (ArchivedLoan.objects.all(), 'returned_on'),
+    )
+    for loans, returned_on in sources:
+        rows = (
+            loans.exclude(customer=None)
+            .values('customer', 'book_copy__book')
+            .annotate(times_read=Count('id'), last_read_on=Max(returned_on))
+        )
+        for row in rows:
+            key = (row['customer'], row['book_copy__book'])
+            times_read, last_read_on = history.get(key, (0, None))
+            history[key] = (
+                times_read + row['times_read'],
+                max(filter(None, [last_read_on, row['last_read_on']])),
+            )
+
+    totals = {}
+    for (customer, book), (times_read, last_read_on) in history.items():
+        updated = CustomerBook.objects.filter(
+            customer=customer, book=book
+        ).update(times_read=times_read, last_read_on=last_read_on)
+        if not updated:
+            CustomerBook.objects.create(
+                customer_id=customer, book_id=book, category='R',
+                times_read=times_read, last_read_on=last_read_on
+            )
+        books_read, loans_returned = totals.get(customer, (0, 0))
+        totals[customer] = (books_read + 1, loans_returned + times_read)
+
+    for customer, (books_read, loans_returned) in totals.items():
+        Customer.objects.filter(pk=customer).update(
+            books_read=books_read, loans_returned=loans_returned
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0009_archivedloan'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='books_read',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='loans_returned',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customerbook',
+            name='last_read_on',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customerbook',
+            name='times_read',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterIndexTogether(
+            name='customerbook',
+            index_together=set([('customer', 'last_read_on')]),
+        ),
+        migrations.RunPython(
+            backfill_reading_history, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.utils.timezone import localtime, now
+import django.db.models.deletion
+
+
+def schedule_unreturned_loans(apps, schema_editor):
+    # The next scheduler run sends any reminder that's due, then schedules
+    # the loan's following reminder
+    Loan = apps.get_model('books', 'Loan')
+    Loan.objects.filter(returned=False).update(
+        next_reminder_on=localtime(now()).date()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0010_reading_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='next_reminder_on',
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ReminderLog',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('D', 'Due soon'), ('O', 'Overdue'), ('E', 'Escalation')], max_length=1)),
+                ('scheduled_on', models.DateField()),
+                ('sent_on', models.DateTimeField(auto_now_add=True)),
+                ('loan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='books.Loan')),
+            ],
+            options={
+                'ordering': ('-sent_on',),
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='reminderlog',
+            unique_together=set([('loan', 'kind', 'scheduled_on')]),
+        ),
+        migrations.RunPython(
+            schedule_unreturned_loans, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0011_reminderlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='metadata_refreshed_on',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0012_book_metadata_refreshed_on'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='cover_hash',
+            field=models.CharField(blank=True, max_length=40),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_placeholder',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='cover_source',
+            field=models.URLField(blank=True),
+        ),
+    ]
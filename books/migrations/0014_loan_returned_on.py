@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_returned_on(apps, schema_editor):
+    # The last modification is the best guess left of when a loan returned
+    # before now was returned
+    Loan = apps.get_model('books', 'Loan')
+    Loan.objects.filter(returned=True).update(returned_on=F('modified_on'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0013_book_covers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loan',
+            name='returned_on',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(
+            backfill_returned_on, migrations.RunPython.noop
+        ),
+    ]
@@ -1,15 +1,15 @@
 from django.conf import settings
-from django.db.models import Avg, Case, Count, F, Sum, When
+from django.db.models import Avg, Case, Count, F, Sum, Value, When
 from django.contrib.auth.models import AbstractUser
-from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Q
 from django.db.models.functions import Now
 from django.shortcuts import reverse
 from django.utils.functional import cached_property
 from django.utils.text import slugify
-from django.utils.timezone import localtime, now
+from django.utils.timezone import localtime, now, timedelta
 from django.utils.translation import ugettext as _
 from django.contrib.postgres.search import (
     SearchQuery, SearchRank, SearchVector
@@ -17,9 +17,14 @@ from django.contrib.postgres.search import (
 
 from string import capwords
 
+from .cache import metadata_cache
 from .isbn import meta
 
 
+# Cover shown for books without an image from the metadata providers
+PLACEHOLDER_IMG = 'http://placehold.it/150x225'
+
+
 class TimeStampedModel(models.Model):
     """Adds created_on, and modified_on Fields to all subclasses"""
     created_on = models.DateTimeField(auto_now_add=True)
@@ -48,6 +53,13 @@ class CustomerBook(models.Model):
         choices=INTEREST_CHOICE,
         default='C'
     )
+    # Maintained as loans are returned, so reading history never has to be
+    # derived from the customer's loans
+    times_read = models.IntegerField(default=0)
+    last_read_on = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        index_together = (('customer', 'last_read_on'),)
 
     def __str__(self):
         return '{}: {} - {}'.format(
@@ -58,6 +70,9 @@ class CustomerBook(models.Model):
 class Customer(AbstractUser):
     join_date = models.DateTimeField(auto_now_add=True)
     book_allowance = models.IntegerField(default=3)
+    # Reading history totals, maintained as loans are returned
+    books_read = models.IntegerField(default=0)
+    loans_returned = models.IntegerField(default=0)
 
     def has_reviewed(self, isbn):
         return self.reviews.filter(book__isbn=isbn).exists()
@@ -68,8 +83,11 @@ class Customer(AbstractUser):
 
     def has_loaned(self, isbn):
         """Returns True if a user has previously loaned a book"""
-        return self.loans.filter(returned=True,
-                                 book_copy__book__isbn=isbn).exists()
+        return (
+            self.loans.filter(returned=True,
+                              book_copy__book__isbn=isbn).exists() or
+            self.archived_loans.filter(book_copy__book__isbn=isbn).exists()
+        )
 
     def can_loan_book(self, book):
         """Returns True if a user can loan a particular book"""
@@ -96,8 +114,33 @@ class Customer(AbstractUser):
     @property
     def read_list(self):
         """Returns set of all books a customer has previously loaned"""
-        return Book.objects.filter(copies__loans__customer=self,
-                                   copies__loans__returned=True).distinct()
+        return Book.objects.filter(customers__customer=self,
+                                   customers__last_read_on__isnull=False)
+
+    def reading_history(self, after=None, count=30):
+        """
+        Returns a page of CustomerBooks the customer has read, most recently
+        read first, and the (last_read_on, pk) cursor of the following page
+
+        Pages are fetched by keyset so that every page costs the same
+        regardless of how long the customer's history is
+        """
+        history = (
+            self.books.filter(last_read_on__isnull=False)
+            .select_related('book')
+            .order_by('-last_read_on', '-pk')
+        )
+        if after is not None:
+            last_read_on, pk = after
+            history = history.filter(
+                Q(last_read_on__lt=last_read_on) |
+                Q(last_read_on=last_read_on, pk__lt=pk)
+            )
+        page = list(history[:count + 1])
+        if len(page) <= count:
+            return page, None
+        page = page[:count]
+        return page, (page[-1].last_read_on, page[-1].pk)
 
     def get_absolute_url(self):
         return reverse('books:customer-detail')
@@ -154,14 +197,15 @@ class BookManager(models.Manager):
         if created:
 
             # Check the cache
-            meta_info = cache.get(isbn)
+            meta_info = metadata_cache.get(isbn)
             if not meta_info:
                 meta_info = meta(isbn)
-                cache.set(isbn, meta_info)
+                metadata_cache.set(isbn, meta_info)
 
             book.title = capwords(meta_info.get('title', ''))
             book.subtitle = capwords(meta_info.get('subtitle', ''))
-            book.img = meta_info.get('img')
+            book.img = meta_info.get('img') or PLACEHOLDER_IMG
+            book.metadata_refreshed_on = now()
 
             # Book must be saved before associating it with m2m instances
             book.save()
@@ -220,8 +264,15 @@ class Book(TimeStampedModel):
         blank=True,
         help_text=_("e.g. There and Back Again")
     )
-    img = models.URLField(default='http://placehold.it/150x225')
+    img = models.URLField(default=PLACEHOLDER_IMG)
     slug = models.SlugField(max_length=200)
+    # When the title, cover and categories were last fetched from providers
+    metadata_refreshed_on = models.DateTimeField(
+        blank=True, null=True, db_index=True)
+    # The img the locally cached cover was made from, see books.covers
+    cover_source = models.URLField(blank=True)
+    cover_hash = models.CharField(max_length=40, blank=True)
+    cover_placeholder = models.TextField(blank=True)
 
     objects = BookManager()  # Book specific manager
     available = AvailableBookManager()
@@ -232,7 +283,7 @@ class Book(TimeStampedModel):
     class Meta:
         ordering = ('-created_on',)
 
-    @property
+    @cached_property
     def similar_books(self):
         """Returns a list of similar books"""
         vector = SearchVector('title', 'subtitle')
@@ -241,13 +292,13 @@ class Book(TimeStampedModel):
             .filter(genres__in=self.genres.values('id'))\
             .annotate(rank=SearchRank(vector, query)).order_by('-rank')[:5]
 
-    @property
+    @cached_property
     def current_owners(self):
         """Returns the currnet owners of a given book"""
         return Customer.objects.filter(pk__in=Loan.objects.filter(
             returned=False, book_copy__book=self).values('customer'))
 
-    @property
+    @cached_property
     def average_rating(self):
         return self.reviews.aggregate(Avg('rating'))['rating__avg']
 
@@ -299,16 +350,76 @@ class BookCopy(TimeStampedModel):
 
 
 class OverdueLoanManager(models.Manager):
+    # (label, minimum days overdue) ordered from most to least overdue
+    AGE_BUCKETS = (
+        ('Over a month', 31),
+        ('15 - 30 days', 15),
+        ('8 - 14 days', 8),
+        ('Up to a week', 0),
+    )
+
     def get_queryset(self):
         return super(OverdueLoanManager, self).get_queryset().filter(
             returned=False, end_date__lte=Now()
         )
 
+    def with_age_bucket(self):
+        """Annotates overdue loans with the index of their age bucket"""
+        today = localtime(now()).date()
+        return self.annotate(age_bucket=Case(
+            *[When(end_date__lte=today - timedelta(days=days), then=Value(i))
+              for i, (label, days) in enumerate(self.AGE_BUCKETS)],
+            output_field=models.IntegerField()
+        ))
+
+    def summary(self):
+        """Returns the number of overdue loans in each age bucket"""
+        counts = dict(
+            self.with_age_bucket()
+            .values_list('age_bucket')
+            .annotate(Count('id'))
+            .order_by()
+        )
+        return [
+            {'bucket': i, 'label': label, 'count': counts.get(i, 0)}
+            for i, (label, days) in enumerate(self.AGE_BUCKETS)
+        ]
+
+
+class LoanManager(models.Manager):
+
+    def returned_before(self, before):
+        return self.filter(returned=True, returned_on__lt=before)
+
+    def archive_returned(self, before, batch_size=1000, pk_range=None):
+        """
+        Moves loans returned before a given datetime into the ArchivedLoan
+        table, in batches, returning the number of loans archived. pk_range
+        optionally limits archiving to a (first, last) range of loans.
+        """
+        loans = self.returned_before(before)
+        if pk_range is not None:
+            loans = loans.filter(pk__range=pk_range)
+        archived = 0
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    loans.select_for_update().order_by('pk')[:batch_size]
+                )
+                if not batch:
+                    return archived
+                ArchivedLoan.objects.bulk_create(
+                    ArchivedLoan.from_loan(loan) for loan in batch
+                )
+                self.filter(pk__in=[loan.pk for loan in batch]).delete()
+            archived += len(batch)
+
 
 class Loan(TimeStampedModel):
     start_date = models.DateField()
     end_date = models.DateField()
     returned = models.BooleanField(default=False)
+    returned_on = models.DateTimeField(blank=True, null=True, db_index=True)
     customer = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         blank=True,
@@ -322,10 +433,20 @@ class Loan(TimeStampedModel):
     )
     # The number of times a user is allowed to renew a book loan
     renew_count = models.IntegerField(default=1)
+    # Date of the next scheduled reminder, None once there are none left
+    next_reminder_on = models.DateField(blank=True, null=True, db_index=True)
 
-    objects = models.Manager()  # The default manager
+    objects = LoanManager()  # The default manager
     overdue = OverdueLoanManager()  # Overdue loan specific manager
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        loan = super(Loan, cls).from_db(db, field_names, values)
+        # Remember whether the loan had already been returned when loaded
+        loan._loaded_returned = loan.returned
+        loan._loaded_end_date = loan.end_date
+        return loan
+
     @cached_property
     def warn_level(self):
         """
@@ -376,19 +497,68 @@ class Loan(TimeStampedModel):
                 'Cannot renew book outside of configured Renew window'
             )
 
+    def get_reminder_schedule(self):
+        """Returns the loan's (kind, date) reminders in date order"""
+        return [
+            (ReminderLog.DUE_SOON, self.end_date - settings.RENEW_WINDOW),
+            (ReminderLog.OVERDUE, self.end_date),
+        ] + [
+            (ReminderLog.ESCALATION, self.end_date + overdue_for)
+            for overdue_for in settings.REMINDER_ESCALATIONS
+        ]
+
+    def get_due_reminder(self, today):
+        """Returns the latest (kind, date) reminder due by today, or None"""
+        due = [
+            reminder for reminder in self.get_reminder_schedule()
+            if reminder[1] <= today
+        ]
+        return due[-1] if due else None
+
+    def schedule_next_reminder(self, after):
+        """Sets next_reminder_on to the first reminder after a given date"""
+        dates = [
+            date for _, date in self.get_reminder_schedule() if date > after
+        ]
+        self.next_reminder_on = dates[0] if dates else None
+
+    def schedule_reminders(self, today):
+        """
+        Sets next_reminder_on to the latest reminder due by today if it
+        hasn't been sent, so an already overdue loan is reminded on the next
+        run, otherwise to the first reminder after today
+        """
+        due = self.get_due_reminder(today)
+        if due is not None and (self.pk is None or not self.reminders.filter(
+                kind=due[0], scheduled_on=due[1]).exists()):
+            self.next_reminder_on = due[1]
+        else:
+            self.schedule_next_reminder(today)
+
     def save(self, *args, **kwargs):
         if not self.start_date and not self.end_date:
             self.start_date = localtime(now()).date()
             self.end_date = self.start_date + settings.LOAN_DURATION
 
-        # If the loan is being returned change it's category to Read
+        # Reschedule reminders when the loan is taken out, renewed or returned
         if self.returned:
-            customer_book, _ = CustomerBook.objects.get_or_create(
-                book=self.book_copy.book,
-                customer=self.customer,
-            )
-            customer_book.category = 'R'
-            customer_book.save(update_fields=['category'])
+            self.next_reminder_on = None
+        elif (self.pk is None or
+                self.end_date != getattr(self, '_loaded_end_date', None)):
+            self.schedule_reminders(localtime(now()).date())
+
+        # If the loan is being returned change it's category to Read
+        if self.returned and not getattr(self, '_loaded_returned', False):
+            if self.returned_on is None:
+                self.returned_on = now()
+            self.mark_read()
+
+        # Partial saves still write the fields set here, and the auto_now
+        # modified_on which is otherwise only written by full saves
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {
+                'next_reminder_on', 'returned_on', 'modified_on'
+            }
 
         # If the loan is new then add mark it as currently being read
         if self.pk is None:
@@ -400,6 +570,99 @@ class Loan(TimeStampedModel):
             customer_book.save(update_fields=['category'])
 
         super(Loan, self).save(*args, **kwargs)
+        self._loaded_returned = self.returned
+        self._loaded_end_date = self.end_date
+
+    def mark_read(self):
+        """Adds the loan's book to the customer's reading history"""
+        customer_book, _ = CustomerBook.objects.get_or_create(
+            book=self.book_copy.book,
+            customer=self.customer,
+        )
+        first_read = customer_book.last_read_on is None
+        customer_book.category = 'R'
+        customer_book.last_read_on = now()
+        customer_book.times_read = F('times_read') + 1
+        customer_book.save(
+            update_fields=['category', 'last_read_on', 'times_read'])
+        Customer.objects.filter(pk=self.customer_id).update(
+            books_read=F('books_read') + int(first_read),
+            loans_returned=F('loans_returned') + 1,
+        )
+
+    def __str__(self):
+        return str(self.start_date)
+
+
+class ReminderLog(models.Model):
+    """
+    A reminder sent about a loan, there's at most one of each kind for each
+    scheduled date so a loan is never reminded about twice
+    """
+    DUE_SOON = 'D'
+    OVERDUE = 'O'
+    ESCALATION = 'E'
+    KIND_CHOICES = (
+        (DUE_SOON, 'Due soon'),
+        (OVERDUE, 'Overdue'),
+        (ESCALATION, 'Escalation'),
+    )
+
+    loan = models.ForeignKey(
+        'Loan',
+        on_delete=models.CASCADE,
+        related_name='reminders'
+    )
+    kind = models.CharField(max_length=1, choices=KIND_CHOICES)
+    scheduled_on = models.DateField()
+    sent_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-sent_on',)
+        unique_together = (('loan', 'kind', 'scheduled_on'),)
+
+    def __str__(self):
+        return '{}: {}'.format(self.get_kind_display(), self.scheduled_on)
+
+
+class ArchivedLoan(models.Model):
+    """
+    A returned loan which has been moved out of the loans table, keeps the
+    loans table small enough that only active loans are scanned and joined
+    """
+    id = models.IntegerField(primary_key=True)  # Id of the original loan
+    start_date = models.DateField()
+    end_date = models.DateField(db_index=True)
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        blank=True,
+        null=True,
+        related_name='archived_loans'
+    )
+    book_copy = models.ForeignKey(
+        'BookCopy',
+        on_delete=models.CASCADE,
+        related_name='archived_loans'
+    )
+    renew_count = models.IntegerField(default=1)
+    returned_on = models.DateTimeField()
+    archived_on = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ('-end_date',)
+
+    @classmethod
+    def from_loan(cls, loan):
+        """Returns an unsaved ArchivedLoan copied from a returned loan"""
+        return cls(
+            id=loan.pk,
+            start_date=loan.start_date,
+            end_date=loan.end_date,
+            customer_id=loan.customer_id,
+            book_copy_id=loan.book_copy_id,
+            renew_count=loan.renew_count,
+            returned_on=loan.returned_on,
+        )
 
     def __str__(self):
         return str(self.start_date)
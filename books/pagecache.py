@@ -0,0 +1,179 @@
+"""
+Full-page cache for anonymous catalog traffic.
+
+Views decorated with cached_page tag their responses with the version keys
+of the objects they show (see books.cache.get_version). PageCacheMiddleware
+stores those responses for clients without a session or messages cookie and
+serves them before the session, auth and message middleware run.
+
+Changing an object bumps its version, which purges every page tagged with
+it. Outdated pages are served stale whilst a single request regenerates
+them, so a spike of traffic on a changed page doesn't stampede the database.
+
+Pages being cached are rendered with a placeholder in place of the CSRF
+token, by the csrf_placeholder context processor, so rendering them doesn't
+set a CSRF cookie. Each client's own token is filled in when the page is
+served, and its cookie set as CsrfViewMiddleware would.
+"""
+
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.http import HttpResponse
+from django.middleware.csrf import CsrfViewMiddleware, get_token
+from django.utils.http import urlencode
+
+from .cache import NamespacedCache, get_versions
+from .conditional import get_page_state
+
+page_cache = NamespacedCache('pages')
+
+# Query parameters that change what catalog pages show
+QUERY_PARAMS = ('page', 'q', 'sort')
+
+CACHE_HEADER = 'X-Page-Cache'
+
+CSRF_PLACEHOLDER = 'page-cache-csrf-token-placeholder'
+
+
+def cached_page(get_state):
+    """
+    Decorator marking a view's responses as cacheable for anonymous users
+
+    get_state follows the contract of books.conditional.conditional_page,
+    its version keys are used as the response's cache tags.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            tags = None
+            if getattr(request, '_page_cacheable', False):
+                state = get_page_state(request, get_state, *args, **kwargs)
+                if state is not None:
+                    tags = list(state[0])
+                    # Read before rendering, so that a change made whilst
+                    # rendering leaves the page outdated rather than missed
+                    versions = get_versions(tags)
+            response = view_func(request, *args, **kwargs)
+            if tags is not None:
+                response.cache_tags = tags
+                response.cache_versions = versions
+            return response
+        return wrapper
+    return decorator
+
+
+def csrf_placeholder(request):
+    """Context processor rendering the CSRF placeholder in cached pages"""
+    if getattr(request, '_page_cacheable', False):
+        return {'csrf_token': CSRF_PLACEHOLDER}
+    return {}
+
+
+def insert_csrf_token(request, response):
+    """
+    Replaces the CSRF placeholder in a page with the client's token, and
+    sets the client's CSRF cookie
+    """
+    placeholder = CSRF_PLACEHOLDER.encode()
+    if response.streaming or placeholder not in response.content:
+        return response
+    csrf = CsrfViewMiddleware()
+    # Reads the client's CSRF cookie, so an existing token is kept
+    csrf.process_view(request, None, (), {})
+    response.content = response.content.replace(
+        placeholder, get_token(request).encode())
+    if response.has_header('Content-Length'):
+        response['Content-Length'] = str(len(response.content))
+    return csrf.process_response(request, response)
+
+
+def get_page_key(request):
+    """
+    Returns the cache key of the request's page, or None if the request
+    can't be served from the page cache
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return
+    if (settings.SESSION_COOKIE_NAME in request.COOKIES or
+            CookieStorage.cookie_name in request.COOKIES):
+        return
+    if any(param not in QUERY_PARAMS for param in request.GET):
+        return
+    query = sorted(
+        (param, value) for param, value in request.GET.items() if value
+    )
+    return '{}?{}'.format(request.path, urlencode(query))
+
+
+def is_cacheable_response(response):
+    return (
+        response.status_code == 200 and
+        hasattr(response, 'cache_tags') and
+        not response.streaming and
+        not response.cookies and
+        'private' not in response.get('Cache-Control', '')
+    )
+
+
+class PageCacheMiddleware(object):
+    """
+    Serves anonymous requests for cached_page views from the page cache
+
+    This should come before SessionMiddleware, so that hits skip the rest of
+    the middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = get_page_key(request)
+        if key is None:
+            return self.get_response(request)
+
+        page = page_cache.get(key)
+        if page is not None:
+            if self.is_fresh(page):
+                return insert_csrf_token(
+                    request, self.build_response(page, 'hit'))
+            # Only one request regenerates an outdated page
+            if not page_cache.add(('lock', key), True,
+                                  timeout=settings.PAGE_CACHE_LOCK_SECONDS):
+                return insert_csrf_token(
+                    request, self.build_response(page, 'stale'))
+        try:
+            request._page_cacheable = request.method == 'GET'
+            response = self.get_response(request)
+            if request._page_cacheable and is_cacheable_response(response):
+                page_cache.set(key, self.make_page(response))
+                response[CACHE_HEADER] = 'miss'
+        finally:
+            if page is not None:
+                page_cache.delete(('lock', key))
+        return insert_csrf_token(request, response)
+
+    def is_fresh(self, page):
+        return (
+            time.time() - page['created'] < settings.PAGE_CACHE_SECONDS and
+            page['versions'] == get_versions(page['tags'])
+        )
+
+    def make_page(self, response):
+        return {
+            'content': response.content,
+            'status': response.status_code,
+            'headers': list(response.items()),
+            'tags': response.cache_tags,
+            'versions': response.cache_versions,
+            'created': time.time(),
+        }
+
+    def build_response(self, page, state):
+        response = HttpResponse(page['content'], status=page['status'])
+        for header, value in page['headers']:
+            response[header] = value
+        response[CACHE_HEADER] = state
+        return response
@@ -0,0 +1,102 @@
+"""
+ISBN metadata provider serving a local corpus, for offline tests, benchmarks
+and load runs.
+
+The corpus is either a JSON lines file of metadata, each with its "isbn":
+
+    {"isbn": "9781593272814", "title": "...", "authors": ["..."], ...}
+
+or an SQLite database with a `metadata (isbn TEXT PRIMARY KEY, data TEXT)`
+table of JSON metadata. Latency and errors can be injected to exercise
+resolver concurrency, timeouts and caching. They're drawn from a random
+generator seeded with the ISBN and the number of times it's been looked up,
+so a run is repeatable whatever order lookups are made in.
+"""
+
+import json
+import random
+import sqlite3
+import threading
+import time
+
+from requests.exceptions import RequestException
+
+from .isbn import to_isbn13
+
+
+class ProviderError(RequestException):
+    """An injected provider failure"""
+
+
+class LocalProvider(object):
+    """
+    Configured by ISBN_PROVIDERS OPTIONS:
+
+    CORPUS: path of a .jsonl file or an SQLite database
+    LATENCY: seconds slept per lookup, or a (distribution, *parameters) tuple
+        naming a random.Random method, e.g. ('lognormvariate', -3, 0.5)
+    ERROR_RATE: fraction of lookups raising ProviderError
+    SEED: changes the latencies and errors drawn
+    """
+    name = 'local'
+
+    def __init__(self, corpus, latency=0, error_rate=0, seed=0):
+        self.corpus = corpus
+        self.latency = latency
+        self.error_rate = error_rate
+        self.seed = seed
+        self.attempts = {}
+        self._records = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __call__(self, isbn):
+        isbn = to_isbn13(isbn)
+        rng = self.get_random(isbn)
+        delay = self.get_latency(rng)
+        if delay > 0:
+            time.sleep(delay)
+        if rng.random() < self.error_rate:
+            raise ProviderError('Injected error looking up {}'.format(isbn))
+        data = self.lookup(isbn)
+        return dict(data) if data else None
+
+    def get_random(self, isbn):
+        with self._lock:
+            attempt = self.attempts[isbn] = self.attempts.get(isbn, 0) + 1
+        return random.Random('{}:{}:{}'.format(self.seed, isbn, attempt))
+
+    def get_latency(self, rng):
+        if isinstance(self.latency, (list, tuple)):
+            distribution, *parameters = self.latency
+            return getattr(rng, distribution)(*parameters)
+        return self.latency or 0
+
+    def lookup(self, isbn):
+        if self.corpus.endswith('.jsonl'):
+            return self.get_records().get(isbn)
+        return self.query(isbn)
+
+    def get_records(self):
+        """Returns the JSON lines corpus by ISBN, read on first use"""
+        with self._lock:
+            if self._records is None:
+                records = {}
+                with open(self.corpus) as corpus:
+                    for line in corpus:
+                        if not line.strip():
+                            continue
+                        data = json.loads(line)
+                        records[to_isbn13(data.pop('isbn'))] = data
+                self._records = records
+        return self._records
+
+    def query(self, isbn):
+        # SQLite connections can't be shared between threads
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = sqlite3.connect(
+                'file:{}?mode=ro'.format(self.corpus), uri=True)
+        row = connection.execute(
+            'SELECT data FROM metadata WHERE isbn = ?', (isbn,)).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,148 @@
+"""
+Loan reminder emails, shared by the send_reminder_emails task and the
+notify_overdue command.
+
+Each loan schedules its reminders from its end date (see
+Loan.get_reminder_schedule), and a run only visits loans whose
+next_reminder_on has passed. Sent reminders are recorded in the ReminderLog
+ledger, which is claimed before sending so a reminder is never sent twice.
+
+Customers are streamed in primary key order, in batches with their due loans
+prefetched, and every batch is sent over the same mail connection. Customers
+without an email address are never claimed for.
+"""
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DateField, Prefetch, Value, When
+from django.template.loader import get_template
+from django.utils.timezone import localtime, now
+
+from .models import Customer, Loan, ReminderLog
+
+SUBJECT = 'DjangoLibrary book return request'
+MESSAGE = 'Return books reminder'
+
+
+def customers_with_loans(loans, batch_size=None):
+    """
+    Yields lists of the customers with any of the given loans, each
+    customer's loans are prefetched into `reminder_loans`
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    customers = (
+        Customer.objects
+        .filter(pk__in=loans.values('customer'))
+        .prefetch_related(Prefetch(
+            'loans',
+            queryset=loans.select_related('book_copy__book')
+            .order_by('end_date'),
+            to_attr='reminder_loans'
+        ))
+        .order_by('pk')
+    )
+    last_pk = 0
+    while True:
+        batch = list(customers.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def build_reminder(customer, loans, template, connection=None):
+    """Returns the reminder email about some of a customer's loans"""
+    html = template.render({'customer': customer, 'loans': loans})
+    email = EmailMultiAlternatives(
+        SUBJECT, MESSAGE, settings.EMAIL_SENDER, [customer.email],
+        connection=connection
+    )
+    email.attach_alternative(html, 'text/html')
+    return email
+
+
+def claim_reminders(customers, today):
+    """
+    Records the reminders due by today for a batch of customers in the
+    ledger. Returns a list of the (customer, loans, logs) to remind, or None
+    if another run has already claimed them
+    """
+    sent = set(ReminderLog.objects.filter(
+        loan__customer__in=customers, loan__next_reminder_on__lte=today
+    ).values_list('loan', 'kind', 'scheduled_on'))
+    reminders = []
+    for customer in customers:
+        if not customer.email:
+            continue
+        loans, logs = [], []
+        for loan in customer.reminder_loans:
+            reminder = loan.get_due_reminder(today)
+            if reminder is not None and (loan.pk,) + reminder not in sent:
+                loans.append(loan)
+                logs.append(ReminderLog(
+                    loan=loan, kind=reminder[0], scheduled_on=reminder[1]
+                ))
+        if loans:
+            reminders.append((customer, loans, logs))
+    try:
+        with transaction.atomic():
+            ReminderLog.objects.bulk_create(
+                log for _, _, logs in reminders for log in logs)
+    except IntegrityError:
+        return
+    return reminders
+
+
+def reschedule_loans(loans, today):
+    """Moves each loan's next_reminder_on past today in a single update"""
+    for loan in loans:
+        loan.schedule_next_reminder(today)
+    Loan.objects.filter(pk__in=[loan.pk for loan in loans]).update(
+        next_reminder_on=Case(
+            *[When(pk=loan.pk, then=Value(loan.next_reminder_on))
+              for loan in loans],
+            output_field=DateField()
+        )
+    )
+
+
+def due_loans(today):
+    """Returns the loans with a reminder due by today"""
+    return Loan.objects.filter(returned=False, next_reminder_on__lte=today)
+
+
+def send_reminders(batch_size=None, today=None, pk_range=None):
+    """
+    Sends the reminders due by today, returns the number of emails sent.
+    pk_range optionally limits sending to a (first, last) range of customers.
+    """
+    today = today or localtime(now()).date()
+    loans = due_loans(today)
+    if pk_range is not None:
+        loans = loans.filter(customer__pk__range=pk_range)
+    template = get_template('books/email.html')
+    sent = 0
+    with get_connection() as connection:
+        for customers in customers_with_loans(loans, batch_size):
+            reminders = claim_reminders(customers, today)
+            if reminders is None:
+                continue
+            for i, (customer, customer_loans, _) in enumerate(reminders):
+                try:
+                    sent += connection.send_messages([build_reminder(
+                        customer, customer_loans, template, connection
+                    )]) or 0
+                except Exception:
+                    # Release the claims of the unsent reminders, so that the
+                    # next run only retries those
+                    ReminderLog.objects.filter(pk__in=[
+                        log.pk for _, _, logs in reminders[i:] for log in logs
+                    ]).delete()
+                    raise
+            reschedule_loans(
+                [loan for customer in customers
+                 for loan in customer.reminder_loans],
+                today
+            )
+    return sent
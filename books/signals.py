@@ -1,7 +1,13 @@
 from django.contrib import messages
 from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
 from django.dispatch import receiver
 
+from .cache import bump_versions
+from .models import Author, Book, BookCopy, Genre, Loan, Review
+
 
 @receiver(user_logged_in)
 def on_logged_in(sender, user, request, **kwargs):
@@ -13,3 +19,84 @@ def on_logged_in(sender, user, request, **kwargs):
 def on_logged_out(sender, user, request, **kwargs):
     logout_message = "Logged out from: {}!".format(user.username)
     messages.success(request, logout_message, fail_silently=True)
+
+
+#
+# -- Cache invalidation --
+#
+# Cached fragments and pages are keyed on the versions of the objects they
+# show, see books.cache.get_version. The 'catalog' version covers listings
+# of every book, and ('author', None) and ('genre', None) the author and
+# genre listings.
+#
+
+def invalidate_book(book_id, related=False):
+    """Bumps the versions of a book, and optionally its authors and genres"""
+    keys = [('book', book_id), ('catalog', None)]
+    if related:
+        keys += [
+            ('author', pk) for pk in Book.authors.through.objects
+            .filter(book_id=book_id).values_list('author_id', flat=True)
+        ]
+        keys += [
+            ('genre', pk) for pk in Book.genres.through.objects
+            .filter(book_id=book_id).values_list('genre_id', flat=True)
+        ]
+    bump_versions(keys)
+
+
+@receiver(post_save, sender=Book)
+@receiver(pre_delete, sender=Book)
+def on_book_changed(sender, instance, **kwargs):
+    # Titles are listed on author and genre pages
+    invalidate_book(instance.pk, related=True)
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def on_book_relations_changed(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    kind = 'author' if sender is Book.authors.through else 'genre'
+    if action == 'pre_clear' and not reverse:
+        invalidate_book(instance.pk, related=True)
+    elif action == 'pre_clear':
+        bump_versions([(kind, instance.pk), ('catalog', None)])
+    elif action in ('post_add', 'post_remove'):
+        if reverse:
+            keys = [(kind, instance.pk)] + [('book', pk) for pk in pk_set]
+        else:
+            keys = [('book', instance.pk)] + [(kind, pk) for pk in pk_set]
+        bump_versions(keys + [('catalog', None)])
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def on_author_changed(sender, instance, **kwargs):
+    bump_versions([('author', instance.pk), ('author', None)])
+
+
+@receiver(post_save, sender=Genre)
+@receiver(post_delete, sender=Genre)
+def on_genre_changed(sender, instance, **kwargs):
+    bump_versions([('genre', instance.pk), ('genre', None)])
+
+
+@receiver(post_save, sender=BookCopy)
+@receiver(post_delete, sender=BookCopy)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def on_book_detail_changed(sender, instance, **kwargs):
+    invalidate_book(instance.book_id)
+
+
+@receiver(post_save, sender=Loan)
+def on_loan_saved(sender, instance, **kwargs):
+    # Loans change the availability of their book
+    invalidate_book(instance.book_copy.book_id)
+
+
+@receiver(post_delete, sender=Loan)
+def on_loan_deleted(sender, instance, **kwargs):
+    # Returned loans are deleted when archived, which changes nothing shown
+    if not instance.returned:
+        invalidate_book(instance.book_copy.book_id)
@@ -1,16 +1,79 @@
 from __future__ import absolute_import, unicode_literals
 
-from celery import shared_task
+import logging
+import socket
+from smtplib import SMTPException
+
+from celery import chord, group, shared_task
 from celery.schedules import crontab
 from celery.decorators import periodic_task
 
-from django.template import Context
-from django.template.loader import get_template
-from django.utils.timezone import now
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.timezone import localtime, now
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import OperationalError
+
+from .covers import cache_covers, uncached_covers
+from .metadata import refresh_stale_metadata
+from .models import Customer, Loan
+from .reminders import due_loans, send_reminders
+
+logger = logging.getLogger(__name__)
+
+
+#
+# -- Fan-out --
+#
+# Large jobs are split into primary key ranges, each handled by its own
+# subtask so the work is spread across every worker and a slow or failing
+# chunk doesn't hold up the rest.
+#
+
+def pk_ranges(queryset, chunk_size):
+    """
+    Returns the (first, last) primary keys of consecutive chunks of up to
+    chunk_size rows of a queryset
+    """
+    ranges, first = [], None
+    pks = queryset.order_by('pk').values_list('pk', flat=True)
+    for count, pk in enumerate(pks.iterator(), 1):
+        if first is None:
+            first = pk
+        if count % chunk_size == 0:
+            ranges.append((first, pk))
+            first = None
+    if first is not None:
+        ranges.append((first, pk))
+    return ranges
 
-from .models import Customer
+
+def fan_out(task, queryset, args=(), callback=None, chunk_size=None):
+    """
+    Calls task(first, last, *args) for each pk range of a queryset in
+    parallel. If given, the callback signature is called with the list of
+    the chunks' results once they've all finished. That needs a result
+    backend, without one the callback is skipped.
+    """
+    ranges = pk_ranges(queryset, chunk_size or settings.TASK_CHUNK_SIZE)
+    if not ranges:
+        return
+    header = group(task.s(first, last, *args) for first, last in ranges)
+    if callback is None:
+        return header.apply_async()
+    if not getattr(settings, 'CELERY_RESULT_BACKEND', None):
+        logger.info('%s: no result backend to total %d chunks',
+                    task.name, len(ranges))
+        return header.apply_async()
+    return chord(header)(callback)
+
+
+@shared_task
+def total_counts(counts, name):
+    """Chord callback totalling the counts returned by each chunk"""
+    total = sum(counts)
+    logger.info('%s: %d across %d chunks', name, total, len(counts))
+    return total
 
 
 @shared_task
@@ -18,13 +81,60 @@ def send_async_email(subject, message, from_email, recipient_list, html):
     send_mail(subject, message, from_email, recipient_list, html_message=html)
 
 
-@periodic_task(run_every=(crontab()), name="daily_send_reminder_emails")
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_reminder_chunk(self, first, last, today):
+    # Sent reminders are in the ledger, so a retry only sends the remainder
+    try:
+        return send_reminders(today=parse_date(today), pk_range=(first, last))
+    except (SMTPException, socket.error) as exc:
+        raise self.retry(exc=exc)
+
+
+@periodic_task(run_every=(crontab(minute=0)),
+               name="hourly_send_reminder_emails")
 def send_reminder_emails():
-    customers = Customer.objects.filter(loans__returned=False,
-                                        loans__end_date__lte=now())
-    for customer in customers:
-        context = {'customer': customer}
-        html = get_template('books/email.html').render(Context(context))
-        message = "Return books reminder"
-        send_async_email('DjangoLibrary book return request', message,
-                         settings.EMAIL_SENDER, [customer.email], html)
+    today = localtime(now()).date()
+    customers = Customer.objects.filter(
+        pk__in=due_loans(today).values('customer'))
+    fan_out(send_reminder_chunk, customers, args=(today.isoformat(),),
+            callback=total_counts.s('Reminders sent'))
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def archive_loan_chunk(self, first, last, before):
+    # Batches commit as they go, so a retry only archives the remainder
+    try:
+        return Loan.objects.archive_returned(
+            parse_datetime(before), pk_range=(first, last))
+    except OperationalError as exc:
+        raise self.retry(exc=exc)
+
+
+@periodic_task(run_every=(crontab(hour=3, minute=0)),
+               name="archive_returned_loans")
+def archive_returned_loans():
+    before = now() - settings.LOAN_ARCHIVE_AFTER
+    fan_out(archive_loan_chunk, Loan.objects.returned_before(before),
+            args=(before.isoformat(),),
+            callback=total_counts.s('Loans archived'))
+
+
+@periodic_task(run_every=(crontab(hour=4, minute=0)),
+               name="refresh_book_metadata")
+def refresh_book_metadata():
+    looked_up, changed = refresh_stale_metadata()
+    logger.info('Metadata refreshed: %d looked up, %d changed',
+                looked_up, changed)
+    return changed
+
+
+@shared_task
+def cache_cover_chunk(first, last):
+    return cache_covers(list(
+        uncached_covers().filter(pk__range=(first, last))))
+
+
+@periodic_task(run_every=(crontab(minute='*/15')), name="cache_covers")
+def cache_new_covers():
+    fan_out(cache_cover_chunk, uncached_covers(),
+            callback=total_counts.s('Covers cached'))
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.template import Library
+from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from books.cache import get_version
+
 register = Library()
 
 
@@ -28,3 +32,31 @@ def descending(value):
     if value.startswith('-'):
         return value
     return '-' + value
+
+
+@register.filter()
+def version(value, kind):
+    """Returns an object's cache version, e.g. {{ book|version:'book' }}"""
+    return get_version(kind, value.pk)
+
+
+@register.inclusion_tag('books/cover.html')
+def cover(book, size, css_class=''):
+    """
+    Renders a book's locally cached cover, or the provider's image if it's
+    not been cached yet, e.g. {% cover book "grid" "card-img" %}
+    """
+    width, height = settings.COVER_SIZES[size]
+    context = {
+        'book': book,
+        'css_class': css_class,
+        'width': width,
+        'height': height,
+    }
+    if book.cover_hash and book.cover_source == book.img:
+        context.update({
+            'jpg': reverse('books:cover', args=[book.cover_hash, size, 'jpg']),
+            'webp': reverse(
+                'books:cover', args=[book.cover_hash, size, 'webp']),
+        })
+    return context
@@ -0,0 +1,46 @@
+from mixer.backend.django import mixer
+
+from django.test import TestCase
+
+from books import benchmarks
+from books.models import Author, Book, BookCopy, Customer, Genre, Loan
+
+RESULT = {'p50': 0.01, 'p90': 0.02, 'memory_peak': 1000, 'queries': 5}
+
+
+class TestBenchmarks(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        book = mixer.blend(Book)
+        book.authors.add(mixer.blend(Author))
+        book.genres.add(mixer.blend(Genre))
+        copies = mixer.cycle(2).blend(BookCopy, book=book)
+        customer = mixer.blend(Customer)
+        mixer.blend(Loan, customer=customer, book_copy=copies[0])
+
+    def test_runs_scenarios_without_changing_data(self):
+        loans = Loan.objects.count()
+        results = benchmarks.run(list(benchmarks.SCENARIOS), 2, warmup=0)
+        self.assertEqual(list(results), list(benchmarks.SCENARIOS))
+        for result in results.values():
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['memory_peak'], 0)
+            self.assertLessEqual(result['p50'], result['p99'])
+        self.assertEqual(Loan.objects.count(), loans)
+        self.assertFalse(Customer.objects.filter(
+            username='benchmark').exists())
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([3], 90), 3)
+
+    def test_compare_catches_extra_queries(self):
+        baseline = {'book_list': RESULT}
+        self.assertEqual(benchmarks.compare(
+            {'book_list': RESULT}, baseline, 0.2), [])
+        regressions = benchmarks.compare(
+            {'book_list': dict(RESULT, queries=6, p50=0.05)}, baseline, 0.2)
+        self.assertEqual(len(regressions), 2)
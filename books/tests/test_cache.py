@@ -0,0 +1,117 @@
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from DjangoLibrary.cache import TieredCache
+
+from books.cache import NamespacedCache
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-shared',
+    },
+})
+class TestTieredCache(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = TieredCache(self.id(), {
+            'OPTIONS': {'SHARED': 'shared', 'MAX_LOCAL_ENTRIES': 2}
+        })
+        self.shared = caches['shared']
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_reads_are_served_locally(self):
+        self.cache.set('key', 'value')
+        # Removing the shared copy directly shouldn't affect local reads
+        self.shared.delete('key')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get_stats()['local_hits'], 1)
+
+    def test_reads_fall_back_to_shared_cache(self):
+        self.shared.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('missing'))
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['shared_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_local_tier_is_bounded(self):
+        self.cache.set_many({'a': 1, 'b': 2, 'c': 3})
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['local_entries'], 2)
+        self.assertEqual(stats['evictions'], 1)
+        # Evicted entries are still available from the shared cache
+        self.assertEqual(self.cache.get('a'), 1)
+
+    def test_delete_removes_both_tiers(self):
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(self.shared.get('key'))
+
+    def test_cached_values_are_copies(self):
+        self.cache.set('key', [])
+        self.cache.get('key').append(1)
+        self.assertEqual(self.cache.get('key'), [])
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-namespaced',
+        },
+    },
+    CACHE_NAMESPACES={'test': {'timeout': 60, 'version': 1}}
+)
+class TestNamespacedCache(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = NamespacedCache('test')
+
+    def tearDown(self):
+        caches['default'].clear()
+
+    def test_keys_are_hashed(self):
+        key = self.cache.make_key('9781593272814')
+        self.assertTrue(key.startswith('test:'))
+        self.assertNotIn('9781593272814', key)
+
+    def test_get_and_set(self):
+        self.cache.set('9781593272814', {'title': 'Land of Lisp'})
+        self.assertIn('9781593272814', self.cache)
+        self.assertEqual(
+            self.cache.get('9781593272814'), {'title': 'Land of Lisp'})
+        self.assertEqual(self.cache.stats['hits'], 1)
+
+    def test_namespaces_can_use_another_cache(self):
+        with self.settings(
+                CACHES={
+                    'default': {
+                        'BACKEND':
+                            'django.core.cache.backends.dummy.DummyCache',
+                    },
+                    'shared': {
+                        'BACKEND':
+                            'django.core.cache.backends.locmem.LocMemCache',
+                        'LOCATION': 'test-namespaced-shared',
+                    },
+                },
+                CACHE_NAMESPACES={
+                    'test': {'timeout': 60, 'version': 1, 'cache': 'shared'}
+                }):
+            self.cache.set('key', 'value')
+            self.assertEqual(self.cache.get('key'), 'value')
+            caches['shared'].clear()
+
+    def test_bumping_version_orphans_entries(self):
+        self.cache.set('key', 'value')
+        with self.settings(CACHE_NAMESPACES={
+                'test': {'timeout': 60, 'version': 2}}):
+            self.assertIsNone(self.cache.get('key'))
@@ -0,0 +1,70 @@
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from mixer.backend.django import mixer
+
+from books.models import Author, Book, BookCopy, Loan
+
+from .test_utils import RequiresLogin
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-conditional',
+    },
+})
+class TestConditionalBookDetail(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book)
+        cls.book_copy = mixer.blend(BookCopy, book=cls.book)
+        cls.url = reverse('books:book-detail', args=[cls.book.slug])
+
+    def test_unchanged_page_is_not_modified(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.has_header('Last-Modified'))
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=resp['ETag'])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_availability_changes_modify_page(self):
+        etag = self.client.get(self.url)['ETag']
+        mixer.blend(Loan, book_copy=self.book_copy)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_missing_book_has_no_validators(self):
+        url = reverse('books:book-detail', args=['missing'])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 404)
+        self.assertFalse(resp.has_header('ETag'))
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-conditional-users',
+    },
+})
+class TestConditionalAuthorDetail(RequiresLogin):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = mixer.blend(Author)
+        cls.book = mixer.blend(Book)
+        cls.book.authors.add(cls.author)
+        cls.url = cls.author.get_absolute_url()
+
+    def test_validators_vary_by_user(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.logout()
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+
+    def test_books_changes_modify_page(self):
+        etag = self.client.get(self.url)['ETag']
+        mixer.blend(BookCopy, book=self.book)
+        resp = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
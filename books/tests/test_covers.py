@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.core.urlresolvers import reverse
+from django.test import TestCase, override_settings
+
+from mixer.backend.django import mixer
+from PIL import Image
+
+from books.covers import cache_covers, uncached_covers
+from books.models import PLACEHOLDER_IMG, Book
+
+from unittest.mock import MagicMock, patch
+
+
+def make_image(size=(400, 600)):
+    data = BytesIO()
+    Image.new('RGB', size, 'red').save(data, 'PNG')
+    return data.getvalue()
+
+
+class TestCovers(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestCovers, cls).setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root)
+        super(TestCovers, cls).tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book, img='http://covers.test/book.jpg')
+
+    @patch('requests.get')
+    def test_caches_thumbnails_by_content_hash(self, mock_get):
+        mock_get.return_value = MagicMock(content=make_image())
+        self.assertEqual(cache_covers([self.book]), 1)
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual(len(book.cover_hash), 40)
+        self.assertTrue(book.cover_placeholder.startswith('data:image/jpeg'))
+        self.assertNotIn(book, uncached_covers())
+
+        url = reverse('books:cover', args=[book.cover_hash, 'grid', 'webp'])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp['Content-Type'], 'image/webp')
+        self.assertIn('immutable', resp['Cache-Control'])
+
+    @patch('requests.get')
+    def test_placeholder_images_are_not_downloaded(self, mock_get):
+        book = mixer.blend(Book, img=PLACEHOLDER_IMG)
+        self.assertEqual(cache_covers([book]), 0)
+        self.assertFalse(mock_get.called)
+        self.assertNotIn(book, uncached_covers())
+
+    def test_missing_cover_is_not_found(self):
+        url = reverse('books:cover', args=['0' * 40, 'grid', 'jpg'])
+        self.assertEqual(self.client.get(url).status_code, 404)
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from datetime import date
+
+from django.test import TestCase
+
+from books.dataset import Dataset, load
+from books.isbn import isbn_is_valid
+from books.models import ArchivedLoan, Book, Customer, Loan, Review
+
+VOLUMES = OrderedDict([
+    ('authors', 20),
+    ('genres', 5),
+    ('books', 50),
+    ('copies', 120),
+    ('customers', 20),
+    ('loans', 400),
+    ('reviews', 60),
+])
+
+
+class TestDataset(TestCase):
+
+    def make_dataset(self, seed='1', chunk_size=25):
+        return Dataset(seed, VOLUMES, date(2017, 3, 1), chunk_size=chunk_size)
+
+    def test_rows_are_deterministic(self):
+        first, second = self.make_dataset(), self.make_dataset()
+        for table in ('books', 'loans', 'reviews'):
+            self.assertEqual(first.rows(table, 1), second.rows(table, 1))
+        self.assertNotEqual(self.make_dataset('2').rows('books', 0),
+                            first.rows('books', 0))
+
+    def test_books_have_valid_isbns(self):
+        books = self.make_dataset().rows('books', 0)[Book]
+        self.assertTrue(all(isbn_is_valid(book[0]) for book in books))
+
+    def test_overdue_loans_are_due_a_reminder(self):
+        data = Dataset('1', VOLUMES, date(2017, 3, 1), overdue_fraction=1,
+                       chunk_size=25)
+        unreturned = [
+            loan for chunk in range(VOLUMES['loans'] // 25)
+            for loan in data.rows('loans', chunk)[Loan] if not loan[3]
+        ]
+        self.assertTrue(unreturned)
+        self.assertTrue(all(loan[7] <= data.today for loan in unreturned))
+
+    def test_loads_every_table(self):
+        data = self.make_dataset()
+        loaded = load(data)
+        self.assertEqual(Book.objects.count(), 50)
+        self.assertEqual(Customer.objects.count(), 20)
+        self.assertEqual(Review.objects.count(), 60)
+        self.assertEqual(
+            Loan.objects.count() + ArchivedLoan.objects.count(), 400)
+        self.assertEqual(loaded, sum(VOLUMES.values()) +
+                         Book.authors.through.objects.count() +
+                         Book.genres.through.objects.count())
+
+        # Current loans are each of a different copy
+        unreturned = Loan.objects.filter(returned=False)
+        self.assertEqual(unreturned.count(), data.current_loans)
+        self.assertEqual(
+            unreturned.values('book_copy').distinct().count(),
+            data.current_loans)
+
+        # New loans don't reuse the ids of archived loans
+        loan = Loan.objects.create(
+            customer_id=1, book_copy_id=1, start_date=data.today,
+            end_date=data.today)
+        self.assertGreater(loan.pk, 400)
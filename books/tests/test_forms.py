@@ -2,7 +2,7 @@ from django.test import TestCase
 
 from unittest.mock import patch
 
-from books.forms import ISBNForm
+from books.forms import BookForm, ISBNForm
 
 
 class TestISBNFor(TestCase):
@@ -13,7 +13,7 @@ class TestISBNFor(TestCase):
         form = ISBNForm({'isbn': '9781593272814', 'copies': 1})
         self.assertTrue(form.is_valid())
 
-    @patch('books.forms.cache')
+    @patch('books.forms.metadata_cache')
     def test_skip_form_validation_if_isbn_in_cache(self, mock_cache):
         mock_cache.__contains__.return_value = True
         form = ISBNForm({'isbn': '9781593272074', 'copies': 1})
@@ -47,3 +47,12 @@ class TestISBNFor(TestCase):
             'Book Metadata not found',
             form['isbn'].errors
         )
+
+
+class TestBookForm(TestCase):
+
+    def test_internal_fields_are_not_editable(self):
+        fields = BookForm().fields
+        for field in ('metadata_refreshed_on', 'cover_source', 'cover_hash',
+                      'cover_placeholder'):
+            self.assertNotIn(field, fields)
@@ -0,0 +1,50 @@
+import subprocess
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase
+
+from DjangoLibrary import importtime
+
+from unittest.mock import patch
+
+OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |     requests.compat
+import time:       300 |        420 |   requests.utils
+import time:       500 |        920 | requests
+some other stderr output
+import time:      1000 |       1000 | django
+"""
+
+
+class TestImportTime(SimpleTestCase):
+
+    def test_parse(self):
+        imports = importtime.parse(OUTPUT)
+        self.assertEqual(imports[0], importtime.Import(
+            'requests.compat', 0.00012, 0.00012, 2))
+        self.assertEqual(
+            [(i.module, i.depth) for i in imports[1:]],
+            [('requests.utils', 1), ('requests', 0), ('django', 0)])
+
+    def test_by_package(self):
+        packages = importtime.by_package(importtime.parse(OUTPUT))
+        self.assertEqual(packages[0], ('django', 0.001))
+        self.assertEqual(packages[1][0], 'requests')
+        self.assertAlmostEqual(packages[1][1], 0.00092)
+
+    def test_setup_skips_slow_optional_imports(self):
+        elapsed, imports = importtime.measure('setup')
+        modules = {imported.module for imported in imports}
+        self.assertIn('books.models', modules)
+        self.assertNotIn('requests', modules)
+        self.assertNotIn('PIL', modules)
+        self.assertGreater(elapsed, 0)
+
+    @patch('DjangoLibrary.importtime.subprocess.run')
+    def test_missing_import_times_are_an_error(self, mock_run):
+        # What interpreters which don't support -X importtime report
+        mock_run.return_value = subprocess.CompletedProcess([], 0, stderr='')
+        with self.assertRaises(CommandError):
+            call_command('importtime', 'setup', repeat=1)
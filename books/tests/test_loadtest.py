@@ -0,0 +1,76 @@
+from collections import OrderedDict
+
+from django.test import LiveServerTestCase, SimpleTestCase
+
+from mixer.backend.django import mixer
+
+from books import loadtest
+from books.management.commands.loadtest import parse_mix
+from books.models import Book, BookCopy, Customer, Loan
+
+
+class TestLoadTest(LiveServerTestCase):
+
+    def setUp(self):
+        self.books = mixer.cycle(3).blend(Book)
+        for book in self.books:
+            mixer.blend(BookCopy, book=book)
+        for username in ('first', 'second'):
+            Customer.objects.create_user(username, password='test')
+
+    def test_runs_journeys_without_errors(self):
+        mix = OrderedDict([('detail', 2), ('checkout', 1), ('return', 1)])
+        report = loadtest.run(self.live_server_url, 2, 1, mix, 'test')
+        self.assertIn('login', report)
+        self.assertIn('book-detail', report)
+        for endpoint, result in report.items():
+            self.assertEqual(result['error_rate'], 0, endpoint)
+        self.assertTrue(Loan.objects.exists())
+
+    def test_refused_checkouts_are_not_recorded_as_loans(self):
+        second = Customer.objects.get(username='second')
+        for copy in BookCopy.objects.all():
+            Loan.objects.create(customer=second, book_copy=copy)
+        stats = loadtest.Stats()
+        user = loadtest.User(
+            self.live_server_url, 'first', 'test',
+            [book.slug for book in self.books], stats, 0)
+        user.login()
+        user.checkout()
+        self.assertEqual(user.loans, [])
+        self.assertEqual(stats.refusals['book-checkout'], 1)
+        self.assertEqual(stats.errors['book-checkout'], 0)
+
+    def test_needs_a_customer_for_each_user(self):
+        with self.assertRaises(ValueError):
+            loadtest.run(self.live_server_url, 3, 1, loadtest.MIX, 'test')
+
+
+class TestStats(SimpleTestCase):
+
+    def test_reports_each_endpoint(self):
+        stats = loadtest.Stats()
+        for elapsed in (0.1, 0.2, 0.3, 0.4):
+            stats.record('book-detail', elapsed, False)
+        stats.record('book-detail', 1.0, True)
+        result = stats.report(duration=5)['book-detail']
+        self.assertEqual(result['requests'], 5)
+        self.assertEqual(result['throughput'], 1)
+        self.assertEqual(result['error_rate'], 0.2)
+        self.assertEqual(result['refused_rate'], 0)
+
+    def test_reports_refusals_apart_from_errors(self):
+        stats = loadtest.Stats()
+        stats.record('book-checkout', 0.1, False)
+        stats.record('book-checkout', 0.1, False)
+        stats.refuse('book-checkout')
+        result = stats.report(duration=1)['book-checkout']
+        self.assertEqual(result['error_rate'], 0)
+        self.assertEqual(result['refused_rate'], 0.5)
+        self.assertEqual(result['p50'], 0.3)
+
+    def test_parses_mix(self):
+        self.assertEqual(parse_mix('detail=3,checkout=1'),
+                         OrderedDict([('detail', 3), ('checkout', 1)]))
+        with self.assertRaises(ValueError):
+            parse_mix('teleport=1')
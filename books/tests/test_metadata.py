@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils.timezone import now, timedelta
+
+from mixer.backend.django import mixer
+
+from books.metadata import refresh_stale_metadata, stale_books
+from books.models import PLACEHOLDER_IMG, Book
+
+from unittest.mock import patch
+
+METADATA_REFRESH = dict(settings.METADATA_REFRESH, RATE=1000)
+
+
+@override_settings(METADATA_REFRESH=METADATA_REFRESH)
+class TestStaleBooks(TestCase):
+
+    def test_finds_unrefreshed_and_placeholder_books(self):
+        fresh = mixer.blend(Book, img='http://covers.test/1.jpg',
+                            metadata_refreshed_on=now())
+        old = mixer.blend(Book, img='http://covers.test/2.jpg',
+                          metadata_refreshed_on=now() - timedelta(days=365))
+        missing = mixer.blend(Book, img='http://covers.test/3.jpg')
+        placeholder = mixer.blend(
+            Book, img=PLACEHOLDER_IMG,
+            metadata_refreshed_on=now() - timedelta(days=30))
+        self.assertEqual(list(stale_books()), [missing, old, placeholder])
+        self.assertNotIn(fresh, stale_books())
+
+
+@override_settings(METADATA_REFRESH=METADATA_REFRESH)
+@patch('books.metadata.meta')
+class TestRefreshStaleMetadata(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book, title='Old Title', img=PLACEHOLDER_IMG)
+
+    def test_applies_changed_metadata(self, mock_meta):
+        mock_meta.return_value = {
+            'title': 'new title', 'img': 'http://covers.test/new.jpg',
+            'authors': ['Jane Doe'], 'categories': ['Fiction'],
+        }
+        self.assertEqual(refresh_stale_metadata(), (1, 1))
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual(book.title, 'New Title')
+        self.assertEqual(book.img, 'http://covers.test/new.jpg')
+        self.assertEqual(book.slug, self.book.slug)
+        self.assertEqual(
+            list(book.authors.values_list('name', flat=True)), ['Jane Doe'])
+        self.assertEqual(
+            list(book.genres.values_list('name', flat=True)), ['Fiction'])
+        self.assertIsNotNone(book.metadata_refreshed_on)
+
+    def test_unresolved_books_are_not_retried_straight_away(self, mock_meta):
+        mock_meta.return_value = None
+        self.assertEqual(refresh_stale_metadata(), (1, 0))
+        self.assertEqual(refresh_stale_metadata(), (0, 0))
+        self.assertEqual(mock_meta.call_count, 1)
+
+    def test_keeps_titles_unique(self, mock_meta):
+        mixer.blend(Book, title='Taken Title',
+                    metadata_refreshed_on=now(), img='http://covers.test/t')
+        mock_meta.return_value = {'title': 'taken title'}
+        refresh_stale_metadata()
+        self.assertEqual(Book.objects.get(pk=self.book.pk).title, 'Old Title')
+
+    def test_respects_budget(self, mock_meta):
+        mixer.cycle(3).blend(Book)
+        mock_meta.return_value = None
+        self.assertEqual(refresh_stale_metadata(budget=2), (2, 0))
@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from mixer.backend.django import mixer
+
+from DjangoLibrary import metrics
+from books.metrics import CIRCULATION_TOTAL
+from books.models import Book, BookCopy
+
+from .test_utils import RequiresLogin
+
+from unittest.mock import PropertyMock, patch
+
+
+class TestMetrics(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.counter = metrics.Counter('test_total', 'Test', ('kind',))
+        self.histogram = metrics.Histogram(
+            'test_seconds', 'Test', buckets=(1, 5))
+        self.addCleanup(metrics.registry.pop, 'test_total')
+        self.addCleanup(metrics.registry.pop, 'test_seconds')
+
+    def test_exports_text_format(self):
+        self.counter.inc(kind='a"b')
+        for value in (0.5, 3, 10):
+            self.histogram.observe(value)
+        with override_settings(METRICS={'DIRECTORY': ''}):
+            text = metrics.export(metrics.collect())
+        self.assertIn('# TYPE test_total counter\n', text)
+        self.assertIn('test_total{kind="a\\"b"} 1.0\n', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 1.0\n', text)
+        self.assertIn('test_seconds_bucket{le="5.0"} 2.0\n', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3.0\n', text)
+        self.assertIn('test_seconds_sum 13.5\n', text)
+
+    def test_sums_metrics_of_every_process(self):
+        self.counter.inc(2, kind='a')
+        other_process = {'test_total': {
+            'type': 'counter', 'help': 'Test',
+            'samples': [['test_total', {'kind': 'a'}, 3]],
+        }}
+        with open(os.path.join(self.directory, '1.json'), 'w') as output:
+            json.dump(other_process, output)
+        options = {'DIRECTORY': self.directory, 'FLUSH_INTERVAL': 5}
+        with override_settings(METRICS=options):
+            families = metrics.collect()
+        self.assertEqual(
+            families['test_total']['samples'][
+                ('test_total', (('kind', 'a'),))], 5)
+        self.assertIn(metrics.get_file_name(), os.listdir(self.directory))
+
+    def test_reused_pids_keep_files_of_exited_processes(self):
+        name = metrics.get_file_name()
+        self.assertTrue(name.startswith('{}-'.format(os.getpid())))
+        self.assertEqual(metrics.get_file_name(), name)
+        # A new process given the same pid
+        with patch.dict(metrics._file, pid=None):
+            self.assertNotEqual(metrics.get_file_name(), name)
+
+    def test_middleware_times_requests(self):
+        request = RequestFactory().get('/')
+        request.resolver_match = type('Match', (), {'view_name': 'test'})
+        middleware = metrics.MetricsMiddleware(lambda request: HttpResponse())
+        with override_settings(METRICS={'DIRECTORY': ''}):
+            middleware(request)
+        self.assertIn(('test', 'GET', '200'),
+                      metrics.REQUEST_DURATION._values)
+
+
+class TestMetricsView(RequiresLogin):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book)
+        mixer.blend(BookCopy, book=cls.book)
+
+    @override_settings(METRICS={'DIRECTORY': '', 'TOKEN': 'secret'})
+    def test_requires_staff_or_token(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        resp = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b'# TYPE library_circulation_total counter',
+                      resp.content)
+
+    @patch('books.models.Book.is_available', new_callable=PropertyMock)
+    def test_counts_circulation_outcomes(self, mock_is_available):
+        mock_is_available.return_value = False
+        key = ('checkout', 'unavailable')
+        before = CIRCULATION_TOTAL._values.get(key, 0)
+        self.client.post(reverse('books:book-checkout', args=[self.book.slug]))
+        self.assertEqual(CIRCULATION_TOTAL._values[key], before + 1)
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.test import TestCase
 from django.utils.timezone import localtime, now, timedelta
 
 from mixer.backend.django import mixer
 
 from books.models import (
+    ArchivedLoan,
     Author,
     Book,
     BookCopy,
@@ -11,6 +13,7 @@ from books.models import (
     CustomerBook,
     Genre,
     Loan,
+    ReminderLog,
     Review
 )
 
@@ -91,6 +94,15 @@ class TestCustomerModel(TestCase):
                     book_copy=mixer.blend(BookCopy, book=book))
         self.assertTrue(self.customer.has_loaned(book.isbn))
 
+    def test_has_loaned_with_archived_loan(self):
+        # Loans moved into the archive should still count as loaned
+        book = mixer.blend(Book)
+        loan = mixer.blend(Loan, customer=self.customer, returned=True,
+                           book_copy=mixer.blend(BookCopy, book=book))
+        Loan.objects.archive_returned(now() + timedelta(days=1))
+        self.assertFalse(Loan.objects.filter(pk=loan.pk).exists())
+        self.assertTrue(self.customer.has_loaned(book.isbn))
+
     def test_get_unreturned_book_loan(self):
         book = mixer.blend(Book)
 
@@ -188,6 +200,41 @@ class TestCustomerModel(TestCase):
         # Ensure only returned books should show up in the customers read list
         self.assertEqual(self.customer.read_list.count(), 2)
 
+        # Archiving returned loans should not change the read list
+        Loan.objects.archive_returned(now() + timedelta(days=1))
+        self.assertEqual(self.customer.read_list.count(), 2)
+
+    def test_reading_history(self):
+        books = mixer.cycle(3).blend(Book)
+        for book in books:
+            mixer.blend(Loan, customer=self.customer, returned=True,
+                        book_copy=mixer.blend(BookCopy, book=book))
+
+        # History is paged most recently read first
+        page, cursor = self.customer.reading_history(count=2)
+        self.assertEqual([cb.book for cb in page], books[:0:-1])
+        page, cursor = self.customer.reading_history(after=cursor, count=2)
+        self.assertEqual([cb.book for cb in page], books[:1])
+        self.assertIsNone(cursor)
+
+    def test_reading_history_totals(self):
+        book = mixer.blend(Book)
+        book_copy = mixer.blend(BookCopy, book=book)
+        loan = mixer.blend(Loan, customer=self.customer, book_copy=book_copy)
+        loan.returned = True
+        loan.save()
+        # Saving an already returned loan shouldn't count it twice
+        loan.save()
+        mixer.blend(Loan, customer=self.customer, returned=True,
+                    book_copy=book_copy)
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.books_read, 1)
+        self.assertEqual(self.customer.loans_returned, 2)
+        customer_book = self.customer.books.get(book=book)
+        self.assertEqual(customer_book.times_read, 2)
+        self.assertIsNotNone(customer_book.last_read_on)
+
     def test_get_absolute_url(self):
         # Ensure that the Customer model has an absolute url method
         self.assertIsNotNone(self.customer.get_absolute_url())
@@ -316,6 +363,73 @@ class TestLoanModel(TestCase):
         # The Loan __str__ method should return the loans start_date
         self.assertEqual(str(self.loan), str(self.loan.start_date))
 
+    def test_new_loan_schedules_first_reminder(self):
+        loan = mixer.blend(Loan, start_date=today, end_date=next_week)
+        self.assertEqual(loan.next_reminder_on,
+                         next_week - settings.RENEW_WINDOW)
+
+    def test_overdue_loan_is_reminded_on_the_next_run(self):
+        loan = mixer.blend(Loan, start_date=prev_week, end_date=yesterday)
+        self.assertEqual(loan.next_reminder_on, yesterday)
+
+    def test_renewing_reschedules_reminders(self):
+        loan = mixer.blend(Loan, start_date=prev_week, end_date=tomorrow)
+        loan.renew()
+        loan.refresh_from_db()
+        self.assertEqual(
+            loan.next_reminder_on,
+            loan.end_date - settings.RENEW_WINDOW
+        )
+
+    def test_returning_clears_reminders(self):
+        loan = mixer.blend(Loan, start_date=prev_week, end_date=yesterday)
+        loan.returned = True
+        loan.save(update_fields=['returned'])
+        loan.refresh_from_db()
+        self.assertIsNone(loan.next_reminder_on)
+
+    def test_get_due_reminder(self):
+        loan = mixer.blend(Loan, start_date=prev_week, end_date=yesterday)
+        self.assertEqual(loan.get_due_reminder(today),
+                         (ReminderLog.OVERDUE, yesterday))
+        self.assertIsNone(loan.get_due_reminder(prev_week))
+
+
+class TestLoanManager(TestCase):
+
+    def test_archive_returned(self):
+        returned_loan = mixer.blend(Loan, returned=True)
+        unreturned_loan = mixer.blend(Loan, returned=False)
+
+        # Loans returned after the cutoff should stay put
+        self.assertEqual(Loan.objects.archive_returned(prev_week), 0)
+
+        self.assertEqual(
+            Loan.objects.archive_returned(now() + timedelta(days=1)), 1)
+        self.assertEqual(list(Loan.objects.all()), [unreturned_loan])
+
+        # The archived copy keeps the original loan's id and dates
+        archived_loan = ArchivedLoan.objects.get()
+        self.assertEqual(archived_loan.pk, returned_loan.pk)
+        self.assertEqual(archived_loan.end_date, returned_loan.end_date)
+        self.assertEqual(archived_loan.book_copy, returned_loan.book_copy)
+        self.assertEqual(archived_loan.returned_on, returned_loan.returned_on)
+
+
+class TestOverdueLoanManager(TestCase):
+
+    def test_age_buckets_include_their_last_day(self):
+        mixer.cycle(6).blend(
+            Loan, start_date=today - timedelta(days=60),
+            end_date=(today - timedelta(days=d)
+                      for d in (7, 8, 14, 15, 30, 31)))
+        self.assertEqual(
+            [(bucket['label'], bucket['count'])
+             for bucket in Loan.overdue.summary()],
+            [('Over a month', 1), ('15 - 30 days', 2), ('8 - 14 days', 2),
+             ('Up to a week', 1)]
+        )
+
 
 class TestReviewModel(TestCase):
 
@@ -0,0 +1,154 @@
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.urlresolvers import reverse
+from django.test import Client, RequestFactory, TestCase, override_settings
+
+from mixer.backend.django import mixer
+
+from books.models import Author, Book, BookCopy, Loan
+from books.pagecache import (
+    CACHE_HEADER, CSRF_PLACEHOLDER, get_page_key, page_cache
+)
+
+from .test_utils import RequiresLogin
+
+
+PAGE_CACHE_SETTINGS = {
+    'CACHES': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'test-pagecache',
+        },
+    },
+    'MIDDLEWARE': [
+        'books.pagecache.PageCacheMiddleware',
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'django.contrib.messages.middleware.MessageMiddleware',
+    ],
+}
+
+
+class TestGetPageKey(TestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_query_string_is_normalised(self):
+        first = self.factory.get('/books/', {'sort': 'title', 'q': 'dune'})
+        second = self.factory.get('/books/?q=dune&page=&sort=title')
+        self.assertEqual(get_page_key(first), get_page_key(second))
+
+    def test_unknown_parameters_are_not_cached(self):
+        request = self.factory.get('/books/', {'utm_source': 'mail'})
+        self.assertIsNone(get_page_key(request))
+
+    def test_requests_with_a_session_are_not_cached(self):
+        request = self.factory.get('/books/')
+        request.COOKIES['sessionid'] = 'abc'
+        self.assertIsNone(get_page_key(request))
+
+    def test_posts_are_not_cached(self):
+        self.assertIsNone(get_page_key(self.factory.post('/books/')))
+
+
+@override_settings(**PAGE_CACHE_SETTINGS)
+class TestPageCacheMiddleware(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book)
+        cls.book_copy = mixer.blend(BookCopy, book=cls.book)
+        cls.url = reverse('books:book-detail', args=[cls.book.slug])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_are_served_from_cache(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp[CACHE_HEADER], 'miss')
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp[CACHE_HEADER], 'hit')
+
+    def test_changes_purge_tagged_pages(self):
+        self.client.get(self.url)
+        mixer.blend(Loan, book_copy=self.book_copy)
+        resp = self.client.get(self.url)
+        self.assertEqual(resp[CACHE_HEADER], 'miss')
+
+    def test_outdated_page_is_served_stale_whilst_regenerating(self):
+        self.client.get(self.url)
+        key = get_page_key(RequestFactory().get(self.url))
+        page_cache.add(('lock', key), True)
+        mixer.blend(Loan, book_copy=self.book_copy)
+        with self.assertNumQueries(0):
+            resp = self.client.get(self.url)
+        self.assertEqual(resp[CACHE_HEADER], 'stale')
+
+    def test_author_list_is_purged_by_author_changes(self):
+        author = mixer.blend(Author)
+        self.book.authors.add(author)
+        url = reverse('books:author-list')
+        self.assertEqual(self.client.get(url)[CACHE_HEADER], 'miss')
+        self.assertEqual(self.client.get(url)[CACHE_HEADER], 'hit')
+        author.name = 'Renamed'
+        author.save()
+        self.assertEqual(self.client.get(url)[CACHE_HEADER], 'miss')
+
+
+@override_settings(
+    CACHES=PAGE_CACHE_SETTINGS['CACHES'],
+    MIDDLEWARE=PAGE_CACHE_SETTINGS['MIDDLEWARE'][:2] + [
+        'django.middleware.csrf.CsrfViewMiddleware',
+    ] + PAGE_CACHE_SETTINGS['MIDDLEWARE'][2:],
+)
+class TestPageCacheCsrf(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book)
+        cls.book_copy = mixer.blend(BookCopy, book=cls.book)
+        cls.url = reverse('books:book-detail', args=[cls.book.slug])
+
+    def setUp(self):
+        cache.clear()
+
+    def get_token(self, response):
+        match = re.search(
+            rb'name="csrfmiddlewaretoken" value="([^"]+)"', response.content)
+        return match.group(1).decode()
+
+    def test_pages_with_csrf_tokens_are_cached(self):
+        resp = self.client.get(self.url)
+        self.assertEqual(resp[CACHE_HEADER], 'miss')
+        self.assertEqual(Client().get(self.url)[CACHE_HEADER], 'hit')
+
+    def test_each_client_gets_a_working_token(self):
+        self.client.get(self.url)
+        client = Client(enforce_csrf_checks=True)
+        resp = client.get(self.url)
+        self.assertEqual(resp[CACHE_HEADER], 'hit')
+        self.assertNotIn(CSRF_PLACEHOLDER.encode(), resp.content)
+        self.assertIn(settings.CSRF_COOKIE_NAME, resp.cookies)
+
+        resp = client.post(reverse('books:login'), {
+            'csrfmiddlewaretoken': self.get_token(resp),
+            'username': 'nobody', 'password': 'wrong',
+        })
+        self.assertEqual(resp.status_code, 200)
+
+
+@override_settings(**PAGE_CACHE_SETTINGS)
+class TestPageCacheLoggedIn(RequiresLogin):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse('books:book-list')
+
+    def test_logged_in_users_bypass_the_cache(self):
+        self.client.get(self.url)
+        resp = self.client.get(self.url)
+        self.assertFalse(resp.has_header(CACHE_HEADER))
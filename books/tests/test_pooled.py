@@ -0,0 +1,59 @@
+from django.db import connection
+from django.test import SimpleTestCase
+
+from DjangoLibrary.db.pooled.base import DatabaseWrapper, get_pool_stats
+
+from unittest.mock import MagicMock, patch
+
+
+class TestPooledDatabaseWrapper(SimpleTestCase):
+
+    def setUp(self):
+        settings_dict = dict(
+            connection.settings_dict,
+            POOL={'HEALTH_CHECK_INTERVAL': 30}
+        )
+        self.wrapper = DatabaseWrapper(settings_dict, alias='pool-test')
+        self.wrapper.connection = MagicMock()
+
+    def stats(self):
+        return get_pool_stats().get('pool-test', {'hits': 0})
+
+    def reuse(self, idle):
+        """Simulate the connection sitting idle between two requests"""
+        self.wrapper.reused = True
+        self.wrapper.last_used = 0 if idle else float('inf')
+
+    @patch.object(DatabaseWrapper, 'is_usable')
+    def test_recently_used_connection_skips_health_check(self, mock_usable):
+        hits = self.stats()['hits']
+        self.reuse(idle=False)
+        self.wrapper.ensure_connection()
+        self.assertFalse(mock_usable.called)
+        self.assertEqual(self.stats()['hits'], hits + 1)
+
+    @patch.object(DatabaseWrapper, 'close')
+    @patch.object(DatabaseWrapper, 'is_usable')
+    def test_idle_connection_is_health_checked(self, mock_usable, mock_close):
+        mock_usable.return_value = True
+        self.reuse(idle=True)
+        self.wrapper.ensure_connection()
+        self.assertTrue(mock_usable.called)
+        self.assertFalse(mock_close.called)
+
+        # Only the first use within a request is checked
+        mock_usable.reset_mock()
+        self.wrapper.ensure_connection()
+        self.assertFalse(mock_usable.called)
+
+    @patch.object(DatabaseWrapper, 'is_usable')
+    def test_unusable_connection_is_replaced(self, mock_usable):
+        mock_usable.return_value = False
+        self.reuse(idle=True)
+        with patch.object(DatabaseWrapper, 'close') as mock_close, \
+                patch.object(DatabaseWrapper, 'connect'):
+            mock_close.side_effect = lambda: setattr(
+                self.wrapper, 'connection', None)
+            self.wrapper.ensure_connection()
+        self.assertTrue(mock_close.called)
+        self.assertEqual(self.stats()['failed_checks'], 1)
@@ -0,0 +1,113 @@
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.urlresolvers import reverse
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from DjangoLibrary import profiling
+
+from .test_utils import RequiresLogin
+
+
+def make_options(directory, **options):
+    return dict({
+        'SAMPLE_RATE': 0,
+        'INTERVAL': 0.001,
+        'HEADER': 'X-Profile',
+        'TOKEN': 'secret',
+        'DIRECTORY': directory,
+        'MAX_PROFILES': 2,
+    }, **options)
+
+
+def slow_view(request):
+    time.sleep(0.05)
+    return HttpResponse()
+
+
+class TestProfiling(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.factory = RequestFactory()
+
+    def get_response(self, request, **options):
+        request.user = AnonymousUser()
+        request.resolver_match = type('Match', (), {'view_name': 'slow'})
+        with override_settings(
+                PROFILING=make_options(self.directory, **options)):
+            return profiling.ProfilingMiddleware(slow_view)(request)
+
+    def test_requests_are_not_profiled_by_default(self):
+        response = self.get_response(self.factory.get('/'))
+        self.assertNotIn('X-Profile-Samples', response)
+        self.assertEqual(profiling.list_profiles(), {})
+
+    def test_sampled_requests_are_profiled(self):
+        response = self.get_response(self.factory.get('/'), SAMPLE_RATE=1)
+        self.assertGreater(int(response['X-Profile-Samples']), 0)
+        with override_settings(PROFILING=make_options(self.directory)):
+            self.assertEqual(profiling.list_profiles(), {'slow': 1})
+            stacks = profiling.load_profiles('slow')
+        self.assertTrue(any('test_profiling:slow_view' in stack
+                            for stack in stacks))
+
+    def test_requests_need_the_token_to_be_profiled(self):
+        response = self.get_response(
+            self.factory.get('/', HTTP_X_PROFILE='wrong'))
+        self.assertNotIn('X-Profile-Samples', response)
+        response = self.get_response(
+            self.factory.get('/', HTTP_X_PROFILE='secret'))
+        self.assertIn('X-Profile-Samples', response)
+
+    def test_only_latest_profiles_are_kept(self):
+        with override_settings(PROFILING=make_options(self.directory)):
+            for count in range(1, 4):
+                profiling.save_profile('view', Counter({'a;b': count}))
+            self.assertEqual(profiling.list_profiles(), {'view': 2})
+            self.assertEqual(profiling.load_profiles('view'), {'a;b': 5})
+            self.assertEqual(profiling.load_profiles('view', 1), {'a;b': 3})
+
+    def test_sampler_collapses_stacks(self):
+        sampler = profiling.StackSampler(threading.get_ident(), 0.001)
+        sampler.start()
+        time.sleep(0.02)
+        stacks = sampler.stop()
+        self.assertTrue(any(
+            stack.endswith('test_profiling:test_sampler_collapses_stacks')
+            for stack in stacks))
+
+
+class TestProfileViews(RequiresLogin):
+
+    def setUp(self):
+        super(TestProfileViews, self).setUp()
+        self.customer.is_staff = True
+        self.customer.save()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(
+            PROFILING=make_options(self.directory))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_downloads_collapsed_stacks(self):
+        profiling.save_profile('books:index', Counter({'a;b': 2, 'a;c': 1}))
+        profiling.save_profile('books:index', Counter({'a;b': 1}))
+        resp = self.client.get(reverse('books:profile-list'))
+        self.assertEqual(resp.json(), {'profiles': {'books:index': 2}})
+        resp = self.client.get(
+            reverse('books:profile-download', args=['books:index']))
+        self.assertEqual(resp.content, b'a;b 3\na;c 1\n')
+        self.assertIn('books-index.folded', resp['Content-Disposition'])
+
+    def test_missing_profiles_are_not_found(self):
+        resp = self.client.get(
+            reverse('books:profile-download', args=['books:index']))
+        self.assertEqual(resp.status_code, 404)
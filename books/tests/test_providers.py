@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from books.isbn import get_providers, meta
+from books.providers import LocalProvider, ProviderError
+
+CORPUS = settings.ISBN_PROVIDERS[0]['OPTIONS']['CORPUS']
+
+
+class TestProviderRegistry(SimpleTestCase):
+
+    def test_meta_uses_configured_providers(self):
+        data = meta('978-1-59327-281-4')
+        self.assertEqual(data['title'], 'Land of Lisp')
+        self.assertEqual(data['authors'], ['Conrad Barski'])
+
+    def test_meta_returns_none_when_no_provider_finds_book(self):
+        self.assertIsNone(meta('9780306406157'))
+
+    def test_providers_are_named(self):
+        with override_settings(ISBN_PROVIDERS=[
+                {'PROVIDER': 'books.isbn._scrape_openlibrary'},
+                {'PROVIDER': 'books.providers.LocalProvider',
+                 'OPTIONS': {'CORPUS': CORPUS}},
+                {'PROVIDER': 'books.providers.LocalProvider', 'NAME': 'slow',
+                 'OPTIONS': {'CORPUS': CORPUS, 'LATENCY': 1}}]):
+            providers = get_providers()
+        self.assertEqual(
+            [name for name, _ in providers], ['openlibrary', 'local', 'slow'])
+        self.assertEqual(providers[2][1].latency, 1)
+
+    def test_changing_setting_reloads_providers(self):
+        with override_settings(ISBN_PROVIDERS=[]):
+            self.assertEqual(get_providers(), [])
+        self.assertEqual([name for name, _ in get_providers()], ['local'])
+
+
+class TestLocalProvider(SimpleTestCase):
+
+    def test_isbns_are_matched_as_isbn13s(self):
+        provider = LocalProvider(CORPUS)
+        self.assertEqual(
+            provider('0131103628')['title'], 'The C Programming Language')
+        self.assertEqual(
+            provider('9780131103627')['title'], 'The C Programming Language')
+
+    def test_results_are_copies(self):
+        provider = LocalProvider(CORPUS)
+        provider('9781593272814')['title'] = 'Changed'
+        self.assertEqual(provider('9781593272814')['title'], 'Land of Lisp')
+
+    def test_sqlite_corpus(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'metadata.sqlite3')
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE metadata (isbn TEXT PRIMARY KEY, data TEXT)')
+        connection.execute('INSERT INTO metadata VALUES (?, ?)', (
+            '9781593272814', json.dumps({'title': 'Land of Lisp'})))
+        connection.commit()
+        connection.close()
+
+        provider = LocalProvider(path)
+        self.assertEqual(provider('1593272812'), {'title': 'Land of Lisp'})
+        self.assertIsNone(provider('9780306406157'))
+
+    def test_errors_are_injected(self):
+        provider = LocalProvider(CORPUS, error_rate=1)
+        with self.assertRaises(ProviderError):
+            provider('9781593272814')
+
+    def test_injected_errors_are_repeatable(self):
+        def outcomes(provider):
+            results = []
+            for _ in range(20):
+                try:
+                    results.append(bool(provider('9781593272814')))
+                except ProviderError:
+                    results.append(None)
+            return results
+
+        first = outcomes(LocalProvider(CORPUS, error_rate=0.5, seed=1))
+        self.assertIn(None, first)
+        self.assertIn(True, first)
+        self.assertEqual(
+            first, outcomes(LocalProvider(CORPUS, error_rate=0.5, seed=1)))
+        self.assertNotEqual(
+            first, outcomes(LocalProvider(CORPUS, error_rate=0.5, seed=2)))
+
+    @patch('books.providers.time.sleep')
+    def test_latency(self, sleep):
+        LocalProvider(CORPUS, latency=0.25)('9781593272814')
+        sleep.assert_called_once_with(0.25)
+
+    @patch('books.providers.time.sleep')
+    def test_latency_distribution(self, sleep):
+        provider = LocalProvider(CORPUS, latency=('uniform', 0.1, 0.2))
+        provider('9781593272814')
+        provider('9781593272814')
+        first, second = [call[0][0] for call in sleep.call_args_list]
+        self.assertTrue(0.1 <= first <= 0.2)
+        self.assertNotEqual(first, second)
@@ -0,0 +1,130 @@
+from django.core.urlresolvers import reverse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.http import HttpResponse
+from django.utils.timezone import localtime, now, timedelta
+
+from mixer.backend.django import mixer
+
+from DjangoLibrary.db.budget import (
+    QueryBudgetMiddleware, fingerprint, get_budget
+)
+
+from books import urls
+from books.models import Author, Book, BookCopy, Customer, Genre, Loan, Review
+
+from .test_utils import QueryBudgetMixin, RequiresLogin
+
+from unittest.mock import patch
+
+today = localtime(now()).date()
+
+# URL names which aren't requested, with the reason why
+SKIPPED = {
+    'login': 'Django auth view',
+    'logout': 'Django auth view',
+    'cover': 'Served from storage without queries',
+}
+
+
+class TestQueryBudgets(QueryBudgetMixin, RequiresLogin):
+    """Requests every URL in books.urls within its view's query budget"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = mixer.blend(Author)
+        cls.genre = mixer.blend(Genre)
+        cls.books = mixer.cycle(3).blend(Book)
+        for book in cls.books:
+            book.authors.add(cls.author)
+            book.genres.add(cls.genre)
+            mixer.cycle(2).blend(BookCopy, book=book)
+            mixer.cycle(2).blend(Review, book=book)
+        customers = mixer.cycle(3).blend(Customer)
+        mixer.cycle(3).blend(
+            Loan, customer=(customer for customer in customers),
+            book_copy=(book.copies.first() for book in cls.books),
+            start_date=today - timedelta(days=10),
+            end_date=today - timedelta(days=1))
+
+    def get_requests(self):
+        """Returns a dict of URL name to (method, URL kwargs[, POST data])"""
+        book = {'slug': self.books[0].slug}
+        book_data = {
+            'isbn': self.books[0].isbn,
+            'title': self.books[0].title,
+            'subtitle': 'Updated',
+            'img': self.books[0].img,
+            'authors': [self.author.pk],
+            'genres': [self.genre.pk],
+        }
+        return {
+            'index': ('get', {}),
+            'book-list': ('get', {}),
+            'book-create': ('get', {}),
+            'bulk-return': ('post', {}),
+            'book-detail': ('get', book),
+            'book-update': ('post', book, book_data),
+            'book-leave-review': ('post', book, {
+                'rating': '5', 'review': 'Good book'}),
+            # Deletes a book of its own, there's no confirmation page
+            'book-delete': ('post', {'slug': self.books[2].slug}),
+            'book-checkout': ('post', book),
+            'book-add-to-want-list': ('get', book),
+            'book-return': ('post', book),
+            'book-loan-renew': ('post', book),
+            'overdue-list': ('get', {}),
+            'send-overdue-reminders': ('post', {}),
+            'cache-stats': ('get', {}),
+            'profile-list': ('get', {}),
+            'profile-download': ('get', {'view_name': 'books:index'}),
+            'author-list': ('get', {}),
+            'author-detail': ('get', {'slug': self.author.slug}),
+            'genre-list': ('get', {}),
+            'genre-search': ('get', {'query': self.genre.name[:3]}),
+            'genre-detail': ('get', {'slug': self.genre.slug}),
+            'customer-detail': ('get', {}),
+        }
+
+    def test_every_url_is_requested(self):
+        names = {pattern.name for pattern in urls.urlpatterns}
+        self.assertEqual(names - set(SKIPPED), set(self.get_requests()))
+
+    def test_views_are_within_budget(self):
+        for name, request in sorted(self.get_requests().items()):
+            method, kwargs, data = (request + ({},))[:3]
+            view_name = 'books:' + name
+            with self.subTest(view=view_name):
+                url = reverse(view_name, kwargs=kwargs)
+                with self.assertWithinQueryBudget(view_name):
+                    response = getattr(self.client, method)(url, data)
+                # Budgets of error pages say nothing about the views
+                self.assertLess(response.status_code, 400)
+
+
+class TestQueryBudgetMiddleware(SimpleTestCase):
+
+    def test_fingerprint_strips_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2) AND a = 'x'"),
+            fingerprint("SELECT * FROM t WHERE id IN (3) AND a = 'y'"),
+        )
+
+    @override_settings(QUERY_BUDGETS={
+        'default': {'queries': 10},
+        'books:book-detail': {'queries': 5, 'db_time': 0.1},
+    })
+    def test_view_budgets_extend_default(self):
+        self.assertEqual(get_budget('books:book-list'), {'queries': 10})
+        self.assertEqual(get_budget('books:book-detail'),
+                         {'queries': 5, 'db_time': 0.1})
+
+    @override_settings(QUERY_BUDGETS={'default': {'queries': 0}})
+    @patch('DjangoLibrary.db.budget.capture_queries')
+    def test_logs_requests_over_budget(self, mock_capture):
+        captured = mock_capture.return_value.__enter__.return_value
+        captured.queries = [{'sql': 'SELECT 1', 'time': '0.001'}]
+        middleware = QueryBudgetMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/')
+        with self.assertLogs('DjangoLibrary.db.budget', 'WARNING'):
+            middleware(request)
+        self.assertEqual(request.query_report.count, 1)
@@ -0,0 +1,109 @@
+from smtplib import SMTPException
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+from django.utils.timezone import localtime, timedelta
+
+from mixer.backend.django import mixer
+
+from unittest.mock import patch
+
+from books.models import BookCopy, Customer, Loan, ReminderLog
+from books.reminders import customers_with_loans, send_reminders
+
+today = localtime(timezone.now()).date()
+
+
+class TestReminders(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = mixer.cycle(3).blend(
+            Customer,
+            email=('customer{}@mail.com'.format(i) for i in range(3))
+        )
+        copies = mixer.cycle(3).blend(BookCopy)
+        # The first customer has every copy overdue, the second none
+        for copy in copies:
+            mixer.blend(Loan, customer=cls.customers[0], book_copy=copy,
+                        start_date=today - timedelta(days=10),
+                        end_date=today - timedelta(days=3))
+        cls.due_loan = mixer.blend(
+            Loan, customer=cls.customers[1], book_copy=copies[0],
+            start_date=today, end_date=today + timedelta(days=7))
+        mixer.blend(Loan, customer=cls.customers[2], book_copy=copies[1],
+                    start_date=today - timedelta(days=10),
+                    end_date=today - timedelta(days=1))
+
+    def test_customers_are_streamed_in_batches(self):
+        loans = Loan.objects.filter(end_date__lt=today)
+        batches = list(customers_with_loans(loans, batch_size=1))
+        self.assertEqual(
+            [[customer.pk for customer in batch] for batch in batches],
+            [[self.customers[0].pk], [self.customers[2].pk]]
+        )
+        self.assertEqual(len(batches[0][0].reminder_loans), 3)
+
+    def test_one_email_is_sent_per_customer(self):
+        self.assertEqual(send_reminders(), 2)
+        self.assertEqual(
+            sorted(email.to[0] for email in mail.outbox),
+            sorted([self.customers[0].email, self.customers[2].email])
+        )
+
+    def test_batches_are_rendered_without_per_customer_queries(self):
+        # Customers, their loans, the sent reminders, the claim's savepoint,
+        # insert and release, the rescheduling update, then the empty batch
+        # ending the stream
+        with self.assertNumQueries(8):
+            send_reminders(batch_size=10)
+
+    def test_reminders_are_only_sent_once(self):
+        send_reminders()
+        self.assertEqual(send_reminders(), 0)
+        self.assertEqual(
+            ReminderLog.objects.filter(kind=ReminderLog.OVERDUE).count(), 4)
+
+    def test_sent_reminders_schedule_the_next(self):
+        send_reminders()
+        self.assertEqual(
+            set(Loan.objects.filter(customer=self.customers[0])
+                .values_list('next_reminder_on', flat=True)),
+            {today + timedelta(days=4)}
+        )
+
+    def test_reminders_follow_the_schedule(self):
+        send_reminders()
+        self.assertEqual(send_reminders(today=today + timedelta(days=5)), 2)
+        self.assertTrue(ReminderLog.objects.filter(
+            loan=self.due_loan, kind=ReminderLog.DUE_SOON).exists())
+        self.assertEqual(ReminderLog.objects.filter(
+            loan__customer=self.customers[0],
+            kind=ReminderLog.ESCALATION).count(), 3)
+
+    def test_customers_without_email_are_not_claimed_for(self):
+        Customer.objects.filter(pk=self.customers[2].pk).update(email='')
+        self.assertEqual(send_reminders(), 1)
+        self.assertFalse(ReminderLog.objects.filter(
+            loan__customer=self.customers[2]).exists())
+
+    def test_failed_reminders_are_retried_alone(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend'
+                   '.send_messages', side_effect=[1, SMTPException()]):
+            with self.assertRaises(SMTPException):
+                send_reminders()
+        # Only the unsent reminder's claim is released
+        self.assertEqual(ReminderLog.objects.filter(
+            loan__customer=self.customers[0]).count(), 3)
+        self.assertFalse(ReminderLog.objects.filter(
+            loan__customer=self.customers[2]).exists())
+        self.assertEqual(send_reminders(), 1)
+        self.assertEqual(mail.outbox[0].to, [self.customers[2].email])
+
+    def test_command_reports_throughput(self):
+        out = StringIO()
+        call_command('notify_overdue', stdout=out)
+        self.assertIn('Sent 2 reminders', out.getvalue())
@@ -0,0 +1,71 @@
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from DjangoLibrary.db.routers import (
+    PIN_COOKIE_NAME,
+    ReplicaMiddleware,
+    ReplicaRouter,
+    get_replica,
+    replica_safe,
+    set_replica
+)
+
+from books.models import Book
+from books.views import AuthorDetail, book_list
+
+
+def view(request):
+    # Record the replica selected whilst the view was running
+    return HttpResponse(get_replica() or 'default')
+
+
+@override_settings(REPLICA_DATABASES=['replica'])
+class TestReplicaMiddleware(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaMiddleware(self.get_response)
+
+    def get_response(self, request):
+        self.middleware.process_view(request, self.view, (), {})
+        return self.view(request)
+
+    def test_replica_safe_views(self):
+        self.view = replica_safe(view)
+        resp = self.middleware(self.factory.get('/'))
+        self.assertEqual(resp.content, b'replica')
+        # The selected replica shouldn't leak into subsequent requests
+        self.assertIsNone(get_replica())
+
+    def test_unmarked_views_use_primary(self):
+        self.view = view
+        resp = self.middleware(self.factory.get('/'))
+        self.assertEqual(resp.content, b'default')
+
+    def test_writes_pin_client_to_primary(self):
+        self.view = replica_safe(view)
+        resp = self.middleware(self.factory.post('/'))
+        self.assertEqual(resp.content, b'default')
+        self.assertIn(PIN_COOKIE_NAME, resp.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        resp = self.middleware(request)
+        self.assertEqual(resp.content, b'default')
+
+
+class TestReplicaRouter(SimpleTestCase):
+
+    def tearDown(self):
+        set_replica(None)
+
+    def test_routing(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Book), 'default')
+        set_replica('replica')
+        self.assertEqual(router.db_for_read(Book), 'replica')
+        self.assertEqual(router.db_for_write(Book), 'default')
+
+    def test_catalog_views_are_replica_safe(self):
+        self.assertTrue(book_list.replica_safe)
+        self.assertTrue(AuthorDetail.replica_safe)
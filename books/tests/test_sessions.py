@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from mixer.backend.django import mixer
+
+from books.models import Book, Customer
+
+
+def session_queries(queries):
+    return [query['sql'] for query in queries
+            if 'django_session' in query['sql']]
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-sessions',
+    },
+})
+class TestSessions(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        mixer.blend(Book)
+        Customer.objects.create_user('test', 'test@mail.com', 'secret')
+
+    def login(self):
+        return self.client.post(reverse('books:login'), {
+            'username': 'test', 'password': 'secret'})
+
+    def test_anonymous_catalog_requests_skip_the_session(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books:book-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(session_queries(queries), [])
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+    def test_sessions_are_read_from_the_cache(self):
+        self.login()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books:book-list'))
+        self.assertTrue(response.context['user'].is_authenticated)
+        self.assertEqual(session_queries(queries), [])
+
+    def test_login_message_is_kept_in_a_cookie(self):
+        response = self.login()
+        self.assertIn(CookieStorage.cookie_name, response.cookies)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('books:book-list'))
+        self.assertEqual(
+            [str(message) for message in response.context['messages']],
+            ['Logged in as: test!'])
+        self.assertEqual(session_queries(queries), [])
@@ -0,0 +1,47 @@
+from django.test import TestCase, override_settings
+
+from mixer.backend.django import mixer
+
+from books.cache import get_version
+from books.models import Author, Book, BookCopy, Loan, Review
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-signals',
+    },
+})
+class TestCacheInvalidation(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = mixer.blend(Author)
+        cls.book = mixer.blend(Book)
+        cls.book.authors.add(cls.author)
+        cls.book_copy = mixer.blend(BookCopy, book=cls.book)
+
+    def assertBumps(self, kind, pk, action):
+        """Asserts that calling action changes the version of an object"""
+        version = get_version(kind, pk)
+        action()
+        self.assertNotEqual(get_version(kind, pk), version)
+
+    def test_loans_bump_book_version(self):
+        self.assertBumps('book', self.book.pk, lambda: mixer.blend(
+            Loan, book_copy=self.book_copy))
+
+    def test_reviews_bump_book_version(self):
+        self.assertBumps('book', self.book.pk, lambda: mixer.blend(
+            Review, book=self.book))
+
+    def test_book_changes_bump_author_version(self):
+        self.assertBumps('author', self.author.pk, self.book.save)
+
+    def test_new_books_bump_author_version(self):
+        book = mixer.blend(Book)
+        self.assertBumps(
+            'author', self.author.pk, lambda: book.authors.add(self.author))
+
+    def test_book_changes_bump_catalog_version(self):
+        self.assertBumps('catalog', None, self.book.save)
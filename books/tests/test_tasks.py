@@ -0,0 +1,87 @@
+from unittest.mock import patch
+
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils.timezone import localtime, now, timedelta
+
+from mixer.backend.django import mixer
+
+from books.models import ArchivedLoan, Customer, Loan
+from books.tasks import (
+    archive_loan_chunk, fan_out, pk_ranges, send_reminder_chunk, total_counts
+)
+
+today = localtime(now()).date()
+
+
+class TestPkRanges(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = mixer.cycle(5).blend(Customer)
+
+    def test_splits_queryset_into_chunks(self):
+        pks = [customer.pk for customer in self.customers]
+        self.assertEqual(
+            pk_ranges(Customer.objects.all(), 2),
+            [(pks[0], pks[1]), (pks[2], pks[3]), (pks[4], pks[4])]
+        )
+
+    def test_empty_queryset_has_no_ranges(self):
+        self.assertEqual(pk_ranges(Customer.objects.none(), 2), [])
+
+
+@patch('books.tasks.chord')
+@patch('books.tasks.group')
+class TestFanOut(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        mixer.cycle(3).blend(Customer)
+
+    @override_settings(CELERY_RESULT_BACKEND='redis://localhost')
+    def test_callback_is_chorded_with_a_result_backend(self, group, chord):
+        callback = total_counts.s('Test')
+        fan_out(send_reminder_chunk, Customer.objects.all(),
+                callback=callback, chunk_size=2)
+        chord.assert_called_once_with(group.return_value)
+        chord.return_value.assert_called_once_with(callback)
+
+    @override_settings(CELERY_RESULT_BACKEND=None)
+    def test_callback_is_skipped_without_a_result_backend(self, group, chord):
+        fan_out(send_reminder_chunk, Customer.objects.all(),
+                callback=total_counts.s('Test'), chunk_size=2)
+        chord.assert_not_called()
+        group.return_value.apply_async.assert_called_once_with()
+
+
+class TestChunkTasks(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customers = mixer.cycle(2).blend(
+            Customer, email=('chunk{}@mail.com'.format(i) for i in range(2)))
+        cls.loans = mixer.cycle(2).blend(
+            Loan, customer=(customer for customer in cls.customers),
+            start_date=today - timedelta(days=10),
+            end_date=today - timedelta(days=1))
+
+    def test_reminder_chunk_only_sends_to_its_range(self):
+        first = self.customers[0].pk
+        result = send_reminder_chunk.apply(
+            args=(first, first, today.isoformat()))
+        self.assertEqual(result.get(), 1)
+        self.assertEqual(mail.outbox[0].to, [self.customers[0].email])
+
+    def test_archive_chunk_only_archives_its_range(self):
+        for loan in self.loans:
+            loan.returned = True
+            loan.save()
+        loan = self.loans[1]
+        result = archive_loan_chunk.apply(
+            args=(loan.pk, loan.pk, (now() + timedelta(days=1)).isoformat()))
+        self.assertEqual(result.get(), 1)
+        self.assertEqual(
+            list(ArchivedLoan.objects.values_list('pk', flat=True)),
+            [loan.pk]
+        )
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from types import SimpleNamespace
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from DjangoLibrary import tracing
+from DjangoLibrary.celery import (
+    add_trace_header, record_task_duration, start_task_timer
+)
+
+from books.tasks import send_async_email
+
+TRACEPARENT = '00-{}-{}-01'.format('a' * 32, 'b' * 16)
+
+
+class TestTracing(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings_override = override_settings(TRACING={
+            'SAMPLE_RATE': 0,
+            'DIRECTORY': self.directory,
+            'SERVICE_NAME': 'test',
+            'MAX_SPANS': 10,
+            'TRUST_TRACEPARENT': True,
+        })
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def get_traces(self):
+        path = os.path.join(self.directory, '{}.jsonl'.format(os.getpid()))
+        if not os.path.exists(path):
+            return []
+        with open(path) as traces:
+            return [json.loads(line) for line in traces]
+
+    def test_spans_outside_a_trace_are_not_recorded(self):
+        with tracing.span('cache.get') as span:
+            self.assertIsNone(span)
+        self.assertIsNone(tracing.start_trace('request'))
+        self.assertEqual(self.get_traces(), [])
+
+    def test_records_span_tree(self):
+        root = tracing.start_trace('request', TRACEPARENT)
+        with tracing.span('cache.get', namespace='objects'):
+            with tracing.span('db.query', 'CLIENT'):
+                pass
+        tracing.finish_span(root)
+
+        spans = {span['name']: span for span in self.get_traces()[0]}
+        self.assertEqual({span['traceId'] for span in spans.values()},
+                         {'a' * 32})
+        self.assertEqual(spans['request']['parentId'], 'b' * 16)
+        self.assertEqual(spans['cache.get']['parentId'],
+                         spans['request']['id'])
+        self.assertEqual(spans['db.query']['parentId'],
+                         spans['cache.get']['id'])
+        self.assertEqual(spans['cache.get']['tags'],
+                         {'namespace': 'objects'})
+        self.assertEqual(spans['db.query']['kind'], 'CLIENT')
+
+    def test_unsampled_traceparent_is_not_traced(self):
+        self.assertIsNone(tracing.start_trace(
+            'request', TRACEPARENT[:-2] + '00'))
+
+    def test_middleware_continues_trusted_traces(self):
+        middleware = tracing.TracingMiddleware(lambda request: HttpResponse())
+        request = RequestFactory().get('/', HTTP_TRACEPARENT=TRACEPARENT)
+        middleware(request)
+        root, = self.get_traces()[0]
+        self.assertEqual(root['traceId'], 'a' * 32)
+        self.assertEqual(root['tags']['http.status_code'], '200')
+
+    def test_tasks_are_children_of_the_enqueuing_span(self):
+        root = tracing.start_trace('request', TRACEPARENT)
+        send_async_email.delay('Subject', 'Message', 'from@mail.com',
+                               ['to@mail.com'], None)
+        tracing.finish_span(root)
+        spans = {span['name']: span for span in self.get_traces()[0]}
+        task = spans['celery.task books.tasks.send_async_email']
+        self.assertEqual(task['parentId'], root.id)
+        self.assertEqual(task['tags']['state'], 'SUCCESS')
+
+    def test_trace_is_continued_by_workers_from_the_message_header(self):
+        name = 'books.tasks.send_async_email'
+        headers = {}
+        root = tracing.start_trace('request', TRACEPARENT)
+        add_trace_header(sender=name, headers=headers)
+        tracing.finish_span(root)
+
+        # As a worker would, on a thread without the enqueuing trace
+        task = SimpleNamespace(
+            name=name, request=SimpleNamespace(headers=headers))
+
+        def run_task():
+            start_task_timer(task_id='task-id', task=task)
+            record_task_duration(
+                task_id='task-id', task=task, state='SUCCESS')
+        worker = threading.Thread(target=run_task)
+        worker.start()
+        worker.join()
+
+        request_trace, task_trace = self.get_traces()
+        publish = {span['name']: span for span in request_trace}[
+            'celery.publish ' + name]
+        self.assertEqual(publish['parentId'], root.id)
+        self.assertEqual(headers['traceparent'], '00-{}-{}-01'.format(
+            root.trace_id, publish['id']))
+        self.assertEqual(task_trace[0]['traceId'], root.trace_id)
+        self.assertEqual(task_trace[0]['parentId'], publish['id'])
+        self.assertEqual(task_trace[0]['tags']['state'], 'SUCCESS')
+
+    def test_spans_over_the_limit_are_dropped(self):
+        root = tracing.start_trace('request', TRACEPARENT)
+        for _ in range(20):
+            with tracing.span('cache.get'):
+                pass
+        tracing.finish_span(root)
+        spans = self.get_traces()[0]
+        self.assertEqual(len(spans), 11)
+        self.assertEqual(spans[-1]['name'], 'request')
+        self.assertEqual(spans[-1]['tags']['dropped_spans'], '10')
@@ -1,5 +1,9 @@
+from contextlib import contextmanager
+
 from django.test import TestCase
 
+from DjangoLibrary.db.budget import QueryReport, capture_queries
+
 from books.models import Customer
 
 import logging
@@ -39,3 +43,22 @@ class RequiresLogin(TestCase):
             'test', 'test@mail.com', 'secret')
         self.client.login(username='test', password='secret')
         super(RequiresLogin, self).setUp()
+
+
+class QueryBudgetMixin(object):
+    """
+    Mixin adding an assertion that a block stays within the query budget of
+    a view, as configured in the QUERY_BUDGETS setting
+    """
+
+    @contextmanager
+    def assertWithinQueryBudget(self, view_name):
+        with capture_queries() as captured:
+            yield
+        report = QueryReport(view_name, captured.queries)
+        over_budget = report.over_budget()
+        # Timings of the test database say nothing about production
+        over_budget.pop('db_time', None)
+        self.assertEqual(
+            over_budget, {},
+            'Query budget exceeded: {}'.format(report.as_dict()))
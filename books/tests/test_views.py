@@ -1,8 +1,15 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.core.urlresolvers import reverse
+from django.utils import timezone
+from django.utils.timezone import localtime, timedelta
 
+from books.cache import bump_versions
 from books.models import Author, Book, BookCopy, Customer, Genre, Loan, Review
 from books.forms import ISBNForm, ReviewForm
+from books.views import (
+    encode_cursor, fetch_book, fetch_cached_book, provide_user_book_context
+)
 
 from .test_utils import RequiresLogin, pop_message
 
@@ -10,6 +17,8 @@ from unittest.mock import PropertyMock, MagicMock, patch
 
 from mixer.backend.django import mixer
 
+today = localtime(timezone.now()).date()
+
 
 class IndexViewTests(TestCase):
     """Tests `books:index` view"""
@@ -24,22 +33,19 @@ class IndexViewTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         self.assertTemplateUsed(resp, 'books/index.html')
 
-    @patch('books.models.OverdueLoanManager.get_queryset')
-    def test_shows_overdue_loans(self, mock_overdue):
-        """Checks that overdue loans are shown on the index page"""
-        # Create a new customer, and a new loan for each Book
+    def test_shows_overdue_loan_summary(self):
+        """Checks that overdue loan counts are shown on the index page"""
         customer = mixer.blend(Customer)
         copies = mixer.cycle(3).blend(BookCopy, book=(b for b in self.books))
-        loans = mixer.cycle(3).blend(
-            Loan, book_copy=(c for c in copies), customer=customer)
+        mixer.cycle(3).blend(
+            Loan, book_copy=(c for c in copies), customer=customer,
+            start_date=today - timedelta(days=14),
+            end_date=(today - timedelta(days=d) for d in (1, 2, 10)))
         resp = self.client.get(self.url)
-        # Patch the OverdueLoanManager to make the loans overdue, the
-        # underlying implementation of how this is done is not relevant
-        mock_overdue.return_value = loans
-        self.assertQuerysetEqual(
-            resp.context['overdue_loans'],
-            ['<Loan: {}>'.format(l.start_date) for l in mock_overdue],
-            ordered=False
+        self.assertEqual(resp.context['overdue_total'], 3)
+        self.assertEqual(
+            [bucket['count'] for bucket in resp.context['overdue_summary']],
+            [0, 0, 1, 2]
         )
 
     def test_shows_latest_books(self):
@@ -52,6 +58,26 @@ class IndexViewTests(TestCase):
         )
 
 
+class OverdueListViewTests(RequiresLogin):
+    """Tests `books:overdue-list` view"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.url = reverse('books:overdue-list')
+        cls.loans = mixer.cycle(2).blend(
+            Loan, start_date=today - timedelta(days=60),
+            end_date=(today - timedelta(days=d) for d in (3, 40)))
+
+    def test_lists_overdue_loans(self):
+        resp = self.client.get(self.url)
+        self.assertTemplateUsed(resp, 'books/overdue_list.html')
+        self.assertEqual(list(resp.context['loans']), self.loans[::-1])
+
+    def test_filters_by_age_bucket(self):
+        resp = self.client.get(self.url, {'bucket': 0})
+        self.assertEqual(list(resp.context['loans']), self.loans[1:])
+
+
 class PaginatedBookViewTest(TestCase):
 
     @classmethod
@@ -145,6 +171,98 @@ class BookDetailViewTests(RequiresLogin):
         self.assertIsInstance(resp.context['review_form'], ReviewForm)
 
 
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-book-graph',
+    },
+})
+class FetchCachedBookTests(TestCase):
+    """Tests the cached `books:book-detail` object graph"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = mixer.blend(Book)
+        cls.book_copy = mixer.blend(BookCopy, book=cls.book)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cached_book_is_served_without_queries(self):
+        fetch_cached_book(self.book.slug)
+        with self.assertNumQueries(0):
+            book = fetch_cached_book(self.book.slug)
+            self.assertEqual(book, self.book)
+            self.assertEqual(book.current_owners, [])
+
+    def test_detail_view_fills_cold_cache(self):
+        url = reverse('books:book-detail', args=[self.book.slug])
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context['book'], self.book)
+        with self.assertNumQueries(0):
+            fetch_cached_book(self.book.slug)
+
+    def test_loans_invalidate_cached_book(self):
+        fetch_cached_book(self.book.slug)
+        loan = mixer.blend(Loan, book_copy=self.book_copy)
+        book = fetch_cached_book(self.book.slug)
+        self.assertEqual(book.current_owners, [loan.customer])
+
+    def test_change_whilst_fetching_is_not_missed(self):
+        def fetch_and_change(slug):
+            book = fetch_book(slug)
+            bump_versions([('book', book.pk)])
+            return book
+
+        with patch('books.views.fetch_book', side_effect=fetch_and_change):
+            fetch_cached_book(self.book.slug)
+        with patch('books.views.fetch_book', wraps=fetch_book) as mock_fetch:
+            fetch_cached_book(self.book.slug)
+        mock_fetch.assert_called_once_with(self.book.slug)
+
+    def test_user_context_reflects_unreturned_loan(self):
+        customer = mixer.blend(Customer)
+        loan = mixer.blend(Loan, book_copy=self.book_copy, customer=customer)
+        book = fetch_cached_book(self.book.slug)
+        context = provide_user_book_context(customer, book)
+        self.assertEqual(context['unreturned_loan'], loan)
+        self.assertFalse(context['has_loaned'])
+        self.assertFalse(context['has_reviewed'])
+
+
+class BookUpdateViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = mixer.blend(Author)
+        cls.genre = mixer.blend(Genre)
+        cls.book = mixer.blend(Book)
+        cls.url = reverse('books:book-update', args=[cls.book.slug])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_saves_over_the_current_book(self):
+        # Columns changed since the book was cached must survive the update
+        fetch_cached_book(self.book.slug)
+        refreshed_on = timezone.now()
+        Book.objects.filter(pk=self.book.pk).update(
+            metadata_refreshed_on=refreshed_on)
+        resp = self.client.post(self.url, data={
+            'isbn': self.book.isbn,
+            'title': self.book.title,
+            'subtitle': 'Updated',
+            'img': self.book.img,
+            'authors': [self.author.pk],
+            'genres': [self.genre.pk],
+        })
+        self.assertEqual(resp.status_code, 302)
+        book = Book.objects.get(pk=self.book.pk)
+        self.assertEqual(book.subtitle, 'Updated')
+        self.assertEqual(book.metadata_refreshed_on, refreshed_on)
+
+
 class BookLeaveReviewViewTests(RequiresLogin):
 
     @classmethod
@@ -189,6 +307,17 @@ class CustomerDetailViewTests(RequiresLogin):
         self.assertEqual(resp.status_code, 200)
         self.assertTemplateUsed(resp, 'books/customer_detail.html')
 
+    @patch('books.models.Customer.reading_history')
+    def test_read_list_is_paginated(self, mock_history):
+        cursor = (timezone.now(), 1)
+        mock_history.return_value = ([], cursor)
+        resp = self.client.get(self.url)
+        self.assertEqual(resp.context['next_cursor'], encode_cursor(cursor))
+
+        # The encoded cursor is passed back when fetching the next page
+        self.client.get(self.url, {'after': resp.context['next_cursor']})
+        mock_history.assert_called_with(after=cursor)
+
 
 class GenreListViewTests(TestCase):
 
@@ -327,6 +456,20 @@ class TestBulkReturnView(RequiresLogin):
         # Check all customer loans are returned after post request
         self.assertTrue(all([l.returned for l in loans]))
 
+    def test_returned_loans_are_not_archived_straight_away(self):
+        start = today - timedelta(days=90)
+        loan = mixer.blend(Loan, customer=self.customer, start_date=start,
+                           end_date=start + timedelta(days=14))
+        Loan.objects.filter(pk=loan.pk).update(
+            modified_on=timezone.now() - timedelta(days=90))
+        self.client.post(self.url)
+        loan.refresh_from_db()
+        self.assertTrue(loan.returned)
+        self.assertGreater(
+            loan.returned_on, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(Loan.objects.archive_returned(
+            timezone.now() - timedelta(days=30)), 0)
+
     def test_http_get_method_not_allowed(self):
         resp = self.client.get(self.url)
         self.assertEqual(resp.status_code, 405)
@@ -38,9 +38,21 @@ urlpatterns = [
     url(r'^books/(?P<slug>[\w-]+)/renew/$', views.book_renew_loan,
         name='book-loan-renew'),
 
+    url(r'^overdue/$', views.overdue_list, name='overdue-list'),
+
     url(r'^send-overdue-reminders/$', views.send_overdue_reminder_emails,
         name='send-overdue-reminders'),
 
+    url(r'^cache-stats/$', views.cache_stats, name='cache-stats'),
+
+    url(r'^profiles/$', views.profile_list, name='profile-list'),
+
+    url(r'^profiles/(?P<view_name>[\w:-]+)/$', views.profile_download,
+        name='profile-download'),
+
+    url(r'^covers/(?P<digest>[0-9a-f]{40})/'
+        r'(?P<size>\w+)\.(?P<ext>jpg|webp)$', views.cover, name='cover'),
+
     url(r'^authors/$', views.author_list, name='author-list'),
 
     url(r'^authors/(?P<slug>[\w-]+)$', views.AuthorDetail.as_view(),
@@ -1,32 +1,75 @@
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
 from django.contrib.messages.views import SuccessMessageMixin
 from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.core.files.storage import default_storage
 from django.db.models import Prefetch
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse_lazy
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_http_methods
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import DeleteView
 
+from DjangoLibrary import profiling
+from DjangoLibrary.db.routers import replica_safe
+
+from .cache import (
+    catalog_cache, get_stats as get_cache_stats, get_version, object_cache
+)
+from .conditional import (
+    author_list_state, author_state, book_state, catalog_state,
+    conditional_page, genre_list_state, genre_state
+)
+from .covers import CONTENT_TYPES, cover_path
 from .forms import BookForm, ReviewForm, ISBNForm
+from .metrics import circulation
 from .models import Author, Book, BookCopy, CustomerBook, Genre, Loan, Review
+from .pagecache import cached_page
 from .tasks import send_reminder_emails
 
 
+def get_latest_books():
+    return list(Book.available.all()[:10])
+
+
 def index(request):
-    overdue_loans = Loan.overdue.all().select_related('book_copy__book')
-    latest_books = Book.objects.all()[:10]
+    overdue_summary = Loan.overdue.summary()
+    latest_books = catalog_cache.get_or_set('latest-books', get_latest_books)
     context = {
-        'overdue_loans': overdue_loans,
+        'overdue_summary': overdue_summary,
+        'overdue_total': sum(bucket['count'] for bucket in overdue_summary),
         'latest_books': latest_books,
     }
     return render(request, 'books/index.html', context)
 
 
+@login_required
+def overdue_list(request):
+    """Paginated drill-down of overdue loans, optionally by age bucket"""
+    loans = (
+        Loan.overdue.with_age_bucket()
+        .select_related('book_copy__book', 'customer')
+        .order_by('end_date', 'pk')
+    )
+    bucket = request.GET.get('bucket', '')
+    if bucket.isdigit():
+        loans = loans.filter(age_bucket=int(bucket))
+    return render(request, 'books/overdue_list.html', {
+        'loans': paginate(request, loans, page_count=50),
+        'buckets': Loan.overdue.AGE_BUCKETS,
+        'bucket': bucket,
+    })
+
+
 def paginate(request, objects, page_count=100):
     paginator = Paginator(objects, page_count)
     page = request.GET.get('page')
@@ -41,6 +84,9 @@ def paginate(request, objects, page_count=100):
     return objects
 
 
+@replica_safe
+@cached_page(catalog_state)
+@conditional_page(catalog_state)
 def book_list(request):
     books = Book.available.prefetch_related('authors')
     if request.GET.get('q'):
@@ -73,14 +119,15 @@ def book_create(request):
 
 
 def fetch_book(slug):
-    return get_object_or_404(
+    book = get_object_or_404(
         Book.available.prefetch_related(
             Prefetch(
                 'copies',
                 queryset=BookCopy.objects.prefetch_related(
                     Prefetch(
                         'loans',
-                        queryset=Loan.objects.select_related('customer')
+                        queryset=Loan.objects.filter(returned=False)
+                        .select_related('customer')
                     )
                 )
             ),
@@ -89,23 +136,83 @@ def fetch_book(slug):
                 queryset=Review.objects.select_related('customer')
             ),
             'authors',
+            'genres',
         ),
         slug=slug)
+    # Derive the remaining template properties from the prefetched graph
+    reviews = book.reviews.all()
+    book.average_rating = (
+        sum(review.rating for review in reviews) / len(reviews)
+        if reviews else None
+    )
+    book.current_owners = list({
+        loan.customer_id: loan.customer for loan in get_unreturned_loans(book)
+        if loan.customer is not None
+    }.values())
+    return book
+
+
+def fetch_cached_book(slug):
+    """
+    Returns fetch_book(slug) from the cache, whilst the book's version is
+    unchanged since the object graph was cached
+    """
+    cached = object_cache.get(slug)
+    if cached is not None:
+        cached_version, book = cached
+        pk = book.pk
+    else:
+        pk = Book.objects.filter(slug=slug).values_list(
+            'pk', flat=True).first()
+    if pk is None:
+        raise Http404('No book found matching the query')
+    # Read before fetching, so that a change made whilst fetching leaves the
+    # cached graph outdated rather than missed
+    version = get_version('book', pk)
+    if cached is not None and cached_version == version:
+        return book
+    book = fetch_book(slug)
+    # Evaluate the remaining lazy properties so they're cached too
+    book.similar_books = list(book.similar_books)
+    object_cache.set(slug, (version, book))
+    return book
+
+
+def get_unreturned_loans(book):
+    """Returns the unreturned loans from a book fetched by fetch_book"""
+    return sorted(
+        (loan for copy in book.copies.all() for loan in copy.loans.all()),
+        key=lambda loan: loan.pk
+    )
 
 
 def provide_user_book_context(user, book):
     """Returns dict of data pertaining to relationship between user and book"""
+    customer_book = user.books.filter(book=book).first()
+    unreturned_loans = [
+        loan for loan in get_unreturned_loans(book)
+        if loan.customer_id == user.pk
+    ]
     return {
-        'customer_book': user.books.filter(book=book).first(),
-        'has_reviewed': user.has_reviewed(book.isbn),
-        'has_loaned': user.has_loaned(book.isbn),
-        'unreturned_loan': user.get_unreturned_book_loan(book.isbn)
+        'customer_book': customer_book,
+        'has_reviewed': any(
+            review.customer_id == user.pk for review in book.reviews.all()
+        ),
+        # Loans are returned when a book is added to the reading history
+        'has_loaned': (
+            customer_book is not None and
+            customer_book.last_read_on is not None
+        ),
+        'unreturned_loan': unreturned_loans[0] if unreturned_loans else None
     }
 
 
+@replica_safe
 @require_http_methods(["GET"])
+@cached_page(book_state)
+@conditional_page(book_state)
 def book_detail(request, slug):
-    book = fetch_book(slug)
+    book = fetch_cached_book(slug)
     context = {
         'book': book,
         'review_form': ReviewForm(),
@@ -118,12 +225,14 @@ def book_detail(request, slug):
 
 @require_http_methods(["POST"])
 def book_update(request, slug):
-    book = fetch_book(slug)
-    form = BookForm(request.POST, instance=book)
+    # Saved from the database, a cached graph may be minutes out of date
+    form = BookForm(
+        request.POST, instance=get_object_or_404(Book, slug=slug))
     if form.is_valid():
-        form.save()
-        messages.success(request, "Book: {} updated".format(form.instance))
+        book = form.save()
+        messages.success(request, "Book: {} updated".format(book))
         return redirect(book)
+    book = fetch_cached_book(slug)
     context = {
         'book': book,
         'review_form': ReviewForm(),
@@ -131,12 +240,12 @@ def book_update(request, slug):
     }
     if request.user.is_authenticated:
         context.update(provide_user_book_context(request.user, book))
-    return render(request, 'reports/book_detail.html', context)
+    return render(request, 'books/book_detail.html', context)
 
 
 @require_http_methods(["POST"])
 def book_leave_review(request, slug):
-    book = fetch_book(slug)
+    book = fetch_cached_book(slug)
     form = ReviewForm(request.POST)
     if form.is_valid():
         review = form.save(commit=False)
@@ -150,7 +259,7 @@ def book_leave_review(request, slug):
     }
     if request.user.is_authenticated:
         context.update(provide_user_book_context(request.user, book))
-    return render(request, 'reports/book_detail.html', context)
+    return render(request, 'books/book_detail.html', context)
 
 
 @method_decorator(login_required, name='dispatch')
@@ -164,14 +273,15 @@ class BookDeleteView(SuccessMessageMixin, DeleteView):
         return super(BookDeleteView, self).delete(request, *args, **kwargs)
 
 
+@replica_safe
+@cached_page(author_list_state)
 def author_list(request):
     authors = (
         Author.objects
         # Exclude authors with no book relations
         .exclude(books__isnull=True)
-        .prefetch_related(
-            Prefetch('books', queryset=Book.available.all())
-        )
+        # Rows only list titles, so skip the availability annotations
+        .prefetch_related('books')
     )
     if request.GET.get('q'):
         authors = (
@@ -183,6 +293,9 @@ def author_list(request):
     })
 
 
+@replica_safe
+@method_decorator(cached_page(author_state), name='get')
+@method_decorator(conditional_page(author_state), name='get')
 class AuthorDetail(DetailView):
     queryset = Author.objects.prefetch_related(
         Prefetch('books', queryset=Book.available.all())
@@ -190,11 +303,36 @@ class AuthorDetail(DetailView):
     model = Author
 
 
+def encode_cursor(cursor):
+    """Encodes a (datetime, pk) keyset cursor for use in a query string"""
+    if cursor is not None:
+        return '{}_{}'.format(cursor[0].isoformat(), cursor[1])
+
+
+def decode_cursor(value):
+    """Decodes a keyset cursor, returns None if it's missing or malformed"""
+    try:
+        timestamp, pk = value.rsplit('_', 1)
+        cursor = parse_datetime(timestamp), int(pk)
+    except (AttributeError, ValueError):
+        return
+    if cursor[0] is not None:
+        return cursor
+
+
 @login_required
 def customer_detail(request):
-    return render(request, 'books/customer_detail.html')
+    read_list, cursor = request.user.reading_history(
+        after=decode_cursor(request.GET.get('after'))
+    )
+    return render(request, 'books/customer_detail.html', {
+        'read_list': read_list,
+        'next_cursor': encode_cursor(cursor),
+    })
 
 
+@replica_safe
+@cached_page(genre_list_state)
 def genre_list(request):
     genres = Genre.objects.all().prefetch_related('books')
     if request.GET.get('q'):
@@ -212,6 +350,9 @@ def genre_search(request, query):
     return render(request, 'books/genre_list.html', {'genre_list': genres})
 
 
+@replica_safe
+@method_decorator(cached_page(genre_state), name='get')
+@method_decorator(conditional_page(genre_state), name='get')
 class GenreDetail(DetailView):
     queryset = Genre.objects.prefetch_related(
         Prefetch('books', queryset=Book.available.all())
@@ -221,6 +362,7 @@ class GenreDetail(DetailView):
 
 @login_required
 @require_http_methods(['POST'])
+@circulation('renew')
 def book_renew_loan(request, slug):
     """End point to renew logged in users' loan for a given book"""
     book = get_object_or_404(Book, slug=slug)
@@ -230,9 +372,12 @@ def book_renew_loan(request, slug):
         try:
             loan.renew()
         except ValidationError:
+            request.circulation_outcome = 'not_renewable'
             messages.error(request, 'Loan not renewable')
         finally:
             messages.success(request, 'Loan renewed')
+    else:
+        request.circulation_outcome = 'not_loaned'
     # Redirect to the next page, or book's page as fallback
     return redirect(request.POST.get('next', book))
 
@@ -246,6 +391,7 @@ def send_overdue_reminder_emails(self):
 
 
 @login_required
+@circulation('checkout')
 def book_checkout(request, slug):
     book = get_object_or_404(Book, slug=slug)
     if request.user.can_loan:
@@ -255,16 +401,20 @@ def book_checkout(request, slug):
                 Loan.objects.create(customer=request.user, book_copy=book_copy)
                 messages.success(request, 'Book checked out')
             else:
+                request.circulation_outcome = 'unavailable'
                 messages.error(request, 'Book Unavailable')
         else:
+            request.circulation_outcome = 'duplicate'
             messages.error(request, 'Cant check out duplicate book copies')
     else:
+        request.circulation_outcome = 'loan_limit'
         messages.error(request, 'Reached loan limit')
     return redirect(book)
 
 
 @login_required
 @require_http_methods(['POST'])
+@circulation('return')
 def book_return(request, slug):
     book = get_object_or_404(Book, slug=slug)
     if request.user.has_book(book.isbn):
@@ -272,9 +422,50 @@ def book_return(request, slug):
         loan.returned = True
         loan.save()
         messages.success(request, 'Book returned'.format(book.title))
+    else:
+        request.circulation_outcome = 'not_loaned'
     return redirect(book)
 
 
+@staff_member_required
+def cache_stats(request):
+    """Reports this process's cache hit, miss and eviction counts"""
+    get_backend_stats = getattr(cache, 'get_stats', dict)
+    return JsonResponse({
+        'backend': get_backend_stats(),
+        'namespaces': get_cache_stats(),
+    })
+
+
+@staff_member_required
+def profile_list(request):
+    """Lists the number of saved profiles of each view"""
+    return JsonResponse({'profiles': profiling.list_profiles()})
+
+
+@staff_member_required
+def profile_download(request, view_name):
+    """
+    Downloads a view's profiles summed into collapsed stacks, ready for
+    flamegraph.pl or speedscope. ?limit=N only includes the latest N profiles
+    """
+    if view_name not in profiling.list_profiles():
+        raise Http404('No profiles of {}'.format(view_name))
+    try:
+        limit = int(request.GET['limit'])
+    except (KeyError, ValueError):
+        limit = None
+    stacks = profiling.load_profiles(view_name, limit)
+    response = HttpResponse(
+        ''.join('{} {}\n'.format(stack, count)
+                for stack, count in stacks.most_common()),
+        content_type='text/plain')
+    filename = '{}.folded'.format(view_name.replace(':', '-'))
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+        filename)
+    return response
+
+
 @login_required
 def add_book_to_want_list(request, slug):
     book = get_object_or_404(Book, slug=slug)
@@ -292,3 +483,19 @@ def bulk_return(request):
         loan.save(update_fields=['returned'])
         messages.success(request, 'All outstanding loans returned')
     return redirect(request.user)
+
+
+@require_http_methods(['GET', 'HEAD'])
+def cover(request, digest, size, ext):
+    """
+    Serves a locally cached cover, cover URLs change with their content so
+    browsers can keep them for good
+    """
+    path = cover_path(digest, size, ext)
+    if size not in settings.COVER_SIZES or not default_storage.exists(path):
+        raise Http404('No such cover')
+    response = FileResponse(
+        default_storage.open(path), content_type=CONTENT_TYPES[ext])
+    patch_cache_control(
+        response, public=True, max_age=60 * 60 * 24 * 365, immutable=True)
+    return response